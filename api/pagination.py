@@ -0,0 +1,69 @@
+"""
+API Pagination for LMS
+"""
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+from lms_project.pagination import CURSOR_PARAM, PAGE_NUMBER_PARAM, InvalidCursor, KeysetPaginator
+
+
+class SignedCursorPagination(BasePagination):
+    """
+    Keyset pagination with opaque signed cursors.
+
+    Views choose the key through a `keyset_ordering` attribute (or a
+    get_keyset_ordering() method when it depends on the request). Requests that
+    pass ?page=, or views whose use_keyset_pagination() returns False, fall
+    back to the default page-number pagination.
+    """
+    page_size = api_settings.PAGE_SIZE
+    ordering = ('-created_at', '-id')
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.fallback = None
+
+        use_keyset = PAGE_NUMBER_PARAM not in request.query_params
+        if use_keyset and hasattr(view, 'use_keyset_pagination'):
+            use_keyset = view.use_keyset_pagination(queryset)
+        if not use_keyset:
+            self.fallback = PageNumberPagination()
+            return self.fallback.paginate_queryset(queryset, request, view)
+
+        paginator = KeysetPaginator(
+            queryset, self.page_size,
+            ordering=self.get_ordering(view),
+            salt=f'api.{getattr(view, "basename", view.__class__.__name__)}',
+        )
+        try:
+            self.page = paginator.page(request.query_params.get(CURSOR_PARAM))
+        except InvalidCursor as e:
+            raise NotFound(str(e))
+        return list(self.page)
+
+    def get_ordering(self, view):
+        if hasattr(view, 'get_keyset_ordering'):
+            return view.get_keyset_ordering()
+        return getattr(view, 'keyset_ordering', self.ordering)
+
+    def get_paginated_response(self, data):
+        if self.fallback is not None:
+            return self.fallback.get_paginated_response(data)
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+    def get_next_link(self):
+        if not self.page.has_next():
+            return None
+        return replace_query_param(self.request.build_absolute_uri(), CURSOR_PARAM, self.page.next_cursor)
+
+    def get_previous_link(self):
+        if not self.page.has_previous():
+            return None
+        return replace_query_param(self.request.build_absolute_uri(), CURSOR_PARAM, self.page.previous_cursor)
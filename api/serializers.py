@@ -5,7 +5,9 @@ from rest_framework import serializers
 from django.contrib.auth import get_user_model
 from users.models import UserProfile
 from courses.models import Course, Module, Lesson, Category, CourseReview, CourseResource
+from courses.search import highlight
 from enrollments.models import Enrollment, LessonProgress, ModuleProgress, Certificate
+from quizzes.delivery import attempt_questions, get_quiz_delivery
 from quizzes.models import Quiz, Question, AnswerChoice, QuizAttempt, StudentAnswer
 
 User = get_user_model()
@@ -31,7 +33,7 @@ class UserProfileSerializer(serializers.ModelSerializer):
 class CategorySerializer(serializers.ModelSerializer):
     class Meta:
         model = Category
-        fields = ['id', 'name', 'description', 'color', 'icon', 'created_at']
+        fields = ['id', 'name', 'description', 'icon', 'created_at']
 
 
 class CourseResourceSerializer(serializers.ModelSerializer):
@@ -70,13 +72,22 @@ class CourseListSerializer(serializers.ModelSerializer):
     instructor = UserSerializer(read_only=True)
     category = CategorySerializer(read_only=True)
     average_rating = serializers.ReadOnlyField()
-    total_students = serializers.ReadOnlyField()
+    total_students = serializers.ReadOnlyField(source='enrollment_count')
+    search_rank = serializers.SerializerMethodField()
+    search_snippet = serializers.SerializerMethodField()
     
     class Meta:
         model = Course
-        fields = ['id', 'title', 'description', 'thumbnail', 'price', 'level',
-                 'instructor', 'category', 'average_rating', 'total_students',
-                 'created_at', 'is_published']
+        fields = ['id', 'title', 'short_description', 'description', 'cover_image', 'price',
+                 'difficulty_level', 'instructor', 'category', 'average_rating', 'total_students',
+                 'created_at', 'status', 'search_rank', 'search_snippet']
+    
+    def get_search_rank(self, obj):
+        return getattr(obj, 'search_rank', None)
+    
+    def get_search_snippet(self, obj):
+        snippet = getattr(obj, 'search_snippet', None)
+        return str(highlight(snippet)) if snippet else None
 
 
 class CourseDetailSerializer(serializers.ModelSerializer):
@@ -85,7 +96,7 @@ class CourseDetailSerializer(serializers.ModelSerializer):
     modules = ModuleSerializer(many=True, read_only=True)
     reviews = CourseReviewSerializer(many=True, read_only=True)
     average_rating = serializers.ReadOnlyField()
-    total_students = serializers.ReadOnlyField()
+    total_students = serializers.ReadOnlyField(source='enrollment_count')
     
     class Meta:
         model = Course
@@ -125,11 +136,12 @@ class ModuleProgressSerializer(serializers.ModelSerializer):
 class AnswerChoiceSerializer(serializers.ModelSerializer):
     class Meta:
         model = AnswerChoice
-        fields = ['id', 'text', 'is_correct']
+        # is_correct stays server-side; grading uses quizzes.grading
+        fields = ['id', 'text']
 
 
 class QuestionSerializer(serializers.ModelSerializer):
-    choices = AnswerChoiceSerializer(many=True, read_only=True)
+    choices = AnswerChoiceSerializer(source='answer_choices', many=True, read_only=True)
     
     class Meta:
         model = Question
@@ -142,8 +154,8 @@ class QuizSerializer(serializers.ModelSerializer):
     
     class Meta:
         model = Quiz
-        fields = ['id', 'title', 'description', 'course', 'time_limit',
-                 'max_attempts', 'passing_score', 'questions', 'created_at']
+        fields = ['id', 'title', 'description', 'course', 'time_limit_minutes',
+                 'max_attempts', 'pass_percentage', 'questions', 'created_at']
 
 
 class StudentAnswerSerializer(serializers.ModelSerializer):
@@ -155,12 +167,27 @@ class StudentAnswerSerializer(serializers.ModelSerializer):
 class QuizAttemptSerializer(serializers.ModelSerializer):
     quiz = QuizSerializer(read_only=True)
     student = UserSerializer(read_only=True)
-    answers = StudentAnswerSerializer(many=True, read_only=True)
+    answers = StudentAnswerSerializer(source='student_answers', many=True, read_only=True)
+    questions = serializers.SerializerMethodField()
     
     class Meta:
         model = QuizAttempt
-        fields = ['id', 'quiz', 'student', 'score', 'passed', 'started_at',
-                 'completed_at', 'answers']
+        fields = ['id', 'quiz', 'student', 'status', 'score', 'max_score', 'percentage', 'passed',
+                 'started_at', 'submitted_at', 'questions', 'answers']
+    
+    def get_questions(self, attempt):
+        """The attempt's questions as the take page shows them, from the cached delivery"""
+        delivery = get_quiz_delivery(attempt.quiz_id)
+        if delivery is None:
+            return []
+        return [
+            {
+                'id': question.pk, 'text': question.text, 'question_type': question.question_type,
+                'points': question.points,
+                'choices': [{'id': choice.pk, 'text': choice.text} for choice in question.choices],
+            }
+            for question in attempt_questions(delivery, attempt.pk)
+        ]
 
 
 class CertificateSerializer(serializers.ModelSerializer):
@@ -5,24 +5,34 @@ from rest_framework import viewsets, status, permissions
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from django.contrib.auth import get_user_model
-from django.db.models import Avg, Count
 from django.shortcuts import get_object_or_404
-from django.utils import timezone
 
 from users.models import UserProfile
 from courses.models import Course, Module, Lesson, Category, CourseReview
-from enrollments.models import Enrollment, LessonProgress, ModuleProgress
+from courses import catalog
+from courses.outline import get_course_outline
+from enrollments.bulk import enroll_students, summarize
+from enrollments.heartbeats import parse_events, record_heartbeats
+from enrollments.models import Enrollment, LessonProgress, WaitlistEntry
+from enrollments.seats import AlreadyEnrolled, CourseFull, add_to_waitlist, enroll_student, is_full, waitlist_position
+from quizzes.delivery import NoAttemptsLeft, NotEnrolled, get_quiz_delivery, start_attempt
+from quizzes.autosave import delta_from_list, record_answers, submit_saved
+from quizzes.grading import AttemptClosed, get_answer_key
 from quizzes.models import Quiz, QuizAttempt, StudentAnswer
 
+from .pagination import SignedCursorPagination
 from .serializers import (
     UserSerializer, UserProfileSerializer, CategorySerializer,
     CourseListSerializer, CourseDetailSerializer, CourseReviewSerializer,
     EnrollmentSerializer, LessonProgressSerializer, ModuleProgressSerializer,
-    QuizSerializer, QuizAttemptSerializer, StudentAnswerSerializer
+    QuizSerializer, QuizAttemptSerializer
 )
 
 User = get_user_model()
 
+# Larger cohorts go through the enroll_cohort management command
+MAX_COHORT_SIZE = 10000
+
 
 class UserViewSet(viewsets.ModelViewSet):
     queryset = User.objects.all()
@@ -57,6 +67,14 @@ class CategoryViewSet(viewsets.ReadOnlyModelViewSet):
 class CourseViewSet(viewsets.ReadOnlyModelViewSet):
     queryset = Course.objects.filter(status='published')
     permission_classes = [permissions.AllowAny]
+    pagination_class = SignedCursorPagination
+    
+    def use_keyset_pagination(self, queryset):
+        # Relevance-ordered search results are paged by number
+        return not self.request.query_params.get('search', '').strip()
+    
+    def get_keyset_ordering(self):
+        return catalog.SORT_ORDERINGS[catalog.get_sort(self.request.query_params)]
     
     def get_serializer_class(self):
         if self.action == 'retrieve':
@@ -64,56 +82,115 @@ class CourseViewSet(viewsets.ReadOnlyModelViewSet):
         return CourseListSerializer
     
     def get_queryset(self):
-        queryset = Course.objects.filter(status='published')
-        
-        # Add annotations for average rating and total students
-        queryset = queryset.annotate(
-            average_rating=Avg('reviews__rating'),
-            total_students=Count('enrollments')
+        if self.action in ('clone', 'enroll_cohort'):
+            # Instructors may manage their unpublished courses too
+            return Course.objects.select_related('instructor')
+        # Filters, sorting and search are shared with the HTML catalog
+        params = self.request.query_params
+        return catalog.catalog_queryset(
+            catalog.parse_filters(params),
+            catalog.get_sort(params),
+            params.get('search', '').strip(),
         )
-        
-        # Filter by category if specified
-        category = self.request.query_params.get('category')
-        if category:
-            queryset = queryset.filter(category__id=category)
-        
-        # Filter by level if specified
-        level = self.request.query_params.get('level')
-        if level:
-            queryset = queryset.filter(level=level)
-        
-        # Search by title or description
-        search = self.request.query_params.get('search')
-        if search:
-            queryset = queryset.filter(
-                title__icontains=search
-            ) | queryset.filter(
-                description__icontains=search
-            )
-        
-        return queryset.order_by('-created_at')
+    
+    @action(detail=False, methods=['get'])
+    def facets(self, request):
+        """Facet counts for the current filters and search"""
+        params = request.query_params
+        counts = catalog.facet_counts(catalog.parse_filters(params), params.get('search', '').strip())
+        return Response(counts)
     
     @action(detail=True, methods=['post'], permission_classes=[permissions.IsAuthenticated])
     def enroll(self, request, pk=None):
         """Enroll the current user in a course"""
         course = self.get_object()
         
-        # Check if user is already enrolled
-        if Enrollment.objects.filter(student=request.user, course=course).exists():
+        # Claiming the seat and inserting the row is the only check
+        try:
+            enrollment = enroll_student(request.user, course)
+        except AlreadyEnrolled:
             return Response(
                 {'error': 'You are already enrolled in this course'},
                 status=status.HTTP_400_BAD_REQUEST
             )
+        except CourseFull:
+            return Response(
+                {'error': 'This course is full', 'waitlist': True},
+                status=status.HTTP_409_CONFLICT
+            )
         
-        # Create enrollment
-        enrollment = Enrollment.objects.create(
-            student=request.user,
-            course=course
+        serializer = EnrollmentSerializer(enrollment)
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+    
+    @action(detail=True, methods=['post', 'delete'], permission_classes=[permissions.IsAuthenticated])
+    def waitlist(self, request, pk=None):
+        """Join (POST) or leave (DELETE) the waitlist of a full course"""
+        course = self.get_object()
+        
+        if request.method == 'DELETE':
+            WaitlistEntry.objects.filter(student=request.user, course=course).delete()
+            return Response(status=status.HTTP_204_NO_CONTENT)
+        
+        if Enrollment.objects.filter(student=request.user, course=course).exists():
+            return Response(
+                {'error': 'You are already enrolled in this course'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if not is_full(course):
+            return Response(
+                {'error': 'This course has free seats; enroll instead'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        add_to_waitlist(request.user, course)
+        return Response(
+            {'position': waitlist_position(request.user, course)},
+            status=status.HTTP_201_CREATED
         )
+    
+    @action(detail=True, methods=['post'], permission_classes=[permissions.IsAuthenticated])
+    def clone(self, request, pk=None):
+        """Copy a course with its content as a new draft"""
+        course = self.get_object()
         
-        serializer = EnrollmentSerializer(enrollment)
+        if course.instructor_id != request.user.pk and not request.user.is_staff:
+            return Response(
+                {'error': 'Only the course instructor can clone this course'},
+                status=status.HTTP_403_FORBIDDEN
+            )
+        
+        clone = course.clone(title=request.data.get('title') or None)
+        serializer = CourseListSerializer(clone, context=self.get_serializer_context())
         return Response(serializer.data, status=status.HTTP_201_CREATED)
     
+    @action(detail=True, methods=['post'], permission_classes=[permissions.IsAuthenticated])
+    def enroll_cohort(self, request, pk=None):
+        """Enroll many students, given by username or email, in one request"""
+        course = self.get_object()
+        
+        if course.instructor_id != request.user.pk and not request.user.is_staff:
+            return Response(
+                {'error': 'Only the course instructor can enroll students'},
+                status=status.HTTP_403_FORBIDDEN
+            )
+        
+        students = request.data.get('students')
+        if not isinstance(students, list) or not students:
+            return Response(
+                {'error': 'students must be a non-empty list of usernames or emails'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if len(students) > MAX_COHORT_SIZE:
+            return Response(
+                {'error': f'At most {MAX_COHORT_SIZE} students per request'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        rows = enroll_students(course, students)
+        return Response({
+            'summary': summarize(rows),
+            'results': [row._asdict() for row in rows],
+        })
+    
     @action(detail=True, methods=['post'], permission_classes=[permissions.IsAuthenticated])
     def review(self, request, pk=None):
         """Add a review for a course"""
@@ -143,6 +220,8 @@ class CourseViewSet(viewsets.ReadOnlyModelViewSet):
 class EnrollmentViewSet(viewsets.ReadOnlyModelViewSet):
     serializer_class = EnrollmentSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = SignedCursorPagination
+    keyset_ordering = ('-created_at', '-id')
     
     def get_queryset(self):
         return Enrollment.objects.filter(student=self.request.user)
@@ -167,31 +246,25 @@ class EnrollmentViewSet(viewsets.ReadOnlyModelViewSet):
             lesson=lesson
         )
         
-        if not lesson_progress.completed:
-            lesson_progress.completed = True
-            lesson_progress.save()
-            
-            # Check if module is now complete
-            module = lesson.module
-            module_progress, _ = ModuleProgress.objects.get_or_create(
-                enrollment=enrollment,
-                module=module
-            )
-            
-            # Check if all lessons in module are completed
-            total_lessons = module.lessons.count()
-            completed_lessons = LessonProgress.objects.filter(
-                enrollment=enrollment,
-                lesson__module=module,
-                completed=True
-            ).count()
-            
-            if completed_lessons == total_lessons and not module_progress.completed:
-                module_progress.completed = True
-                module_progress.save()
+        # Enrollment and module progress follow through F() increments
+        lesson_progress.mark_as_completed()
         
         serializer = LessonProgressSerializer(lesson_progress)
         return Response(serializer.data)
+    
+    @action(detail=True, methods=['post'])
+    def heartbeat(self, request, pk=None):
+        """Buffer batched video position and study time events"""
+        enrollment = self.get_object()
+        
+        try:
+            events = parse_events(request.data.get('events'), get_course_outline(enrollment.course_id))
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        # Written to the database by the flush_heartbeats command
+        record_heartbeats(enrollment.pk, events)
+        return Response({'accepted': len(events)}, status=status.HTTP_202_ACCEPTED)
 
 
 class QuizViewSet(viewsets.ReadOnlyModelViewSet):
@@ -210,25 +283,21 @@ class QuizViewSet(viewsets.ReadOnlyModelViewSet):
     def start_attempt(self, request, pk=None):
         """Start a new quiz attempt"""
         quiz = self.get_object()
+        delivery = get_quiz_delivery(quiz.pk)
+        if not delivery.is_available():
+            return Response({'error': 'Quiz is not open'}, status=status.HTTP_400_BAD_REQUEST)
         
-        # Check if user has reached max attempts
-        attempt_count = QuizAttempt.objects.filter(
-            student=request.user,
-            quiz=quiz
-        ).count()
-        
-        if attempt_count >= quiz.max_attempts:
+        try:
+            attempt = start_attempt(delivery, request.user)
+        except NotEnrolled:
+            return Response({'error': 'Not enrolled in this course'}, status=status.HTTP_403_FORBIDDEN)
+        except NoAttemptsLeft:
             return Response(
                 {'error': 'Maximum attempts reached'},
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        # Create new attempt
-        attempt = QuizAttempt.objects.create(
-            student=request.user,
-            quiz=quiz
-        )
-        
+        attempt.quiz = quiz
         serializer = QuizAttemptSerializer(attempt)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
     
@@ -236,42 +305,25 @@ class QuizViewSet(viewsets.ReadOnlyModelViewSet):
     def submit_attempt(self, request, pk=None):
         """Submit a quiz attempt"""
         quiz = self.get_object()
-        attempt_id = request.data.get('attempt_id')
-        answers = request.data.get('answers', [])
-        
         attempt = get_object_or_404(
             QuizAttempt,
-            id=attempt_id,
+            id=request.data.get('attempt_id'),
             student=request.user,
             quiz=quiz,
-            completed_at__isnull=True
+            status='in_progress'
         )
+        # Graded by the same engine as the HTML form, on the autosaved answers
+        answer_key = get_answer_key(quiz.pk)
+        try:
+            answers = delta_from_list(request.data.get('answers', []), answer_key)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
         
-        # Save answers
-        total_score = 0
-        max_score = 0
-        
-        for answer_data in answers:
-            answer_serializer = StudentAnswerSerializer(data=answer_data)
-            if answer_serializer.is_valid():
-                answer = answer_serializer.save(attempt=attempt)
-                
-                # Calculate score
-                question = answer.question
-                max_score += question.points
-                
-                if question.question_type == 'multiple_choice':
-                    if answer.selected_choice and answer.selected_choice.is_correct:
-                        total_score += question.points
-                elif question.question_type == 'true_false':
-                    if answer.selected_choice and answer.selected_choice.is_correct:
-                        total_score += question.points
-        
-        # Update attempt with score
-        attempt.score = (total_score / max_score * 100) if max_score > 0 else 0
-        attempt.passed = attempt.score >= quiz.passing_score
-        attempt.completed_at = timezone.now()
-        attempt.save()
+        attempt.quiz = quiz
+        try:
+            submit_saved(attempt, answers)
+        except AttemptClosed:
+            return Response({'error': 'Attempt already submitted'}, status=status.HTTP_409_CONFLICT)
         
         serializer = QuizAttemptSerializer(attempt)
         return Response(serializer.data)
@@ -280,6 +332,27 @@ class QuizViewSet(viewsets.ReadOnlyModelViewSet):
 class QuizAttemptViewSet(viewsets.ReadOnlyModelViewSet):
     serializer_class = QuizAttemptSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = SignedCursorPagination
+    keyset_ordering = ('-started_at', '-id')
     
     def get_queryset(self):
-        return QuizAttempt.objects.filter(student=self.request.user)
+        return QuizAttempt.objects.filter(student=self.request.user).select_related('quiz')
+    
+    @action(detail=True, methods=['post'])
+    def autosave(self, request, pk=None):
+        """Buffer the answers changed since the last autosave"""
+        attempt = self.get_object()
+        if attempt.status != 'in_progress' or attempt.is_timed_out():
+            return Response({'error': 'Attempt is closed'}, status=status.HTTP_409_CONFLICT)
+        
+        try:
+            answers = delta_from_list(
+                request.data.get('answers'),
+                get_answer_key(attempt.quiz_id).for_attempt(attempt.pk, attempt.quiz.questions_per_attempt),
+            )
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        # Written to the database by the flush_quiz_autosaves command
+        record_answers(attempt.pk, answers)
+        return Response({'accepted': len(answers)}, status=status.HTTP_202_ACCEPTED)
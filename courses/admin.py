@@ -1,8 +1,15 @@
-from django.contrib import admin
+import re
+
+from django.contrib import admin, messages
+from django.contrib.admin import helpers
+from django.template.response import TemplateResponse
 from django.utils.html import format_html
 from django.urls import reverse
 from django.utils.safestring import mark_safe
-from .models import Category, Course, Module, Lesson, CourseReview, CourseResource
+from .models import (
+    Category, Course, Module, Lesson, CourseReview, CourseResource, CourseStats,
+    CourseRecommendation,
+)
 
 
 @admin.register(Category)
@@ -64,13 +71,13 @@ class CourseAdmin(admin.ModelAdmin):
     )
     
     def get_queryset(self, request):
-        return super().get_queryset(request).select_related('instructor', 'category').prefetch_related('enrollments')
+        return super().get_queryset(request).select_related('instructor', 'category', 'stats')
     
     def enrollment_count(self, obj):
         return obj.enrollment_count
     enrollment_count.short_description = 'Enrollments'
     
-    actions = ['make_featured', 'remove_featured', 'publish_courses', 'draft_courses']
+    actions = ['make_featured', 'remove_featured', 'publish_courses', 'draft_courses', 'clone_courses', 'enroll_cohort']
     
     def make_featured(self, request, queryset):
         queryset.update(is_featured=True)
@@ -87,6 +94,42 @@ class CourseAdmin(admin.ModelAdmin):
     def draft_courses(self, request, queryset):
         queryset.update(status='draft')
     draft_courses.short_description = "Move to draft"
+    
+    def clone_courses(self, request, queryset):
+        clones = [course.clone() for course in queryset]
+        self.message_user(
+            request,
+            f"Created {len(clones)} draft cop{'y' if len(clones) == 1 else 'ies'}: "
+            + ', '.join(clone.title for clone in clones)
+        )
+    clone_courses.short_description = "Clone selected courses (as drafts)"
+    
+    def enroll_cohort(self, request, queryset):
+        from enrollments.bulk import NOT_FOUND, enroll_students, summarize
+        
+        if queryset.count() != 1:
+            self.message_user(request, "Select exactly one course to enroll a cohort in.", messages.WARNING)
+            return None
+        course = queryset.get()
+        
+        if 'apply' in request.POST:
+            identifiers = [i for i in re.split(r'[\s,;]+', request.POST.get('students', '')) if i]
+            rows = enroll_students(course, identifiers)
+            summary = ', '.join(f"{status.replace('_', ' ')}: {count}" for status, count in summarize(rows).items())
+            self.message_user(request, f"{course.title} - {summary or 'no students given'}")
+            missing = [row.identifier for row in rows if row.status == NOT_FOUND]
+            if missing:
+                self.message_user(request, "Not found: " + ', '.join(missing[:50]), messages.WARNING)
+            return None
+        
+        return TemplateResponse(request, 'admin/courses/course/enroll_cohort.html', {
+            **self.admin_site.each_context(request),
+            'title': f"Enroll a cohort in {course.title}",
+            'course': course,
+            'opts': self.model._meta,
+            'action_checkbox_name': helpers.ACTION_CHECKBOX_NAME,
+        })
+    enroll_cohort.short_description = "Enroll a cohort (usernames or emails)"
 
 
 class LessonInline(admin.TabularInline):
@@ -172,3 +215,30 @@ class CourseResourceAdmin(admin.ModelAdmin):
             'fields': ('is_public',)
         }),
     )
+
+
+@admin.register(CourseStats)
+class CourseStatsAdmin(admin.ModelAdmin):
+    list_display = ('course', 'enrollment_count', 'review_count', 'average_rating', 'lesson_count', 'total_duration_minutes', 'updated_at')
+    search_fields = ('course__title',)
+    readonly_fields = [f.name for f in CourseStats._meta.fields]
+    
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('course')
+    
+    def has_add_permission(self, request):
+        return False
+
+
+@admin.register(CourseRecommendation)
+class CourseRecommendationAdmin(admin.ModelAdmin):
+    list_display = ('course', 'rank', 'recommended', 'score', 'co_enrollments', 'computed_at')
+    list_filter = ('computed_at',)
+    search_fields = ('course__title', 'recommended__title')
+    readonly_fields = [f.name for f in CourseRecommendation._meta.fields]
+    
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('course', 'recommended')
+    
+    def has_add_permission(self, request):
+        return False
@@ -1,6 +1,16 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
+
+
+def setup_search_index(sender, using, **kwargs):
+    """Create the GIN index / FTS5 table once the course tables exist"""
+    from .search import setup_search
+    setup_search(using)
 
 
 class CoursesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'courses'
+    
+    def ready(self):
+        post_migrate.connect(setup_search_index, sender=self)
@@ -0,0 +1,142 @@
+"""
+Course catalog queries: filters, sort orders and facet counts.
+
+Sorts only use stored columns - Course.price and the
+CourseStats.rating_average / enrollment_count counters - so no listing
+aggregates over reviews or enrollments per row. The counters are read
+through SORT_KEYS annotations that count a missing stats row as zero, so
+the sort values are never null. Every ordering ends in the primary key,
+which makes it a valid keyset pagination key.
+
+Facet counts come from one grouped query over (category, level, price type)
+for the current search. Each facet is then counted in Python against the
+*other* active filters, so picking a category still shows how many courses
+the remaining categories hold. The grouped rows are cached per search term
+and catalog version; course saves and deletes bump the version.
+"""
+import hashlib
+from collections import Counter
+
+from django.core.cache import cache
+from django.db.models import Count, FloatField, PositiveIntegerField
+from django.db.models.functions import Coalesce
+
+from lms_project.cache_versions import bump_version, get_version
+
+from .models import Course
+from .search import search_courses
+
+DEFAULT_SORT = '-created_at'
+SORT_ORDERINGS = {
+    '-created_at': ('-created_at', '-id'),
+    'price_low': ('price', 'id'),
+    'price_high': ('-price', '-id'),
+    'rating': ('-rating_key', '-id'),
+    'popular': ('-popularity_key', '-id'),
+}
+SORT_KEYS = {
+    'rating_key': Coalesce('stats__rating_average', 0.0, output_field=FloatField()),
+    'popularity_key': Coalesce('stats__enrollment_count', 0, output_field=PositiveIntegerField()),
+}
+
+FACET_TIMEOUT = 60 * 10
+CATALOG_NAMESPACE = 'course_catalog'
+
+# facet name -> Course field
+FACET_FIELDS = {
+    'category': 'category_id',
+    'level': 'difficulty_level',
+    'price_type': 'price_type',
+}
+
+
+def parse_filters(params):
+    """Validated filter values from a QueryDict; unknown values are dropped"""
+    filters = {}
+    category = params.get('category', '')
+    if category.isdigit():
+        filters['category'] = int(category)
+    level = params.get('level')
+    if level in dict(Course.DIFFICULTY_CHOICES):
+        filters['level'] = level
+    price_type = params.get('price_type')
+    if price_type in dict(Course.PRICE_TYPE_CHOICES):
+        filters['price_type'] = price_type
+    return filters
+
+
+def get_sort(params):
+    sort = params.get('sort', DEFAULT_SORT)
+    return sort if sort in SORT_ORDERINGS else DEFAULT_SORT
+
+
+def published_courses():
+    return Course.objects.filter(status='published')
+
+
+def filter_courses(queryset, filters):
+    return queryset.filter(**{FACET_FIELDS[name]: value for name, value in filters.items()})
+
+
+def catalog_queryset(filters, sort=DEFAULT_SORT, search=''):
+    """
+    Published courses matching the filters.
+
+    With a search term and no explicit sort the results stay ordered by
+    relevance; otherwise they follow SORT_ORDERINGS[sort].
+    """
+    queryset = filter_courses(published_courses(), filters).select_related(
+        'instructor', 'category', 'stats'
+    ).annotate(**SORT_KEYS)
+    if search:
+        queryset = search_courses(queryset, search)
+        if sort == DEFAULT_SORT:
+            return queryset
+    return queryset.order_by(*SORT_ORDERINGS[sort])
+
+
+def _facet_rows(search):
+    """[(category_id, level, price_type, count), ...] for the search, cached"""
+    digest = hashlib.md5(search.lower().encode()).hexdigest()
+    key = f'catalog_facets:{get_version(CATALOG_NAMESPACE)}:{digest}'
+    rows = cache.get(key)
+    if rows is None:
+        queryset = published_courses()
+        if search:
+            queryset = search_courses(queryset, search)
+        rows = list(
+            queryset.order_by().values_list(*FACET_FIELDS.values()).annotate(count=Count('id'))
+        )
+        cache.set(key, rows, FACET_TIMEOUT)
+    return rows
+
+
+def facet_counts(filters, search=''):
+    """
+    {'category': {id: n}, 'level': {value: n}, 'price_type': {value: n}, 'total': n}
+
+    Each facet ignores its own filter but honours the others; 'total' is the
+    number of courses matching every filter.
+    """
+    names = list(FACET_FIELDS)
+    counts = {name: Counter() for name in names}
+    total = 0
+    for row in _facet_rows(search):
+        values = dict(zip(names, row))
+        count = row[-1]
+        if all(values[name] == value for name, value in filters.items()):
+            total += count
+        for name in names:
+            others_match = all(
+                values[other] == filters[other]
+                for other in names if other != name and other in filters
+            )
+            if others_match:
+                counts[name][values[name]] += count
+    result = {name: dict(counter) for name, counter in counts.items()}
+    result['total'] = total
+    return result
+
+
+def invalidate_catalog():
+    bump_version(CATALOG_NAMESPACE)
@@ -0,0 +1,92 @@
+"""
+Deep copies of a course for a new term.
+
+A clone copies the course row and then every level of its tree - modules,
+lessons, resources, quizzes, questions and answer choices - with one
+SELECT and one bulk_create per level, remapping foreign keys through
+in-memory {old pk: new pk} maps. The number of queries therefore depends
+on the depth of the tree, not on its size.
+
+File fields are copied by name, so a clone points at the same stored media
+as its source instead of duplicating the bytes. The shared-file guard in
+courses.models keeps such files until no row references them any more.
+"""
+from django.db import transaction
+from django.utils.text import slugify
+
+from .models import Course, CourseResource, Lesson, Module, refresh_course_content_stats
+from .transfer import data_fields
+
+
+def _unique_slug(title):
+    base = slugify(title)[:190] or 'course'
+    taken = set(Course.objects.filter(slug__startswith=base).values_list('slug', flat=True))
+    slug, n = base, 2
+    while slug in taken:
+        slug = f'{base}-{n}'
+        n += 1
+    return slug
+
+
+def _copy_level(queryset, model, remap):
+    """
+    Copy the rows of one tree level in a single bulk_create.
+
+    remap maps each foreign key attname to the {old pk: new pk} dict of its
+    parent level (None stays None). Returns {old pk: new pk} for this level.
+    """
+    names = [field.attname for field in data_fields(model)]
+    rows = list(queryset.order_by('pk').values('pk', *remap, *names))
+    clones = []
+    for row in rows:
+        values = {name: row[name] for name in names}
+        for attname, parents in remap.items():
+            values[attname] = None if row[attname] is None else parents[row[attname]]
+        clones.append(model(**values))
+    model.objects.bulk_create(clones)
+    return {row['pk']: clone.pk for row, clone in zip(rows, clones)}
+
+
+def clone_course(course, title=None, instructor=None):
+    """
+    Copy a course with its full content tree and return the new course.
+
+    The copy starts as an unpublished draft with a fresh slug; enrollments,
+    reviews and quiz attempts are not copied.
+    """
+    from quizzes.models import AnswerChoice, Question, Quiz
+
+    with transaction.atomic():
+        values = {field.attname: getattr(course, field.attname) for field in data_fields(Course)}
+        values.update(
+            title=title or f'{course.title} (copy)',
+            status='draft',
+            is_featured=False,
+            published_at=None,
+        )
+        values['slug'] = _unique_slug(values['title'])
+        clone = Course(
+            **values,
+            instructor=instructor or course.instructor,
+            category_id=course.category_id,
+            # Same source file, so the existing variants are valid for the copy
+            cover_image_variants=course.cover_image_variants,
+        )
+        clone.save()
+
+        courses = {course.pk: clone.pk}
+        modules = _copy_level(Module.objects.filter(course=course), Module, {'course_id': courses})
+        lessons = _copy_level(Lesson.objects.filter(module__course=course), Lesson, {'module_id': modules})
+        _copy_level(CourseResource.objects.filter(course=course), CourseResource, {'course_id': courses})
+        quizzes = _copy_level(Quiz.objects.filter(course=course), Quiz, {
+            'course_id': courses, 'module_id': modules, 'lesson_id': lessons,
+        })
+        questions = _copy_level(Question.objects.filter(quiz__course=course), Question, {'quiz_id': quizzes})
+        _copy_level(
+            AnswerChoice.objects.filter(question__quiz__course=course), AnswerChoice, {'question_id': questions}
+        )
+
+        # bulk_create skips the signals that maintain the lesson counters
+        refresh_course_content_stats(clone.pk)
+        clone.stats.refresh_from_db()
+    return clone
@@ -0,0 +1,31 @@
+"""
+Management command to rebuild course recommendations.
+Computes co-enrollment similarity between all published courses and stores
+the closest neighbours of each one. Run it periodically (e.g. nightly cron).
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from courses.recommendations import DEFAULT_TOP_N, build_recommendations
+
+
+class Command(BaseCommand):
+    help = 'Rebuild precomputed co-enrollment course recommendations'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--top',
+            type=int,
+            default=DEFAULT_TOP_N,
+            help=f'Neighbours stored per course (default: {DEFAULT_TOP_N})'
+        )
+
+    def handle(self, *args, **options):
+        if options['top'] < 1:
+            raise CommandError('--top must be at least 1')
+
+        self.stdout.write('Building course recommendations...')
+        count = build_recommendations(options['top'])
+
+        self.stdout.write(
+            self.style.SUCCESS(f'✓ Stored {count} recommendation(s)')
+        )
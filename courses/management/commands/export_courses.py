@@ -0,0 +1,61 @@
+"""
+Management command to export course trees as NDJSON.
+Streams courses with their modules, lessons, resources and quizzes so the
+file can be loaded into another instance with import_courses.
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from courses.models import Course
+from courses.transfer import EXPORT_CHUNK_SIZE, MODEL_ORDER, export_courses
+
+
+class Command(BaseCommand):
+    help = 'Export courses and their content as NDJSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--output',
+            type=str,
+            default='-',
+            help='File to write to (default: standard output)'
+        )
+        parser.add_argument(
+            '--course',
+            action='append',
+            dest='slugs',
+            metavar='SLUG',
+            help='Only export this course (repeatable)'
+        )
+        parser.add_argument(
+            '--status',
+            choices=[value for value, _ in Course.STATUS_CHOICES],
+            help='Only export courses with this status'
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=EXPORT_CHUNK_SIZE,
+            help=f'Courses read per round of queries (default: {EXPORT_CHUNK_SIZE})'
+        )
+
+    def handle(self, *args, **options):
+        if options['chunk_size'] < 1:
+            raise CommandError('--chunk-size must be at least 1')
+
+        courses = Course.objects.all()
+        if options['slugs']:
+            courses = courses.filter(slug__in=options['slugs'])
+        if options['status']:
+            courses = courses.filter(status=options['status'])
+
+        if options['output'] == '-':
+            # Keep standard output pure NDJSON; report on stderr
+            counts = export_courses(self.stdout, courses, options['chunk_size'])
+            report = self.stderr
+        else:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                counts = export_courses(f, courses, options['chunk_size'])
+            report = self.stdout
+
+        summary = ', '.join(f'{counts[name]} {name}(s)' for name in MODEL_ORDER)
+        report.write(self.style.SUCCESS(f'✓ Exported {summary}'))
@@ -0,0 +1,69 @@
+"""
+Management command to import course trees from NDJSON.
+Reads files written by export_courses with batched inserts and one
+transaction per chunk of courses. Existing course slugs are skipped unless
+--upsert is given.
+"""
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from courses.transfer import DEFAULT_BATCH_SIZE, MODEL_ORDER, InvalidImport, import_courses
+
+
+class Command(BaseCommand):
+    help = 'Import courses and their content from NDJSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path',
+            type=str,
+            help='NDJSON file to read, or - for standard input'
+        )
+        parser.add_argument(
+            '--upsert',
+            action='store_true',
+            help='Update courses whose slug already exists instead of skipping them'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Validate the whole file without saving anything'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=DEFAULT_BATCH_SIZE,
+            help=f'Rows per INSERT (default: {DEFAULT_BATCH_SIZE})'
+        )
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be at least 1')
+
+        try:
+            if options['path'] == '-':
+                counts = self._import(sys.stdin, options)
+            else:
+                with open(options['path'], encoding='utf-8') as f:
+                    counts = self._import(f, options)
+        except OSError as e:
+            raise CommandError(f'Could not read {options["path"]}: {e}')
+        except InvalidImport as e:
+            raise CommandError(f'Import failed at {e}')
+
+        summary = ', '.join(f'{counts[name]} {name}(s)' for name in MODEL_ORDER)
+        verb = 'Validated' if options['dry_run'] else 'Imported'
+        self.stdout.write(self.style.SUCCESS(f'✓ {verb} {summary}'))
+        if counts['updated']:
+            self.stdout.write(f'  {counts["updated"]} existing course(s) updated')
+        if counts['skipped']:
+            self.stdout.write(f'  {counts["skipped"]} record(s) skipped under existing courses (use --upsert)')
+
+    def _import(self, stream, options):
+        return import_courses(
+            stream,
+            upsert=options['upsert'],
+            dry_run=options['dry_run'],
+            batch_size=options['batch_size'],
+        )
@@ -0,0 +1,30 @@
+"""
+Management command to rebuild the course full-text search index.
+Rewrites the tsvector column on PostgreSQL or the FTS5 shadow table on SQLite.
+"""
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from courses.search import get_search_backend
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the course full-text search index'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--database',
+            type=str,
+            default='default',
+            help='Database alias to index (default: default)'
+        )
+
+    def handle(self, *args, **options):
+        backend = get_search_backend(options['database'])
+
+        self.stdout.write(f'Rebuilding search index with {backend.__class__.__name__}...')
+        with transaction.atomic(using=options['database']):
+            backend.setup()
+            backend.index()
+
+        self.stdout.write(self.style.SUCCESS('✓ Search index rebuilt'))
@@ -0,0 +1,33 @@
+"""
+Management command to rebuild the denormalized CourseStats table.
+Recomputes every counter from the source tables, correcting any drift
+left by bulk operations that bypass model signals.
+"""
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from courses.models import rebuild_course_stats
+
+
+class Command(BaseCommand):
+    help = 'Rebuild course statistics from enrollments, reviews and lessons'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--course',
+            type=int,
+            action='append',
+            dest='course_ids',
+            help='Only rebuild the given course id (repeatable, default: all courses)'
+        )
+
+    def handle(self, *args, **options):
+        course_ids = options['course_ids']
+
+        self.stdout.write('Rebuilding course statistics...')
+        with transaction.atomic():
+            count = rebuild_course_stats(course_ids)
+
+        self.stdout.write(
+            self.style.SUCCESS(f'✓ Rebuilt statistics for {count} course(s)')
+        )
@@ -0,0 +1,160 @@
+"""
+Access-controlled serving of lesson videos, PDFs and course resources.
+
+Files are streamed with HTTP Range support so players can seek without
+re-downloading from the start. With MEDIA_ACCEL_REDIRECT enabled (nginx in
+front of local storage) Django only authorises the request and hands the
+transfer to nginx through X-Accel-Redirect; nginx then deals with ranges,
+validators and sendfile itself. Otherwise the response is built here:
+ETag/Last-Modified validation, single byte ranges (206/416) and a
+FileResponse that WSGI servers can send with sendfile().
+"""
+import mimetypes
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+from django.http import FileResponse, HttpResponse
+from django.utils.cache import get_conditional_response, quote_etag
+from django.utils.http import http_date, parse_http_date_safe
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+# Browsers may cache protected files, shared caches must not
+PRIVATE_CACHE_CONTROL = 'private, max-age=3600'
+# For files whose name changes whenever their content does
+IMMUTABLE_CACHE_CONTROL = 'private, max-age=31536000, immutable'
+
+
+class _FileRange:
+    """
+    Read-only view of bytes [start, start + length) of an open file.
+
+    It deliberately has no seek()/tell() so FileResponse leaves
+    Content-Length alone, but it keeps fileno() so a WSGI file_wrapper can
+    still sendfile() from the current offset, bounded by Content-Length.
+    """
+
+    def __init__(self, file, start, length):
+        self.file = file
+        self.remaining = length
+        file.seek(start)
+
+    def read(self, size=-1):
+        if self.remaining <= 0:
+            return b''
+        if size is None or size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def fileno(self):
+        return self.file.fileno()
+
+    def close(self):
+        self.file.close()
+
+
+def parse_range(header, size):
+    """
+    Return (start, end) for a single satisfiable byte range, inclusive.
+
+    None means "ignore the header and send the whole file" (absent,
+    malformed or multi-range); ValueError means the range is unsatisfiable.
+    """
+    match = RANGE_RE.match(header.strip()) if header else None
+    if not match:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        # Suffix range: the final N bytes
+        length = int(last)
+        if length == 0:
+            raise ValueError('Empty suffix range')
+        return max(0, size - length), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or end < start:
+        raise ValueError('Range not satisfiable')
+    return start, end
+
+
+def _validators(field_file):
+    """(etag, last_modified timestamp) for a stored file"""
+    storage = field_file.storage
+    size = field_file.size
+    try:
+        modified = int(storage.get_modified_time(field_file.name).timestamp())
+    except (NotImplementedError, OSError):
+        modified = None
+    return quote_etag(f'{size:x}-{modified or 0:x}'), modified
+
+
+def _accel_redirect(field_file, content_type, filename, as_attachment, cache_control):
+    response = HttpResponse(content_type=content_type)
+    response['X-Accel-Redirect'] = quote(settings.MEDIA_ACCEL_PREFIX + field_file.name)
+    # nginx keeps headers set here and adds its own validators and ranges
+    response['Content-Disposition'] = _content_disposition(filename, as_attachment)
+    response['Cache-Control'] = cache_control
+    return response
+
+
+def _content_disposition(filename, as_attachment):
+    disposition = 'attachment' if as_attachment else 'inline'
+    return f"{disposition}; filename*=UTF-8''{quote(filename)}"
+
+
+def _if_range_matches(request, etag, modified):
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if not if_range:
+        return True
+    if if_range.startswith(('"', 'W/')):
+        return if_range == etag
+    return modified is not None and parse_http_date_safe(if_range) == modified
+
+
+def serve_file(request, field_file, as_attachment=False, cache_control=PRIVATE_CACHE_CONTROL):
+    """Build the response for an already-authorised FieldFile"""
+    filename = field_file.name.rsplit('/', 1)[-1]
+    content_type = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+
+    if getattr(settings, 'MEDIA_ACCEL_REDIRECT', False) and isinstance(field_file.storage, FileSystemStorage):
+        return _accel_redirect(field_file, content_type, filename, as_attachment, cache_control)
+
+    etag, modified = _validators(field_file)
+    not_modified = get_conditional_response(request, etag=etag, last_modified=modified)
+    if not_modified is not None:
+        return not_modified
+
+    size = field_file.size
+    byte_range = None
+    if request.method == 'GET' and _if_range_matches(request, etag, modified):
+        try:
+            byte_range = parse_range(request.META.get('HTTP_RANGE'), size)
+        except ValueError:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+            response['Accept-Ranges'] = 'bytes'
+            return response
+
+    file = field_file.storage.open(field_file.name, 'rb')
+    if byte_range is None:
+        response = FileResponse(file, content_type=content_type)
+    else:
+        start, end = byte_range
+        length = end - start + 1
+        response = FileResponse(_FileRange(file, start, length), status=206, content_type=content_type)
+        response['Content-Length'] = length
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+
+    response['Accept-Ranges'] = 'bytes'
+    response['ETag'] = etag
+    if modified is not None:
+        response['Last-Modified'] = http_date(modified)
+    response['Content-Disposition'] = _content_disposition(filename, as_attachment)
+    response['Cache-Control'] = cache_control
+    return response
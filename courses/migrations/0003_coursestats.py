@@ -0,0 +1,89 @@
+# Generated by Django 4.2.7 on 2026-10-18 05:27
+
+from django.db import migrations, models
+from django.db.models import Count, Q, Sum
+import django.db.models.deletion
+
+BATCH_SIZE = 500
+
+
+def fill_course_stats(apps, schema_editor):
+    """Write the stats row of every existing course, as rebuild_course_stats does"""
+    Course = apps.get_model('courses', 'Course')
+    CourseReview = apps.get_model('courses', 'CourseReview')
+    CourseStats = apps.get_model('courses', 'CourseStats')
+    Lesson = apps.get_model('courses', 'Lesson')
+    Enrollment = apps.get_model('enrollments', 'Enrollment')
+
+    course_ids = list(Course.objects.order_by('pk').values_list('pk', flat=True))
+    for start in range(0, len(course_ids), BATCH_SIZE):
+        batch = course_ids[start:start + BATCH_SIZE]
+        enrollment_counts = dict(
+            Enrollment.objects.filter(is_active=True, course_id__in=batch).order_by()
+            .values('course_id').annotate(n=Count('id')).values_list('course_id', 'n')
+        )
+        review_rows = {
+            row['course_id']: row
+            for row in CourseReview.objects.filter(course_id__in=batch).order_by().values('course_id').annotate(
+                review_count=Count('id'),
+                rating_sum=Sum('rating'),
+                **{f'rating_{i}_count': Count('id', filter=Q(rating=i)) for i in range(1, 6)}
+            )
+        }
+        lesson_rows = {
+            row['module__course_id']: row
+            for row in Lesson.objects.filter(
+                is_published=True, module__is_published=True, module__course_id__in=batch
+            ).order_by().values('module__course_id').annotate(
+                lesson_count=Count('id'),
+                total_duration_minutes=Sum('duration_minutes'),
+            )
+        }
+        CourseStats.objects.bulk_create([
+            CourseStats(
+                course_id=course_id,
+                enrollment_count=enrollment_counts.get(course_id, 0),
+                review_count=review_rows.get(course_id, {}).get('review_count', 0),
+                rating_sum=review_rows.get(course_id, {}).get('rating_sum') or 0,
+                lesson_count=lesson_rows.get(course_id, {}).get('lesson_count', 0),
+                total_duration_minutes=lesson_rows.get(course_id, {}).get('total_duration_minutes') or 0,
+                **{
+                    f'rating_{i}_count': review_rows.get(course_id, {}).get(f'rating_{i}_count', 0)
+                    for i in range(1, 6)
+                }
+            )
+            for course_id in batch
+        ], ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0002_initial'),
+        ('enrollments', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CourseStats',
+            fields=[
+                ('course', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='courses.course')),
+                ('enrollment_count', models.PositiveIntegerField(default=0, help_text='Active enrollments')),
+                ('review_count', models.PositiveIntegerField(default=0)),
+                ('rating_sum', models.PositiveIntegerField(default=0)),
+                ('rating_1_count', models.PositiveIntegerField(default=0)),
+                ('rating_2_count', models.PositiveIntegerField(default=0)),
+                ('rating_3_count', models.PositiveIntegerField(default=0)),
+                ('rating_4_count', models.PositiveIntegerField(default=0)),
+                ('rating_5_count', models.PositiveIntegerField(default=0)),
+                ('lesson_count', models.PositiveIntegerField(default=0, help_text='Published lessons in published modules')),
+                ('total_duration_minutes', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Course statistics',
+                'verbose_name_plural': 'Course statistics',
+            },
+        ),
+        migrations.RunPython(fill_course_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 4.2.7 on 2026-10-18 05:49
+
+from django.db import migrations, models
+from django.db.models import F, FloatField
+from django.db.models.functions import Cast
+
+
+def fill_rating_average(apps, schema_editor):
+    CourseStats = apps.get_model('courses', 'CourseStats')
+    CourseStats.objects.filter(review_count__gt=0).update(
+        rating_average=Cast('rating_sum', FloatField()) / F('review_count')
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0007_courserecommendation'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='coursestats',
+            name='rating_average',
+            field=models.FloatField(default=0, help_text='rating_sum / review_count, stored as a sort key'),
+        ),
+        migrations.RunPython(fill_rating_average, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='course',
+            index=models.Index(fields=['status', 'price', 'id'], name='courses_cou_status_6d1c02_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='coursestats',
+            index=models.Index(fields=['-rating_average', '-course'], name='courses_cou_rating__7cab58_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='coursestats',
+            index=models.Index(fields=['-enrollment_count', '-course'], name='courses_cou_enrollm_0d2c04_idx'),
+        ),
+    ]
@@ -1,10 +1,22 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Case, Count, F, FloatField, Q, Sum, Value, When
+from django.db.models.functions import Cast
+from django.db.models.signals import post_delete, post_init, post_save, pre_delete
+from django.contrib.postgres.search import SearchVectorField
+from django.dispatch import receiver
 from django.conf import settings
+from django.utils import timezone
 from django.utils.text import slugify
 from django.urls import reverse
-from PIL import Image
+from django_cleanup.signals import cleanup_pre_delete
 import uuid
 
+from lms_project.images import (
+    COVER_VARIANTS, schedule_image_variants, schedule_variant_cleanup,
+)
+
+from .page_cache import invalidate_course_page
+
 
 class Category(models.Model):
     """Course categories for better organization"""
@@ -27,6 +39,12 @@ class Category(models.Model):
         super().save(*args, **kwargs)
 
 
+class CourseManager(models.Manager):
+    def get_queryset(self):
+        # The tsvector is only ever used inside SQL; never ship it to Python
+        return super().get_queryset().defer('search_vector')
+
+
 class Course(models.Model):
     """Main course model"""
     DIFFICULTY_CHOICES = [
@@ -63,6 +81,7 @@ class Course(models.Model):
     
     # Media
     cover_image = models.ImageField(upload_to='course_covers/', null=True, blank=True)
+    cover_image_variants = models.JSONField(default=dict, blank=True, editable=False)
     intro_video = models.FileField(upload_to='course_intros/', null=True, blank=True)
     
     # Course Details
@@ -88,11 +107,21 @@ class Course(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     published_at = models.DateTimeField(null=True, blank=True)
     
+    # Full-text search document (PostgreSQL only, see courses.search)
+    search_vector = SearchVectorField(null=True, editable=False)
+    
+    objects = CourseManager()
+    
     class Meta:
         ordering = ['-created_at']
         indexes = [
             models.Index(fields=['status', 'published_at']),
             models.Index(fields=['category', 'status']),
+            # Keyset pagination keys
+            models.Index(fields=['status', '-created_at', '-id']),
+            models.Index(fields=['category', 'status', '-created_at', '-id']),
+            # Catalog price sort (scanned backwards for high-to-low)
+            models.Index(fields=['status', 'price', 'id']),
         ]
     
     def __str__(self):
@@ -103,43 +132,56 @@ class Course(models.Model):
             self.slug = slugify(self.title)
         super().save(*args, **kwargs)
         
-        # Resize cover image
-        if self.cover_image:
-            img = Image.open(self.cover_image.path)
-            if img.height > 400 or img.width > 600:
-                output_size = (600, 400)
-                img.thumbnail(output_size)
-                img.save(self.cover_image.path)
+        # Resized covers are generated in the background, only on change
+        schedule_image_variants(self, 'cover_image', 'cover_image_variants', COVER_VARIANTS)
     
     def get_absolute_url(self):
         return reverse('courses:course_detail', kwargs={'slug': self.slug})
     
+    def get_stats(self):
+        """
+        Return the denormalized stats row.
+
+        Rows are written with the course and backfilled by migration 0003;
+        rebuilding a missing one here is only a safety net.
+        """
+        try:
+            return self.stats
+        except CourseStats.DoesNotExist:
+            rebuild_course_stats([self.pk])
+            self.stats = CourseStats.objects.get(course_id=self.pk)
+            return self.stats
+    
     @property
     def total_lessons(self):
-        return sum(module.lessons.count() for module in self.modules.all())
+        return self.get_stats().lesson_count
     
     @property
     def total_duration_minutes(self):
-        return sum(lesson.duration_minutes for lesson in self.get_all_lessons() if lesson.duration_minutes)
+        return self.get_stats().total_duration_minutes
     
     @property
     def enrollment_count(self):
-        return self.enrollments.filter(is_active=True).count()
+        return self.get_stats().enrollment_count
     
     @property
     def average_rating(self):
-        reviews = self.reviews.all()
-        if reviews:
-            return sum(review.rating for review in reviews) / len(reviews)
-        return 0
+        return self.get_stats().average_rating
     
     def get_all_lessons(self):
-        """Get all lessons across all modules"""
-        from itertools import chain
-        return list(chain(*[module.lessons.all() for module in self.modules.all()]))
+        """Get all lessons across all modules, in outline order"""
+        from .outline import get_course_outline
+        lesson_ids = get_course_outline(self.pk).all_lesson_ids
+        lessons = Lesson.objects.in_bulk(lesson_ids)
+        return [lessons[pk] for pk in lesson_ids if pk in lessons]
     
     def is_free(self):
         return self.price_type == 'free' or self.price == 0
+    
+    def clone(self, title=None, instructor=None):
+        """Copy this course and its content as a new draft (see courses.cloning)"""
+        from .cloning import clone_course
+        return clone_course(self, title=title, instructor=instructor)
 
 
 class Module(models.Model):
@@ -158,6 +200,11 @@ class Module(models.Model):
     
     def __str__(self):
         return f"{self.course.title} - {self.title}"
+    
+    def save(self, *args, **kwargs):
+        # Keep CourseStats in the same transaction as the row itself
+        with transaction.atomic():
+            super().save(*args, **kwargs)
 
 
 class Lesson(models.Model):
@@ -201,7 +248,8 @@ class Lesson(models.Model):
     def save(self, *args, **kwargs):
         if not self.slug:
             self.slug = slugify(self.title)
-        super().save(*args, **kwargs)
+        with transaction.atomic():
+            super().save(*args, **kwargs)
     
     def get_absolute_url(self):
         return reverse('courses:lesson_detail', kwargs={
@@ -231,6 +279,10 @@ class CourseReview(models.Model):
     
     def __str__(self):
         return f"{self.student.username} - {self.course.title} ({self.rating}/5)"
+    
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            super().save(*args, **kwargs)
 
 
 class CourseResource(models.Model):
@@ -257,3 +309,425 @@ class CourseResource(models.Model):
     
     def __str__(self):
         return f"{self.course.title} - {self.title}"
+
+
+class CourseStats(models.Model):
+    """Denormalized per-course counters, maintained on write by the signals below"""
+    course = models.OneToOneField(Course, on_delete=models.CASCADE, primary_key=True, related_name='stats')
+    
+    # Enrollments
+    enrollment_count = models.PositiveIntegerField(default=0, help_text="Active enrollments")
+    
+    # Reviews
+    review_count = models.PositiveIntegerField(default=0)
+    rating_sum = models.PositiveIntegerField(default=0)
+    rating_1_count = models.PositiveIntegerField(default=0)
+    rating_2_count = models.PositiveIntegerField(default=0)
+    rating_3_count = models.PositiveIntegerField(default=0)
+    rating_4_count = models.PositiveIntegerField(default=0)
+    rating_5_count = models.PositiveIntegerField(default=0)
+    rating_average = models.FloatField(default=0, help_text="rating_sum / review_count, stored as a sort key")
+    
+    # Content
+    lesson_count = models.PositiveIntegerField(default=0, help_text="Published lessons in published modules")
+    total_duration_minutes = models.PositiveIntegerField(default=0)
+    
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        verbose_name = "Course statistics"
+        verbose_name_plural = "Course statistics"
+        indexes = [
+            # Catalog sort keys (see courses.catalog)
+            models.Index(fields=['-rating_average', '-course']),
+            models.Index(fields=['-enrollment_count', '-course']),
+        ]
+    
+    def __str__(self):
+        return f"Stats for course {self.course_id}"
+    
+    @property
+    def average_rating(self):
+        return self.rating_average
+    
+    @property
+    def rating_histogram(self):
+        return {i: getattr(self, f'rating_{i}_count') for i in range(1, 6)}
+
+
+class CourseRecommendation(models.Model):
+    """Precomputed nearest neighbours of a course (see courses.recommendations)"""
+    course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='recommendations')
+    recommended = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='recommended_by')
+    rank = models.PositiveSmallIntegerField(help_text="1 is the closest neighbour")
+    score = models.FloatField()
+    co_enrollments = models.PositiveIntegerField(default=0, help_text="Students enrolled in both courses")
+    computed_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ['course', 'rank']
+        unique_together = ['course', 'recommended']
+        indexes = [
+            models.Index(fields=['course', 'rank']),
+        ]
+
+    def __str__(self):
+        return f"{self.course_id} -> {self.recommended_id} (#{self.rank})"
+
+
+def _published_lessons():
+    return Lesson.objects.filter(is_published=True, module__is_published=True)
+
+
+def rebuild_course_stats(course_ids=None):
+    """
+    Recompute CourseStats from scratch with one grouped query per section.
+    
+    Rebuilds every course when course_ids is None. Returns the number of rows written.
+    """
+    from enrollments.models import Enrollment
+    
+    courses = Course.objects.all()
+    enrollments = Enrollment.objects.filter(is_active=True)
+    reviews = CourseReview.objects.all()
+    lessons = _published_lessons()
+    if course_ids is not None:
+        courses = courses.filter(pk__in=course_ids)
+        enrollments = enrollments.filter(course_id__in=course_ids)
+        reviews = reviews.filter(course_id__in=course_ids)
+        lessons = lessons.filter(module__course_id__in=course_ids)
+    
+    enrollment_counts = dict(
+        enrollments.values('course_id').annotate(n=Count('id')).values_list('course_id', 'n')
+    )
+    review_rows = {
+        row['course_id']: row
+        for row in reviews.values('course_id').annotate(
+            review_count=Count('id'),
+            rating_sum=Sum('rating'),
+            **{f'rating_{i}_count': Count('id', filter=Q(rating=i)) for i in range(1, 6)}
+        )
+    }
+    lesson_rows = {
+        row['module__course_id']: row
+        for row in lessons.values('module__course_id').annotate(
+            lesson_count=Count('id'),
+            total_duration_minutes=Sum('duration_minutes'),
+        )
+    }
+    
+    now = timezone.now()
+    rows = []
+    for course_id in courses.values_list('pk', flat=True):
+        review_row = review_rows.get(course_id, {})
+        lesson_row = lesson_rows.get(course_id, {})
+        rows.append(CourseStats(
+            course_id=course_id,
+            enrollment_count=enrollment_counts.get(course_id, 0),
+            review_count=review_row.get('review_count', 0),
+            rating_sum=review_row.get('rating_sum') or 0,
+            rating_average=(review_row.get('rating_sum') or 0) / review_row['review_count'] if review_row else 0,
+            lesson_count=lesson_row.get('lesson_count', 0),
+            total_duration_minutes=lesson_row.get('total_duration_minutes') or 0,
+            updated_at=now,
+            **{f'rating_{i}_count': review_row.get(f'rating_{i}_count', 0) for i in range(1, 6)}
+        ))
+    
+    update_fields = [
+        f.name for f in CourseStats._meta.concrete_fields if not f.primary_key
+    ]
+    CourseStats.objects.bulk_create(
+        rows,
+        batch_size=500,
+        update_conflicts=True,
+        unique_fields=['course'],
+        update_fields=update_fields,
+    )
+    return len(rows)
+
+
+def _rating_average_after(review_delta, rating_delta):
+    """Expression for rating_average once the given deltas are applied"""
+    # An UPDATE reads the pre-update row, so the deltas are applied here too
+    review_count = F('review_count') + review_delta
+    return Case(
+        When(Q(review_count__gt=-review_delta), then=Cast(F('rating_sum') + rating_delta, FloatField()) / review_count),
+        default=Value(0.0),
+        output_field=FloatField(),
+    )
+
+
+def _apply_stats_delta(course_id, **deltas):
+    """Apply F() increments to a course's stats row, rebuilding it if missing"""
+    changes = {field: F(field) + delta for field, delta in deltas.items() if delta}
+    if not changes:
+        return
+    if 'review_count' in changes or 'rating_sum' in changes:
+        changes['rating_average'] = _rating_average_after(deltas.get('review_count', 0), deltas.get('rating_sum', 0))
+    updated = CourseStats.objects.filter(course_id=course_id).update(updated_at=timezone.now(), **changes)
+    if not updated and Course.objects.filter(pk=course_id).exists():
+        rebuild_course_stats([course_id])
+
+
+def _review_deltas(rating, sign):
+    return {'review_count': sign, 'rating_sum': sign * rating, f'rating_{rating}_count': sign}
+
+
+def refresh_course_content_stats(course_id, rebuild_missing=True):
+    """Recount published lessons and minutes for one course"""
+    totals = _published_lessons().filter(module__course_id=course_id).aggregate(
+        lesson_count=Count('id'),
+        total_duration_minutes=Sum('duration_minutes'),
+    )
+    updated = CourseStats.objects.filter(course_id=course_id).update(
+        lesson_count=totals['lesson_count'],
+        total_duration_minutes=totals['total_duration_minutes'] or 0,
+        updated_at=timezone.now(),
+    )
+    if not updated and rebuild_missing and Course.objects.filter(pk=course_id).exists():
+        rebuild_course_stats([course_id])
+
+
+def _snapshot(instance, *fields):
+    # Read straight from __dict__ so deferred fields never trigger a query
+    if instance.pk is None:
+        return None
+    return tuple(instance.__dict__.get(field) for field in fields)
+
+
+# Signals keeping CourseStats in sync. post_init snapshots let updates apply
+# a delta (old value out, new value in) without re-reading the row.
+
+@receiver(post_save, sender=Course)
+def create_course_stats(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        CourseStats.objects.get_or_create(course=instance)
+
+
+@receiver(post_init, sender=CourseReview)
+def snapshot_review(sender, instance, **kwargs):
+    instance._stats_snapshot = _snapshot(instance, 'course_id', 'rating')
+
+
+@receiver(post_save, sender=CourseReview)
+def update_stats_on_review_save(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    previous = instance._stats_snapshot
+    current = (instance.course_id, instance.rating)
+    if previous != current:
+        if previous is not None:
+            _apply_stats_delta(previous[0], **_review_deltas(previous[1], -1))
+        _apply_stats_delta(current[0], **_review_deltas(current[1], 1))
+    instance._stats_snapshot = current
+
+
+@receiver(post_delete, sender=CourseReview)
+def update_stats_on_review_delete(sender, instance, **kwargs):
+    deltas = _review_deltas(instance.rating, -1)
+    CourseStats.objects.filter(course_id=instance.course_id).update(
+        updated_at=timezone.now(),
+        rating_average=_rating_average_after(deltas['review_count'], deltas['rating_sum']),
+        **{field: F(field) + delta for field, delta in deltas.items()}
+    )
+
+
+@receiver(post_init, sender='enrollments.Enrollment')
+def snapshot_enrollment(sender, instance, **kwargs):
+    instance._stats_snapshot = _snapshot(instance, 'course_id', 'is_active')
+
+
+@receiver(post_save, sender='enrollments.Enrollment')
+def update_stats_on_enrollment_save(sender, instance, created, raw=False, **kwargs):
+    """
+    Count enrollments that become active and uncount those that stop being.
+
+    A caller that already counted a new enrollment (enrollments.seats
+    claims the seat first) sets stats_counted = True on it before saving;
+    that save is then left out, and later saves are tracked as usual.
+    """
+    if raw:
+        return
+    previous = instance._stats_snapshot
+    current = (instance.course_id, instance.is_active)
+    if instance.__dict__.pop('stats_counted', False):
+        previous = current
+    if previous != current:
+        if previous is not None and previous[1]:
+            _apply_stats_delta(previous[0], enrollment_count=-1)
+            invalidate_course_page(previous[0])
+        if current[1]:
+            _apply_stats_delta(current[0], enrollment_count=1)
+            invalidate_course_page(current[0])
+    instance._stats_snapshot = current
+
+
+@receiver(post_delete, sender='enrollments.Enrollment')
+def update_stats_on_enrollment_delete(sender, instance, **kwargs):
+    if instance.is_active:
+        CourseStats.objects.filter(course_id=instance.course_id).update(
+            enrollment_count=F('enrollment_count') - 1,
+            updated_at=timezone.now(),
+        )
+        invalidate_course_page(instance.course_id)
+
+
+# Content changes refresh the lesson counters and retire the cached outline
+# and detail page
+
+def _course_content_changed(course_id, rebuild_missing):
+    from .outline import invalidate_course_outline
+    refresh_course_content_stats(course_id, rebuild_missing=rebuild_missing)
+    invalidate_course_outline(course_id)
+    invalidate_course_page(course_id)
+
+
+@receiver(post_save, sender=Module)
+def update_content_on_module_save(sender, instance, raw=False, **kwargs):
+    if not raw:
+        _course_content_changed(instance.course_id, rebuild_missing=True)
+
+
+@receiver(post_delete, sender=Module)
+def update_content_on_module_delete(sender, instance, **kwargs):
+    # Never recreate the stats row here: the course itself may be mid-cascade
+    _course_content_changed(instance.course_id, rebuild_missing=False)
+
+
+@receiver(post_init, sender=Lesson)
+def snapshot_lesson(sender, instance, **kwargs):
+    instance._stats_module_id = instance.__dict__.get('module_id') if instance.pk else None
+
+
+def _lesson_content_changed(instance, rebuild_missing):
+    # A lesson moved between modules touches both the old and the new course
+    module_ids = {instance.module_id, instance._stats_module_id} - {None}
+    course_ids = set(Module.objects.filter(pk__in=module_ids).values_list('course_id', flat=True))
+    for course_id in course_ids:
+        _course_content_changed(course_id, rebuild_missing=rebuild_missing)
+
+
+@receiver(post_save, sender=Lesson)
+def update_content_on_lesson_save(sender, instance, raw=False, **kwargs):
+    if not raw:
+        _lesson_content_changed(instance, rebuild_missing=True)
+        instance._stats_module_id = instance.module_id
+
+
+@receiver(post_delete, sender=Lesson)
+def update_content_on_lesson_delete(sender, instance, **kwargs):
+    _lesson_content_changed(instance, rebuild_missing=False)
+
+
+# Signals retiring the cached course detail page (see courses.page_cache).
+# Enrollment count and content changes are handled above.
+
+@receiver(post_save, sender=Course)
+def invalidate_page_on_course_save(sender, instance, raw=False, **kwargs):
+    if not raw:
+        invalidate_course_page(instance.pk)
+
+
+@receiver(post_save, sender=CourseReview)
+@receiver(post_delete, sender=CourseReview)
+def invalidate_page_on_review_change(sender, instance, **kwargs):
+    invalidate_course_page(instance.course_id)
+
+
+# Catalog facet counts are cached per catalog version (see courses.catalog)
+
+@receiver(post_save, sender=Course)
+@receiver(post_delete, sender=Course)
+def invalidate_catalog_on_course_change(sender, instance, raw=False, **kwargs):
+    if not raw:
+        from .catalog import invalidate_catalog
+        invalidate_catalog()
+
+
+# Signals keeping the full-text search index in sync (see courses.search).
+# Category and instructor renames also retire the cached detail pages.
+
+@receiver(post_save, sender=Course)
+def index_course_on_save(sender, instance, raw=False, **kwargs):
+    if not raw:
+        from .search import index_courses
+        index_courses([instance.pk])
+
+
+@receiver(post_delete, sender=Course)
+def remove_course_from_index(sender, instance, **kwargs):
+    from .search import remove_courses
+    remove_courses([instance.pk])
+
+
+@receiver(post_delete, sender=Course)
+def delete_cover_image_variants(sender, instance, **kwargs):
+    schedule_variant_cleanup(instance, 'cover_image', 'cover_image_variants')
+
+
+# Course clones point at the same stored media as their source. django_cleanup
+# deletes a file when its row is deleted or the field changes; keep it while
+# any other row still references it.
+
+@receiver(cleanup_pre_delete)
+def keep_shared_media(sender, file, **kwargs):
+    field = getattr(file, 'field', None)
+    if field is None or not file.name:
+        return
+    if field.model._default_manager.filter(**{field.name: file.name}).exists():
+        # An empty name makes FieldFile.delete() a no-op
+        file.name = None
+
+
+@receiver(post_init, sender=Category)
+def snapshot_category(sender, instance, **kwargs):
+    instance._search_snapshot = _snapshot(instance, 'name')
+
+
+@receiver(post_save, sender=Category)
+def reindex_category_courses(sender, instance, created, raw=False, **kwargs):
+    if raw or created or instance._search_snapshot == (instance.name,):
+        return
+    from .search import index_courses
+    course_ids = list(instance.course_set.values_list('pk', flat=True))
+    index_courses(course_ids)
+    for course_id in course_ids:
+        invalidate_course_page(course_id)
+    instance._search_snapshot = (instance.name,)
+
+
+@receiver(pre_delete, sender=Category)
+def collect_category_courses(sender, instance, **kwargs):
+    # Courses are detached with SET_NULL, which bypasses their save signals
+    instance._search_course_ids = list(instance.course_set.values_list('pk', flat=True))
+
+
+@receiver(post_delete, sender=Category)
+def reindex_detached_courses(sender, instance, **kwargs):
+    course_ids = getattr(instance, '_search_course_ids', None)
+    if course_ids:
+        from .catalog import invalidate_catalog
+        from .search import index_courses
+        index_courses(course_ids)
+        invalidate_catalog()
+        for course_id in course_ids:
+            invalidate_course_page(course_id)
+
+
+@receiver(post_init, sender=settings.AUTH_USER_MODEL)
+def snapshot_instructor_name(sender, instance, **kwargs):
+    instance._search_snapshot = _snapshot(instance, 'first_name', 'last_name', 'username')
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def reindex_instructor_courses(sender, instance, created, raw=False, **kwargs):
+    current = (instance.first_name, instance.last_name, instance.username)
+    if raw or created or instance._search_snapshot == current:
+        return
+    course_ids = list(Course.objects.filter(instructor=instance).values_list('pk', flat=True))
+    if course_ids:
+        from .search import index_courses
+        index_courses(course_ids)
+    for course_id in course_ids:
+        invalidate_course_page(course_id)
+    instance._search_snapshot = current
@@ -0,0 +1,152 @@
+"""
+Cached course outline: the ordered module/lesson sequence of a course.
+
+The outline is built with two small queries and stored in the cache under a
+per-course version token. Module and Lesson signals (see courses.models)
+replace the token, so stale outlines are never read again and simply expire.
+Once loaded, position, previous/next and first-incomplete lookups are
+dictionary hits with no database access.
+"""
+from collections import namedtuple
+
+from django.core.cache import cache
+from django.urls import reverse
+
+from lms_project.cache_versions import bump_version, get_version
+
+from .models import Lesson, Module
+
+OUTLINE_TIMEOUT = 60 * 60 * 24
+
+_LessonRow = namedtuple(
+    '_LessonRow',
+    'id module_id title lesson_type duration_minutes is_published is_preview'
+)
+
+
+class OutlineLesson(_LessonRow):
+    """Lightweight stand-in for a Lesson row in navigation and sidebars"""
+    __slots__ = ()
+
+    @property
+    def pk(self):
+        return self.id
+
+    def get_absolute_url(self):
+        return reverse('courses:lesson_detail', kwargs={'pk': self.id})
+
+
+_ModuleRow = namedtuple('_ModuleRow', 'id title order is_published lessons')
+
+
+class OutlineModule(_ModuleRow):
+    """A module with its lessons (all of them, published or not)"""
+    __slots__ = ()
+
+    @property
+    def published_lessons(self):
+        return [lesson for lesson in self.lessons if lesson.is_published]
+
+
+class CourseOutline:
+    """
+    Ordered modules and lessons of one course.
+
+    `lessons` is the student-visible sequence: published lessons inside
+    published modules, in module order then lesson order.
+    """
+
+    def __init__(self, course_id, modules):
+        self.course_id = course_id
+        self.modules = modules
+        self.lessons = [
+            lesson
+            for module in modules if module.is_published
+            for lesson in module.lessons if lesson.is_published
+        ]
+        self._positions = {lesson.id: index for index, lesson in enumerate(self.lessons)}
+        self._by_id = {lesson.id: lesson for module in modules for lesson in module.lessons}
+
+    def __len__(self):
+        return len(self.lessons)
+
+    @property
+    def published_modules(self):
+        return [module for module in self.modules if module.is_published]
+
+    @property
+    def lesson_ids(self):
+        return [lesson.id for lesson in self.lessons]
+
+    @property
+    def all_lesson_ids(self):
+        """Every lesson in outline order, published or not"""
+        return [lesson.id for module in self.modules for lesson in module.lessons]
+
+    def get(self, lesson_id):
+        return self._by_id.get(lesson_id)
+
+    def position(self, lesson_id):
+        """Zero-based index in the visible sequence, or None if not visible"""
+        return self._positions.get(lesson_id)
+
+    def previous(self, lesson_id):
+        index = self._positions.get(lesson_id)
+        if not index:
+            return None
+        return self.lessons[index - 1]
+
+    def next(self, lesson_id):
+        index = self._positions.get(lesson_id)
+        if index is None or index + 1 >= len(self.lessons):
+            return None
+        return self.lessons[index + 1]
+
+    def first_incomplete(self, completed_ids):
+        """First visible lesson whose id is not in completed_ids"""
+        for lesson in self.lessons:
+            if lesson.id not in completed_ids:
+                return lesson
+        return None
+
+
+def _namespace(course_id):
+    return f'course_outline:{course_id}'
+
+
+def _outline_key(course_id, version):
+    return f'course_outline:{course_id}:{version}'
+
+
+def build_course_outline(course_id):
+    """Build an outline straight from the database (two queries)"""
+    lessons_by_module = {}
+    lesson_rows = Lesson.objects.filter(module__course_id=course_id).order_by(
+        'order', 'created_at', 'id'
+    ).values_list(*_LessonRow._fields)
+    for row in lesson_rows:
+        lessons_by_module.setdefault(row[1], []).append(OutlineLesson(*row))
+
+    modules = [
+        OutlineModule(module_id, title, order, is_published, tuple(lessons_by_module.get(module_id, ())))
+        for module_id, title, order, is_published in Module.objects.filter(course_id=course_id).order_by(
+            'order', 'created_at', 'id'
+        ).values_list('id', 'title', 'order', 'is_published')
+    ]
+    return CourseOutline(course_id, modules)
+
+
+def get_course_outline(course_id):
+    """Return the cached outline for a course, building it on a miss"""
+    version = get_version(_namespace(course_id))
+    key = _outline_key(course_id, version)
+    outline = cache.get(key)
+    if outline is None:
+        outline = build_course_outline(course_id)
+        cache.set(key, outline, OUTLINE_TIMEOUT)
+    return outline
+
+
+def invalidate_course_outline(course_id):
+    """Retire the cached outline for a course"""
+    bump_version(_namespace(course_id))
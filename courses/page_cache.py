@@ -0,0 +1,27 @@
+"""
+Fragment caching for the public course detail page.
+
+Everything on the page that is the same for every visitor (course facts,
+stats, outline, reviews, related courses) is rendered once per course and
+content version with {% cache %}. Only the visitor's enrollment state is
+computed per request. The signals in courses.models bump the version when
+the course, its content, reviews or enrollment count change; anything
+they cannot see (such as a recommendations rebuild) shows up within
+COURSE_PAGE_TIMEOUT.
+"""
+from lms_project.cache_versions import bump_version, get_version
+
+COURSE_PAGE_TIMEOUT = 60 * 60
+
+
+def _namespace(course_id):
+    return f'course_page:{course_id}'
+
+
+def course_page_version(course_id):
+    return get_version(_namespace(course_id))
+
+
+def invalidate_course_page(course_id):
+    """Retire the cached detail page fragments of a course"""
+    bump_version(_namespace(course_id))
@@ -0,0 +1,167 @@
+"""
+Co-enrollment course recommendations.
+
+An offline job (the build_recommendations management command) turns the
+enrollment table into a sparse student x course matrix X. X.T @ X gives the
+course x course co-enrollment counts, which are normalised to cosine
+similarity and blended with category and difficulty affinity. The top-N
+neighbours of every published course are stored in CourseRecommendation so
+request handlers only ever read precomputed rows through an index.
+"""
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from .models import Course, CourseRecommendation
+
+DEFAULT_TOP_N = 10
+
+# Blend of the three signals; cosine similarity dominates, the affinities
+# break ties and give courses with no co-enrollments sensible neighbours
+COSINE_WEIGHT = 0.7
+CATEGORY_WEIGHT = 0.2
+DIFFICULTY_WEIGHT = 0.1
+
+DIFFICULTY_ORDER = {'beginner': 0, 'intermediate': 1, 'advanced': 2}
+
+# Rows of the dense score matrix materialised at once
+BLOCK_SIZE = 512
+
+
+def _enrollment_pairs(course_index):
+    from enrollments.models import Enrollment
+    rows = Enrollment.objects.exclude(status='dropped').filter(
+        course_id__in=course_index
+    ).values_list('student_id', 'course_id')
+    return list(rows.iterator(chunk_size=10000))
+
+
+def compute_recommendations(top_n=DEFAULT_TOP_N):
+    """
+    Return {course_id: [(recommended_id, score, co_enrollments), ...]} for
+    every published course, best first.
+    """
+    import numpy as np
+    from scipy import sparse
+
+    courses = list(
+        Course.objects.filter(status='published').order_by('pk').values_list(
+            'pk', 'category_id', 'difficulty_level'
+        )
+    )
+    if len(courses) < 2:
+        return {}
+    course_ids = np.array([pk for pk, _, _ in courses])
+    course_index = {pk: i for i, pk in enumerate(course_ids.tolist())}
+    categories = np.array([-1 if category is None else category for _, category, _ in courses])
+    levels = np.array([DIFFICULTY_ORDER.get(level, 0) for _, _, level in courses], dtype=float)
+    n = len(courses)
+
+    # Sparse binary student x course matrix
+    pairs = _enrollment_pairs(course_index)
+    if pairs:
+        students, course_cols = zip(*pairs)
+        _, student_rows = np.unique(np.array(students), return_inverse=True)
+        cols = np.fromiter((course_index[c] for c in course_cols), dtype=np.int64, count=len(pairs))
+        enrollments = sparse.csr_matrix(
+            (np.ones(len(pairs), dtype=np.float64), (student_rows, cols)),
+            shape=(student_rows.max() + 1, n),
+        )
+    else:
+        enrollments = sparse.csr_matrix((1, n), dtype=np.float64)
+
+    # Course x course co-enrollment counts and per-course enrollment totals
+    co_counts = (enrollments.T @ enrollments).tocsr()
+    totals = np.asarray(co_counts.diagonal()).ravel()
+    inverse_norms = np.zeros(n)
+    np.divide(1.0, np.sqrt(totals), out=inverse_norms, where=totals > 0)
+    cosine = sparse.diags(inverse_norms) @ co_counts @ sparse.diags(inverse_norms)
+    cosine = cosine.tocsr()
+
+    top_n = min(top_n, n - 1)
+    results = {}
+    for start in range(0, n, BLOCK_SIZE):
+        stop = min(start + BLOCK_SIZE, n)
+        rows = np.arange(start, stop)
+
+        same_category = (categories[rows, None] == categories[None, :]) & (categories[rows, None] >= 0)
+        difficulty = 1.0 - np.abs(levels[rows, None] - levels[None, :]) / 2.0
+        scores = (
+            COSINE_WEIGHT * cosine[start:stop].toarray()
+            + CATEGORY_WEIGHT * same_category
+            + DIFFICULTY_WEIGHT * difficulty
+        )
+        scores[np.arange(stop - start), rows] = -np.inf  # never recommend itself
+
+        # Unordered top-N per row, then sort just those columns
+        candidates = np.argpartition(-scores, top_n - 1, axis=1)[:, :top_n]
+        candidate_scores = np.take_along_axis(scores, candidates, axis=1)
+        order = np.argsort(-candidate_scores, axis=1, kind='stable')
+        candidates = np.take_along_axis(candidates, order, axis=1)
+        counts = co_counts[start:stop].toarray()
+
+        for offset, row in enumerate(rows):
+            neighbours = []
+            for col in candidates[offset]:
+                score = scores[offset, col]
+                if score > 0:
+                    neighbours.append((int(course_ids[col]), float(score), int(counts[offset, col])))
+            results[int(course_ids[row])] = neighbours
+    return results
+
+
+def build_recommendations(top_n=DEFAULT_TOP_N):
+    """Recompute and replace every stored recommendation; returns the row count"""
+    neighbours = compute_recommendations(top_n)
+    now = timezone.now()
+    rows = [
+        CourseRecommendation(
+            course_id=course_id, recommended_id=recommended_id, rank=rank,
+            score=score, co_enrollments=co_enrollments, computed_at=now,
+        )
+        for course_id, items in neighbours.items()
+        for rank, (recommended_id, score, co_enrollments) in enumerate(items, start=1)
+    ]
+    with transaction.atomic():
+        CourseRecommendation.objects.all().delete()
+        CourseRecommendation.objects.bulk_create(rows, batch_size=1000)
+    return len(rows)
+
+
+def related_courses(course, limit=4):
+    """Stored neighbours of a course, closest first (one indexed query)"""
+    return list(
+        Course.objects.filter(
+            recommended_by__course=course, status='published'
+        ).select_related('instructor', 'stats').order_by('recommended_by__rank')[:limit]
+    )
+
+
+def recommend_for_student(student, limit=5):
+    """
+    Courses related to the student's enrollments that they haven't taken.
+
+    Each course carries a `recommended_because` attribute: the enrolled
+    course it is closest to ("because you took X").
+    """
+    from enrollments.models import Enrollment
+    enrolled = Enrollment.objects.filter(student=student)
+    rows = CourseRecommendation.objects.filter(
+        Exists(enrolled.filter(course=OuterRef('course'))),
+        recommended__status='published',
+    ).exclude(
+        Exists(enrolled.filter(course=OuterRef('recommended')))
+    ).select_related(
+        'course', 'recommended__instructor', 'recommended__stats'
+    ).order_by('-score', 'rank')[:limit * 4]
+
+    courses = {}
+    for row in rows:
+        # Rows are best-first, so the first hit per course is its best reason
+        if row.recommended_id not in courses:
+            course = row.recommended
+            course.recommended_because = row.course
+            courses[row.recommended_id] = course
+            if len(courses) == limit:
+                break
+    return list(courses.values())
@@ -0,0 +1,267 @@
+"""
+Full-text search for the course catalog.
+
+PostgreSQL keeps a weighted tsvector in Course.search_vector behind a GIN
+index. SQLite mirrors the same text into an FTS5 shadow table keyed by the
+course id. Any other backend falls back to icontains matching.
+
+Both engines are kept in sync by the signals in courses.models and can be
+rebuilt with the rebuild_search_index management command.
+"""
+import re
+
+from django.db import connections
+from django.db.models import CharField, F, FloatField, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce, Concat, NullIf, Trim
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+from .models import Category, Course
+
+# Snippet delimiters are control characters so the text can be escaped
+# before they are turned into <mark> tags.
+HIGHLIGHT_START = '\x02'
+HIGHLIGHT_STOP = '\x03'
+
+FTS_TABLE = 'courses_course_fts'
+GIN_INDEX = 'courses_course_search_vector_gin'
+SEARCH_CONFIG = 'english'
+
+# Indexed document columns and their PostgreSQL weight (A is strongest)
+INDEXED_COLUMNS = [
+    ('title', 'A'),
+    ('short_description', 'B'),
+    ('description', 'C'),
+    ('meta_keywords', 'B'),
+    ('category', 'B'),
+    ('instructor', 'C'),
+]
+# bm25 column weights matching the PostgreSQL A-D scale
+SQLITE_WEIGHTS = {'A': 10.0, 'B': 4.0, 'C': 1.0, 'D': 0.5}
+
+
+def _category_name():
+    return Subquery(Category.objects.filter(pk=OuterRef('category_id')).values('name')[:1])
+
+
+def _instructor_name():
+    from django.contrib.auth import get_user_model
+    User = get_user_model()
+    full_name = Trim(Concat('first_name', Value(' '), 'last_name', output_field=CharField()))
+    return Subquery(
+        User.objects.filter(pk=OuterRef('instructor_id')).annotate(
+            display_name=Coalesce(NullIf(full_name, Value('')), 'username')
+        ).values('display_name')[:1]
+    )
+
+
+class BaseSearchBackend:
+    """icontains fallback used when the database has no full-text engine"""
+
+    def __init__(self, connection):
+        self.connection = connection
+
+    def setup(self):
+        """Create any index structures. Must be idempotent."""
+
+    def index(self, course_ids=None):
+        """(Re)index the given courses, or every course when None"""
+
+    def remove(self, course_ids):
+        """Drop the given courses from the index"""
+
+    def search(self, queryset, query):
+        terms = query.split()
+        if not terms:
+            return queryset.none()
+        condition = Q()
+        for term in terms:
+            condition &= (
+                Q(title__icontains=term) | Q(short_description__icontains=term) |
+                Q(description__icontains=term) | Q(meta_keywords__icontains=term) |
+                Q(category__name__icontains=term)
+            )
+        return queryset.filter(condition).annotate(
+            search_rank=Value(0.0, output_field=FloatField()),
+            search_snippet=F('short_description'),
+        ).order_by('-created_at')
+
+
+class PostgresSearchBackend(BaseSearchBackend):
+    """Weighted tsvector column with a GIN index"""
+
+    def setup(self):
+        with self.connection.cursor() as cursor:
+            cursor.execute(
+                f'CREATE INDEX IF NOT EXISTS {GIN_INDEX} '
+                f'ON {Course._meta.db_table} USING GIN (search_vector)'
+            )
+        # Backfill rows written before the index existed
+        stale = Course.objects.filter(search_vector__isnull=True).values_list('pk', flat=True)
+        if stale.exists():
+            self.index(stale)
+
+    def _vector(self):
+        from django.contrib.postgres.search import SearchVector
+        sources = {
+            'title': 'title',
+            'short_description': 'short_description',
+            'description': 'description',
+            'meta_keywords': 'meta_keywords',
+            'category': _category_name(),
+            'instructor': _instructor_name(),
+        }
+        vector = None
+        for column, weight in INDEXED_COLUMNS:
+            part = SearchVector(sources[column], weight=weight, config=SEARCH_CONFIG)
+            vector = part if vector is None else vector + part
+        return vector
+
+    def index(self, course_ids=None):
+        courses = Course.objects.all()
+        if course_ids is not None:
+            courses = courses.filter(pk__in=course_ids)
+        # A single set-based UPDATE; related names come from correlated subqueries
+        return courses.update(search_vector=self._vector())
+
+    def search(self, queryset, query):
+        from django.contrib.postgres.search import SearchHeadline, SearchQuery, SearchRank
+        if not query.strip():
+            return queryset.none()
+        search_query = SearchQuery(query, search_type='websearch', config=SEARCH_CONFIG)
+        return queryset.filter(search_vector=search_query).annotate(
+            search_rank=SearchRank(F('search_vector'), search_query),
+            search_snippet=SearchHeadline(
+                'description', search_query,
+                config=SEARCH_CONFIG,
+                start_sel=HIGHLIGHT_START,
+                stop_sel=HIGHLIGHT_STOP,
+                max_words=30,
+                min_words=15,
+            ),
+        ).order_by('-search_rank', '-created_at')
+
+
+class SqliteSearchBackend(BaseSearchBackend):
+    """FTS5 shadow table whose rowid is the course id"""
+
+    def setup(self):
+        with self.connection.cursor() as cursor:
+            cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [FTS_TABLE])
+            exists = cursor.fetchone() is not None
+            columns = ', '.join(column for column, _ in INDEXED_COLUMNS)
+            cursor.execute(
+                f'CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} '
+                f"USING fts5({columns}, tokenize='porter unicode61')"
+            )
+        if not exists:
+            self.index()
+
+    def _select_sql(self):
+        from django.contrib.auth import get_user_model
+        course = Course._meta.db_table
+        category = Category._meta.db_table
+        user = get_user_model()._meta.db_table
+        return (
+            f"SELECT c.id, c.title, c.short_description, c.description, c.meta_keywords, "
+            f"COALESCE(cat.name, ''), "
+            f"COALESCE(NULLIF(TRIM(u.first_name || ' ' || u.last_name), ''), u.username) "
+            f"FROM {course} c "
+            f"LEFT JOIN {category} cat ON cat.id = c.category_id "
+            f"LEFT JOIN {user} u ON u.id = c.instructor_id"
+        )
+
+    def index(self, course_ids=None):
+        columns = ', '.join(column for column, _ in INDEXED_COLUMNS)
+        insert = f'INSERT INTO {FTS_TABLE} (rowid, {columns}) {self._select_sql()}'
+        with self.connection.cursor() as cursor:
+            if course_ids is None:
+                cursor.execute(f'DELETE FROM {FTS_TABLE}')
+                cursor.execute(insert)
+                return
+            for chunk in _chunks(list(course_ids), 500):
+                placeholders = ', '.join(['%s'] * len(chunk))
+                cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid IN ({placeholders})', chunk)
+                cursor.execute(f'{insert} WHERE c.id IN ({placeholders})', chunk)
+
+    def remove(self, course_ids):
+        with self.connection.cursor() as cursor:
+            for chunk in _chunks(list(course_ids), 500):
+                placeholders = ', '.join(['%s'] * len(chunk))
+                cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid IN ({placeholders})', chunk)
+
+    def search(self, queryset, query):
+        match = to_fts_query(query)
+        if not match:
+            return queryset.none()
+        weights = ', '.join(str(SQLITE_WEIGHTS[weight]) for _, weight in INDEXED_COLUMNS)
+        # bm25() is lower-is-better, so negate it to match PostgreSQL's ts_rank
+        return queryset.extra(
+            tables=[FTS_TABLE],
+            where=[f'{FTS_TABLE}.rowid = {Course._meta.db_table}.id', f'{FTS_TABLE} MATCH %s'],
+            params=[match],
+            select={
+                'search_rank': f'-bm25({FTS_TABLE}, {weights})',
+                'search_snippet': (
+                    f"snippet({FTS_TABLE}, -1, '{HIGHLIGHT_START}', '{HIGHLIGHT_STOP}', '…', 24)"
+                ),
+            },
+        ).order_by('-search_rank', '-created_at')
+
+
+BACKENDS = {
+    'postgresql': PostgresSearchBackend,
+    'sqlite': SqliteSearchBackend,
+}
+
+
+def _chunks(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def to_fts_query(query):
+    """Turn free text into a safe FTS5 MATCH expression (AND of quoted terms)"""
+    terms = re.findall(r'\w+', query.lower())
+    if not terms:
+        return ''
+    quoted = [f'"{term}"' for term in terms]
+    # Prefix-match the last term so partially typed words still hit
+    quoted[-1] += '*'
+    return ' '.join(quoted)
+
+
+def get_search_backend(using='default'):
+    connection = connections[using]
+    return BACKENDS.get(connection.vendor, BaseSearchBackend)(connection)
+
+
+def search_courses(queryset, query):
+    """
+    Filter a Course queryset by relevance to query.
+
+    Results are annotated with search_rank (higher is better) and
+    search_snippet, and ordered by rank.
+    """
+    return get_search_backend(queryset.db).search(queryset, query)
+
+
+def index_courses(course_ids=None, using='default'):
+    get_search_backend(using).index(course_ids)
+
+
+def remove_courses(course_ids, using='default'):
+    get_search_backend(using).remove(course_ids)
+
+
+def setup_search(using='default'):
+    get_search_backend(using).setup()
+
+
+def highlight(snippet):
+    """Escape a search snippet and turn the match delimiters into <mark> tags"""
+    if not snippet:
+        return ''
+    return mark_safe(
+        escape(snippet).replace(HIGHLIGHT_START, '<mark>').replace(HIGHLIGHT_STOP, '</mark>')
+    )
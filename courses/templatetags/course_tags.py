@@ -0,0 +1,27 @@
+from django import template
+
+from courses.search import highlight
+
+register = template.Library()
+
+
+@register.filter
+def search_highlight(snippet):
+    """Render a search snippet with matched terms wrapped in <mark>"""
+    return highlight(snippet)
+
+
+@register.simple_tag(takes_context=True)
+def query_string(context, **kwargs):
+    """
+    Return the current query string with the given parameters replaced.
+
+    Passing None removes a parameter: {% query_string cursor=page_obj.next_cursor page=None %}
+    """
+    params = context['request'].GET.copy()
+    for key, value in kwargs.items():
+        if value is None:
+            params.pop(key, None)
+        else:
+            params[key] = value
+    return '?' + params.urlencode() if params else '?'
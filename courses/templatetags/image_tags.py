@@ -0,0 +1,29 @@
+from django import template
+from django.forms.utils import flatatt
+from django.utils.html import format_html
+
+from lms_project.images import srcset
+
+register = template.Library()
+
+
+@register.simple_tag
+def responsive_image(file, variants, sizes='100vw', **attrs):
+    """
+    Render an image with WebP and JPEG srcsets from its recorded variants.
+
+    Falls back to a plain <img> of the original file while the variants are
+    still being generated: {% responsive_image course.cover_image course.cover_image_variants sizes="(min-width: 768px) 33vw, 100vw" class="card-img-top" alt=course.title %}
+    """
+    if not file:
+        return ''
+    attrs.setdefault('loading', 'lazy')
+    jpeg_srcset = srcset(file, variants, 'jpeg')
+    if not jpeg_srcset:
+        return format_html('<img src="{}"{}>', file.url, flatatt(attrs))
+    return format_html(
+        '<picture><source type="image/webp" srcset="{}" sizes="{}">'
+        '<img src="{}" srcset="{}" sizes="{}"{}></picture>',
+        srcset(file, variants, 'webp'), sizes,
+        file.url, jpeg_srcset, sizes, flatatt(attrs),
+    )
@@ -1,3 +1,1116 @@
-from django.test import TestCase
+import json
+import shutil
+import tempfile
+from io import BytesIO, StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import F
+from django.urls import reverse
+from django.utils import timezone
+
+from lms_project.images import srcset
+from lms_project.pagination import KeysetPaginator
+from PIL import Image
+
+from . import catalog
+from .models import Category, Course, CourseRecommendation, CourseReview, CourseStats, Lesson, Module
+from .outline import get_course_outline
+from .recommendations import build_recommendations, recommend_for_student, related_courses
+from .search import highlight, search_courses
+from .transfer import InvalidImport, export_courses, import_courses
+from enrollments.models import Enrollment, LessonProgress
+from quizzes.models import AnswerChoice, Question, Quiz, QuizAttempt
+
+User = get_user_model()
+
+
+def create_course(instructor, **kwargs):
+    """Create a published course with sensible defaults"""
+    defaults = {
+        'title': 'Python Basics',
+        'description': 'Learn Python from scratch',
+        'short_description': 'Python for beginners',
+        'duration_weeks': 4,
+        'estimated_hours': 20,
+        'status': 'published',
+    }
+    defaults.update(kwargs)
+    return Course.objects.create(instructor=instructor, **defaults)
+
+
+class CourseStatsTestCase(TestCase):
+    """Test cases for the denormalized CourseStats table"""
+
+    def setUp(self):
+        """Set up test data"""
+        self.instructor = User.objects.create_user(
+            username='instructor', email='instructor@test.com',
+            password='testpass123', user_type='instructor'
+        )
+        self.students = [
+            User.objects.create_user(
+                username=f'student{i}', email=f'student{i}@test.com',
+                password='testpass123', user_type='student'
+            )
+            for i in range(3)
+        ]
+        self.category = Category.objects.create(name='Programming')
+        self.course = create_course(self.instructor, category=self.category)
+
+    def stats(self):
+        return CourseStats.objects.get(course=self.course)
+
+    def test_stats_row_created_with_course(self):
+        """Test that a zeroed stats row exists as soon as the course does"""
+        stats = self.stats()
+        self.assertEqual(stats.enrollment_count, 0)
+        self.assertEqual(stats.average_rating, 0)
+
+    def test_enrollment_counter(self):
+        """Test that active enrollments are counted incrementally"""
+        enrollments = [
+            Enrollment.objects.create(student=student, course=self.course)
+            for student in self.students
+        ]
+        self.assertEqual(self.stats().enrollment_count, 3)
+
+        enrollments[0].is_active = False
+        enrollments[0].save()
+        enrollments[1].delete()
+        self.assertEqual(self.stats().enrollment_count, 1)
+
+    def test_review_counters_and_histogram(self):
+        """Test that rating sum, count and histogram follow review changes"""
+        reviews = [
+            CourseReview.objects.create(course=self.course, student=student, rating=rating, comment='ok')
+            for student, rating in zip(self.students, [5, 4, 4])
+        ]
+        stats = self.stats()
+        self.assertEqual(stats.review_count, 3)
+        self.assertAlmostEqual(stats.average_rating, 13 / 3)
+        self.assertEqual(stats.rating_histogram, {1: 0, 2: 0, 3: 0, 4: 2, 5: 1})
+
+        reviews[0].rating = 1
+        reviews[0].save()
+        reviews[1].delete()
+        stats = self.stats()
+        self.assertEqual(stats.review_count, 2)
+        self.assertEqual(stats.rating_sum, 5)
+        self.assertEqual(stats.rating_histogram, {1: 1, 2: 0, 3: 0, 4: 1, 5: 0})
+        self.assertEqual(stats.rating_average, 2.5)
+
+        reviews[2].delete()
+        reviews[0].delete()
+        self.assertEqual(self.stats().rating_average, 0)
+
+    def test_content_counters(self):
+        """Test that only published lessons in published modules are counted"""
+        module = Module.objects.create(course=self.course, title='Intro', order=1)
+        Lesson.objects.create(module=module, title='One', order=1, duration_minutes=10)
+        lesson = Lesson.objects.create(module=module, title='Two', order=2, duration_minutes=15)
+        hidden = Module.objects.create(course=self.course, title='Hidden', order=2, is_published=False)
+        Lesson.objects.create(module=hidden, title='Three', order=1, duration_minutes=30)
+
+        self.course.refresh_from_db()
+        self.assertEqual(self.course.total_lessons, 2)
+        self.assertEqual(self.course.total_duration_minutes, 25)
+
+        lesson.is_published = False
+        lesson.save()
+        self.course.refresh_from_db()
+        self.assertEqual(self.course.total_lessons, 1)
+
+    def test_properties_do_not_query(self):
+        """Test that stats properties are free once the row is loaded"""
+        course = Course.objects.select_related('stats').get(pk=self.course.pk)
+        with self.assertNumQueries(0):
+            course.total_lessons
+            course.enrollment_count
+            course.average_rating
+
+    def test_reconcile_command(self):
+        """Test that the reconcile command repairs drifted counters"""
+        Enrollment.objects.create(student=self.students[0], course=self.course)
+        CourseReview.objects.create(course=self.course, student=self.students[0], rating=3, comment='ok')
+        CourseStats.objects.filter(course=self.course).update(enrollment_count=99, review_count=0)
+
+        call_command('reconcile_course_stats', stdout=StringIO())
+        stats = self.stats()
+        self.assertEqual(stats.enrollment_count, 1)
+        self.assertEqual(stats.review_count, 1)
+        self.assertEqual(stats.rating_3_count, 1)
+
+    def test_course_delete_cascades(self):
+        """Test that deleting a course does not resurrect its stats row"""
+        module = Module.objects.create(course=self.course, title='Intro', order=1)
+        Lesson.objects.create(module=module, title='One', order=1)
+        Enrollment.objects.create(student=self.students[0], course=self.course)
+        self.course.delete()
+        self.assertFalse(CourseStats.objects.exists())
+
+
+class CourseSearchTestCase(TestCase):
+    """Test cases for full-text course search"""
+
+    def setUp(self):
+        """Set up test data"""
+        self.instructor = User.objects.create_user(
+            username='instructor', email='instructor@test.com', password='testpass123',
+            first_name='Ada', last_name='Lovelace', user_type='instructor'
+        )
+        self.category = Category.objects.create(name='Data Science')
+        self.python = create_course(
+            self.instructor, title='Python Basics',
+            description='Variables, loops and functions in Python.'
+        )
+        self.pandas = create_course(
+            self.instructor, title='Data Analysis', category=self.category,
+            short_description='Analysis for beginners',
+            description='Working with dataframes using pandas and Python.'
+        )
+        self.design = create_course(
+            self.instructor, title='Graphic Design', short_description='Design for beginners',
+            description='Colour theory and typography.'
+        )
+
+    def search(self, query):
+        return list(search_courses(Course.objects.all(), query))
+
+    def test_title_matches_rank_first(self):
+        """Test that title hits outrank body hits"""
+        results = self.search('python')
+        self.assertEqual(results, [self.python, self.pandas])
+        self.assertGreater(results[0].search_rank, results[1].search_rank)
+
+    def test_related_fields_are_indexed(self):
+        """Test that category and instructor names are searchable"""
+        self.assertEqual(self.search('science'), [self.pandas])
+        self.assertEqual(len(self.search('lovelace')), 3)
+
+    def test_index_follows_related_renames(self):
+        """Test that renaming a category or instructor reindexes its courses"""
+        self.category.name = 'Statistics'
+        self.category.save()
+        self.assertEqual(self.search('statistics'), [self.pandas])
+        self.assertEqual(self.search('science'), [])
+
+        self.instructor.last_name = 'Byron'
+        self.instructor.save()
+        self.assertEqual(self.search('lovelace'), [])
+
+    def test_index_follows_course_changes(self):
+        """Test that edits and deletes are reflected in results"""
+        self.design.title = 'Python for Designers'
+        self.design.save()
+        self.assertIn(self.design, self.search('python'))
+
+        self.design.delete()
+        self.assertEqual(len(self.search('python')), 2)
+
+    def test_snippet_is_escaped_and_highlighted(self):
+        """Test that snippets mark matches without trusting course text"""
+        self.design.description = '<script>alert(1)</script> typography rules'
+        self.design.save()
+        snippet = highlight(self.search('typography')[0].search_snippet)
+        self.assertIn('<mark>typography</mark>', snippet)
+        self.assertNotIn('<script>', snippet)
+
+    def test_query_syntax_is_neutralised(self):
+        """Test that FTS operators in user input do not raise"""
+        self.assertEqual(self.search('"python") -(*'), [self.python, self.pandas])
+        self.assertEqual(self.search('   '), [])
+
+    def test_course_list_view_filters(self):
+        """Test that the HTML catalog applies the search"""
+        response = self.client.get(reverse('courses:course_list'), {'search': 'pandas'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(response.context['courses']), [self.pandas])
+
+
+class KeysetPaginationTestCase(TestCase):
+    """Test cases for cursor pagination of the course catalog"""
+
+    def setUp(self):
+        """Set up test data"""
+        self.instructor = User.objects.create_user(
+            username='instructor', email='instructor@test.com',
+            password='testpass123', user_type='instructor'
+        )
+        timestamp = timezone.now()
+        self.courses = [
+            create_course(self.instructor, title=f'Course {i}', slug=f'course-{i}')
+            for i in range(30)
+        ]
+        # Ties on created_at must be broken by id
+        Course.objects.filter(pk__in=[c.pk for c in self.courses[10:20]]).update(created_at=timestamp)
+        self.expected = list(Course.objects.order_by('-created_at', '-id').values_list('pk', flat=True))
+
+    def walk(self, cursor_key='next_cursor', start=None):
+        url = reverse('courses:course_list')
+        seen, cursor = [], start
+        while True:
+            response = self.client.get(url, {'cursor': cursor} if cursor else {})
+            self.assertEqual(response.status_code, 200)
+            page = response.context['page_obj']
+            seen.append([c.pk for c in page.object_list])
+            has_more = page.has_next() if cursor_key == 'next_cursor' else page.has_previous()
+            if not has_more:
+                return seen, page
+            cursor = getattr(page, cursor_key)
+
+    def test_forward_walk_covers_every_course_once(self):
+        """Test that following next cursors visits each course exactly once"""
+        pages, _ = self.walk()
+        self.assertEqual([pk for page in pages for pk in page], self.expected)
+        self.assertEqual([len(page) for page in pages], [12, 12, 6])
+
+    def test_backward_walk(self):
+        """Test that previous cursors walk back to the first page"""
+        _, last_page = self.walk()
+        pages, _ = self.walk(cursor_key='previous_cursor', start=last_page.previous_cursor)
+        self.assertEqual([pk for page in reversed(pages) for pk in page], self.expected[:24])
+
+    def test_no_count_query(self):
+        """Test that cursor pages skip the COUNT(*) query"""
+        paginator = KeysetPaginator(Course.objects.all(), 12)
+        cursor = paginator.page().next_cursor
+        with self.assertNumQueries(1):
+            paginator.page(cursor)
+
+    def test_tampered_cursor_is_rejected(self):
+        """Test that forged cursors return 404"""
+        page = KeysetPaginator(Course.objects.all(), 12, salt='CourseListView').page()
+        response = self.client.get(reverse('courses:course_list'), {'cursor': page.next_cursor + 'x'})
+        self.assertEqual(response.status_code, 404)
+
+    def test_page_number_mode_still_available(self):
+        """Test that ?page= keeps the classic paginator"""
+        response = self.client.get(reverse('courses:course_list'), {'page': 2})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['paginator'].count, 30)
+        self.assertEqual([c.pk for c in response.context['courses']], self.expected[12:24])
+
+
+class CourseOutlineTestCase(TestCase):
+    """Test cases for the cached course outline"""
+
+    def setUp(self):
+        """Set up test data"""
+        cache.clear()
+        self.instructor = User.objects.create_user(
+            username='instructor', email='instructor@test.com',
+            password='testpass123', user_type='instructor'
+        )
+        self.course = create_course(self.instructor)
+        self.intro = Module.objects.create(course=self.course, title='Intro', order=1)
+        self.advanced = Module.objects.create(course=self.course, title='Advanced', order=2)
+        self.lessons = [
+            Lesson.objects.create(module=self.intro, title='Setup', order=1, duration_minutes=5),
+            Lesson.objects.create(module=self.intro, title='Draft', order=2, is_published=False),
+            Lesson.objects.create(module=self.intro, title='Hello', order=3),
+            Lesson.objects.create(module=self.advanced, title='Deep dive', order=1),
+        ]
+
+    def test_sequence_and_navigation(self):
+        """Test that the visible sequence skips unpublished lessons"""
+        outline = get_course_outline(self.course.pk)
+        setup, draft, hello, deep = self.lessons
+        self.assertEqual(outline.lesson_ids, [setup.pk, hello.pk, deep.pk])
+        self.assertIsNone(outline.previous(setup.pk))
+        self.assertEqual(outline.next(setup.pk).pk, hello.pk)
+        self.assertEqual(outline.next(hello.pk).pk, deep.pk)
+        self.assertIsNone(outline.next(deep.pk))
+        self.assertIsNone(outline.position(draft.pk))
+        self.assertEqual(outline.get(setup.pk).duration_minutes, 5)
+
+    def test_cached_outline_needs_no_queries(self):
+        """Test that a warm outline is served without touching the database"""
+        get_course_outline(self.course.pk)
+        with self.assertNumQueries(0):
+            outline = get_course_outline(self.course.pk)
+            outline.next(self.lessons[0].pk)
+
+    def test_lesson_changes_invalidate(self):
+        """Test that saving or deleting lessons and modules retires the outline"""
+        get_course_outline(self.course.pk)
+        draft = self.lessons[1]
+        draft.is_published = True
+        draft.save()
+        self.assertEqual(len(get_course_outline(self.course.pk)), 4)
+
+        self.advanced.is_published = False
+        self.advanced.save()
+        self.assertEqual(len(get_course_outline(self.course.pk)), 3)
+
+        self.lessons[0].delete()
+        self.assertEqual(len(get_course_outline(self.course.pk)), 2)
+
+    def test_next_lesson_creates_no_rows(self):
+        """Test that asking for the next lesson does not insert progress rows"""
+        student = User.objects.create_user(
+            username='student', email='student@test.com', password='testpass123'
+        )
+        enrollment = Enrollment.objects.create(student=student, course=self.course)
+        LessonProgress.objects.create(enrollment=enrollment, lesson=self.lessons[0], is_completed=True)
+
+        self.assertEqual(enrollment.get_next_lesson(), self.lessons[2])
+        self.assertEqual(LessonProgress.objects.count(), 1)
+
+
+def use_temporary_media_root(test):
+    """Point MEDIA_ROOT at a throwaway directory for the duration of a test"""
+    media_root = tempfile.mkdtemp()
+    settings_override = override_settings(MEDIA_ROOT=media_root)
+    settings_override.enable()
+    test.addCleanup(settings_override.disable)
+    test.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+
+
+def make_image(name='cover.png', size=(1600, 900), mode='RGBA'):
+    """Return an uploaded PNG of the given size"""
+    buffer = BytesIO()
+    Image.new(mode, size, (200, 40, 40, 128) if mode == 'RGBA' else (200, 40, 40)).save(buffer, 'PNG')
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/png')
+
+
+@override_settings(BACKGROUND_TASKS_EAGER=True)
+class CourseImageVariantsTestCase(TestCase):
+    """Test cases for the background image variant pipeline"""
+
+    def setUp(self):
+        """Set up test data"""
+        use_temporary_media_root(self)
+        self.instructor = User.objects.create_user(
+            username='instructor', email='instructor@test.com',
+            password='testpass123', user_type='instructor'
+        )
+        self.course = create_course(self.instructor)
+
+    def upload_cover(self, **kwargs):
+        self.course.cover_image = make_image(**kwargs)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.course.save()
+        self.course.refresh_from_db()
+
+    def test_variants_generated_after_commit(self):
+        """Test that a new cover produces every size in WebP and JPEG"""
+        self.course.cover_image = make_image()
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            self.course.save()
+        # Nothing is processed on the request path
+        self.course.refresh_from_db()
+        self.assertEqual(self.course.cover_image_variants, {})
+
+        for callback in callbacks:
+            callback()
+        self.course.refresh_from_db()
+        record = self.course.cover_image_variants
+        self.assertEqual(record['source'], self.course.cover_image.name)
+        self.assertEqual(set(record['sizes']), {'thumbnail', 'card', 'hero'})
+        hero = record['sizes']['hero']
+        self.assertEqual((hero['width'], hero['height']), (1280, 720))
+        storage = self.course.cover_image.storage
+        with storage.open(hero['webp']['name']) as f:
+            self.assertEqual(Image.open(f).format, 'WEBP')
+        with storage.open(hero['jpeg']['name']) as f:
+            image = Image.open(f)
+            self.assertEqual((image.format, image.mode), ('JPEG', 'RGB'))
+
+    def test_small_images_are_not_upscaled(self):
+        """Test that variants never exceed the source dimensions"""
+        self.upload_cover(size=(400, 300))
+        sizes = self.course.cover_image_variants['sizes']
+        self.assertEqual((sizes['thumbnail']['width'], sizes['thumbnail']['height']), (320, 180))
+        self.assertLessEqual(sizes['hero']['width'], 400)
+        self.assertLessEqual(sizes['hero']['height'], 300)
+
+    def test_unchanged_image_is_not_reprocessed(self):
+        """Test that saving other fields schedules no image work"""
+        self.upload_cover()
+        self.course.title = 'Renamed'
+        with mock.patch('lms_project.images.run_in_background') as run_in_background:
+            self.course.save()
+        run_in_background.assert_not_called()
+
+    def test_replacing_and_clearing_image_removes_old_variants(self):
+        """Test that stale variant files are deleted"""
+        self.upload_cover()
+        storage = self.course.cover_image.storage
+        old_name = self.course.cover_image_variants['sizes']['card']['webp']['name']
+
+        self.upload_cover(name='other.png')
+        self.assertFalse(storage.exists(old_name))
+        new_name = self.course.cover_image_variants['sizes']['card']['webp']['name']
+        self.assertTrue(storage.exists(new_name))
+
+        self.course.cover_image = None
+        with self.captureOnCommitCallbacks(execute=True):
+            self.course.save()
+        self.course.refresh_from_db()
+        self.assertEqual(self.course.cover_image_variants, {})
+        self.assertFalse(storage.exists(new_name))
+
+    def test_srcset_ignores_stale_record(self):
+        """Test that variants recorded for another source are not served"""
+        self.upload_cover()
+        self.assertIn('320w', srcset(self.course.cover_image, self.course.cover_image_variants))
+        self.course.cover_image.name = 'course_covers/elsewhere.png'
+        self.assertEqual(srcset(self.course.cover_image, self.course.cover_image_variants), '')
+
+    def test_backfill_command(self):
+        """Test that the management command fills in missing variants"""
+        self.upload_cover()
+        Course.objects.filter(pk=self.course.pk).update(cover_image_variants={})
+
+        out = StringIO()
+        call_command('generate_image_variants', '--only', 'covers', stdout=out)
+        self.course.refresh_from_db()
+        self.assertEqual(self.course.cover_image_variants['source'], self.course.cover_image.name)
+        self.assertIn('generated variants for 1 image(s)', out.getvalue())
+
+
+class ProtectedMediaTestCase(TestCase):
+    """Test cases for access-controlled lesson media with Range support"""
+
+    def setUp(self):
+        """Set up test data"""
+        use_temporary_media_root(self)
+        self.instructor = User.objects.create_user(
+            username='instructor', email='instructor@test.com',
+            password='testpass123', user_type='instructor'
+        )
+        self.student = User.objects.create_user(
+            username='student', email='student@test.com', password='testpass123'
+        )
+        self.course = create_course(self.instructor)
+        module = Module.objects.create(course=self.course, title='Intro', order=1)
+        self.content = bytes(range(256)) * 4
+        self.lesson = Lesson.objects.create(
+            module=module, title='Video', order=1,
+            video_file=SimpleUploadedFile('talk.mp4', self.content, content_type='video/mp4'),
+        )
+        self.url = reverse('courses:lesson_video', kwargs={'pk': self.lesson.pk})
+
+    def enroll(self):
+        Enrollment.objects.create(student=self.student, course=self.course)
+        self.client.login(username='student', password='testpass123')
+
+    def test_requires_enrollment(self):
+        """Test that only enrolled students (or previews) get the file"""
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 302)
+
+        self.client.login(username='student', password='testpass123')
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+
+        self.client.logout()
+        self.lesson.is_preview = True
+        self.lesson.save()
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), self.content)
+
+    def test_full_response_has_validators(self):
+        """Test that a plain GET returns the file with ETag and Last-Modified"""
+        self.enroll()
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'video/mp4')
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertEqual(int(response['Content-Length']), len(self.content))
+        self.assertIn('ETag', response)
+        self.assertIn('Last-Modified', response)
+
+        cached = self.client.get(self.url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(cached.status_code, 304)
+
+    def test_range_requests(self):
+        """Test that byte ranges return 206 with exactly the requested bytes"""
+        self.enroll()
+        size = len(self.content)
+        for header, start, end in [
+            ('bytes=100-199', 100, 199),
+            ('bytes=1000-', 1000, size - 1),
+            ('bytes=-24', size - 24, size - 1),
+            ('bytes=1000-99999', 1000, size - 1),
+        ]:
+            response = self.client.get(self.url, HTTP_RANGE=header)
+            self.assertEqual(response.status_code, 206, header)
+            self.assertEqual(response['Content-Range'], f'bytes {start}-{end}/{size}')
+            self.assertEqual(int(response['Content-Length']), end - start + 1)
+            self.assertEqual(b''.join(response.streaming_content), self.content[start:end + 1])
+
+        response = self.client.get(self.url, HTTP_RANGE=f'bytes={size}-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], f'bytes */{size}')
+
+    def test_if_range_mismatch_sends_whole_file(self):
+        """Test that a stale If-Range validator falls back to a 200"""
+        self.enroll()
+        response = self.client.get(self.url, HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE='"stale"')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(int(response['Content-Length']), len(self.content))
+
+    @override_settings(MEDIA_ACCEL_REDIRECT=True)
+    def test_accel_redirect(self):
+        """Test that nginx is asked to send the file when offloading is on"""
+        self.enroll()
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['X-Accel-Redirect'], '/protected-media/' + self.lesson.video_file.name)
+        self.assertEqual(response.content, b'')
+
+
+class CourseRecommendationTestCase(TestCase):
+    """Test cases for the co-enrollment recommender"""
+
+    def setUp(self):
+        """Set up test data"""
+        self.instructor = User.objects.create_user(
+            username='instructor', email='instructor@test.com',
+            password='testpass123', user_type='instructor'
+        )
+        self.students = [
+            User.objects.create_user(username=f'student{i}', email=f's{i}@test.com', password='testpass123')
+            for i in range(4)
+        ]
+        self.python, self.django, self.sql, self.drawing = [
+            create_course(self.instructor, title=title) for title in ('Python', 'Django', 'SQL', 'Drawing')
+        ]
+
+    def enroll(self, student, *courses):
+        for course in courses:
+            Enrollment.objects.create(student=student, course=course)
+
+    def test_co_enrollment_ranks_neighbours(self):
+        """Test that courses taken together are recommended first"""
+        for student in self.students[:3]:
+            self.enroll(student, self.python, self.django)
+        self.enroll(self.students[3], self.python, self.sql)
+
+        build_recommendations(top_n=2)
+        neighbours = list(
+            CourseRecommendation.objects.filter(course=self.python).values_list('recommended_id', 'rank', 'co_enrollments')
+        )
+        self.assertEqual(neighbours, [(self.django.pk, 1, 3), (self.sql.pk, 2, 1)])
+        self.assertFalse(CourseRecommendation.objects.filter(course=F('recommended')).exists())
+
+    def test_affinity_covers_courses_without_enrollments(self):
+        """Test that category and difficulty give cold-start neighbours"""
+        web = Category.objects.create(name='Web')
+        Course.objects.filter(pk__in=[self.python.pk, self.django.pk]).update(category=web)
+        Course.objects.filter(pk=self.drawing.pk).update(difficulty_level='advanced')
+
+        build_recommendations(top_n=3)
+        # Drawing shares nothing with Python, so it scores zero and is dropped
+        ranked = [course.pk for course in related_courses(self.python, limit=3)]
+        self.assertEqual(ranked, [self.django.pk, self.sql.pk])
+
+    def test_unpublished_courses_are_skipped(self):
+        """Test that drafts are neither sources nor recommendations"""
+        self.sql.status = 'draft'
+        self.sql.save()
+        build_recommendations()
+        self.assertFalse(CourseRecommendation.objects.filter(course=self.sql).exists())
+        self.assertFalse(CourseRecommendation.objects.filter(recommended=self.sql).exists())
+
+    def test_student_recommendations_exclude_enrolled(self):
+        """Test that students get new courses with the reason attached"""
+        for student in self.students[:3]:
+            self.enroll(student, self.python, self.django, self.sql)
+        self.enroll(self.students[3], self.python)
+        build_recommendations()
+
+        with self.assertNumQueries(1):
+            courses = recommend_for_student(self.students[3], limit=2)
+        self.assertEqual({course.pk for course in courses}, {self.django.pk, self.sql.pk})
+        self.assertTrue(all(course.recommended_because.pk == self.python.pk for course in courses))
+        self.assertEqual(recommend_for_student(self.students[0]), [self.drawing])
+
+    def test_detail_page_reads_precomputed_list(self):
+        """Test that the course page shows stored neighbours in rank order"""
+        self.enroll(self.students[0], self.python, self.sql)
+        build_recommendations()
+        response = self.client.get(reverse('courses:course_detail', kwargs={'pk': self.python.pk}))
+        self.assertEqual(response.context['related_courses'][0], self.sql)
+
+        with self.assertNumQueries(1):
+            related_courses(self.python)
+
+
+class CourseDetailCacheTestCase(TestCase):
+    """Test cases for the fragment-cached course detail page"""
+
+    def setUp(self):
+        """Set up test data"""
+        cache.clear()
+        self.instructor = User.objects.create_user(
+            username='instructor', email='instructor@test.com',
+            password='testpass123', user_type='instructor'
+        )
+        self.student = User.objects.create_user(
+            username='student', email='student@test.com', password='testpass123'
+        )
+        self.course = create_course(self.instructor)
+        module = Module.objects.create(course=self.course, title='Intro', order=1)
+        Lesson.objects.create(module=module, title='Setup', order=1)
+        self.url = reverse('courses:course_detail', kwargs={'pk': self.course.pk})
+
+    def test_warm_page_needs_only_the_course_query(self):
+        """Test that a cached page skips stats, outline, reviews and related courses"""
+        self.client.get(self.url)
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url)
+        self.assertContains(response, 'Setup')
+
+    def test_enrollment_overlay_is_one_lookup(self):
+        """Test that enrolled visitors add a single enrollment query"""
+        Enrollment.objects.create(student=self.student, course=self.course)
+        self.client.login(username='student', password='testpass123')
+        self.client.get(self.url)
+        # session, user, course, enrollment
+        with self.assertNumQueries(4):
+            response = self.client.get(self.url)
+        self.assertContains(response, 'You are enrolled in this course!')
+        self.assertContains(response, 'Add Review')
+
+        self.client.logout()
+        response = self.client.get(self.url)
+        self.assertNotContains(response, 'You are enrolled in this course!')
+        self.assertNotContains(response, 'Add Review')
+
+    def test_changes_invalidate_the_fragments(self):
+        """Test that reviews, enrollments, content and course edits show up"""
+        self.client.get(self.url)
+
+        Enrollment.objects.create(student=self.student, course=self.course)
+        self.assertContains(self.client.get(self.url), '1 student')
+
+        CourseReview.objects.create(course=self.course, student=self.student, rating=4, comment='Great pacing')
+        self.assertContains(self.client.get(self.url), 'Great pacing')
+
+        Lesson.objects.create(module=self.course.modules.get(), title='Variables', order=2)
+        self.assertContains(self.client.get(self.url), 'Variables')
+
+        self.course.title = 'Python Fundamentals'
+        self.course.save()
+        self.assertContains(self.client.get(self.url), 'Python Fundamentals')
+
+
+class CatalogTestCase(TestCase):
+    """Test cases for catalog sorting and facet counts"""
+
+    def setUp(self):
+        """Set up test data"""
+        cache.clear()
+        self.instructor = User.objects.create_user(
+            username='instructor', email='instructor@test.com',
+            password='testpass123', user_type='instructor'
+        )
+        self.students = [
+            User.objects.create_user(
+                username=f'student{i}', email=f'student{i}@test.com', password='testpass123'
+            )
+            for i in range(3)
+        ]
+        self.programming = Category.objects.create(name='Programming')
+        self.design = Category.objects.create(name='Design')
+        self.python = create_course(
+            self.instructor, title='Python', slug='python', category=self.programming,
+            price_type='paid', price=50, difficulty_level='beginner',
+        )
+        self.rust = create_course(
+            self.instructor, title='Rust', slug='rust', category=self.programming,
+            price_type='paid', price=90, difficulty_level='advanced',
+        )
+        self.sketching = create_course(
+            self.instructor, title='Sketching', slug='sketching', category=self.design,
+            difficulty_level='beginner',
+        )
+        create_course(self.instructor, title='Draft', slug='draft', status='draft')
+
+        for student, rating in zip(self.students, [3, 5, 4]):
+            Enrollment.objects.create(student=student, course=self.sketching)
+        Enrollment.objects.create(student=self.students[0], course=self.rust)
+        CourseReview.objects.create(course=self.python, student=self.students[0], rating=3, comment='ok')
+        CourseReview.objects.create(course=self.rust, student=self.students[0], rating=5, comment='ok')
+        CourseReview.objects.create(course=self.rust, student=self.students[1], rating=4, comment='ok')
+
+    def titles(self, **params):
+        response = self.client.get(reverse('courses:course_list'), params)
+        self.assertEqual(response.status_code, 200)
+        return [course.title for course in response.context['courses']]
+
+    def test_sort_orders(self):
+        """Test that each sort uses its stored key"""
+        self.assertEqual(self.titles(sort='price_low'), ['Sketching', 'Python', 'Rust'])
+        self.assertEqual(self.titles(sort='price_high'), ['Rust', 'Python', 'Sketching'])
+        self.assertEqual(self.titles(sort='rating'), ['Rust', 'Python', 'Sketching'])
+        self.assertEqual(self.titles(sort='popular'), ['Sketching', 'Rust', 'Python'])
+        self.assertEqual(self.titles(sort='bogus'), self.titles())
+
+    def test_sorted_keyset_walk(self):
+        """Test that cursors follow the requested sort"""
+        url = reverse('courses:course_list')
+        response = self.client.get(url, {'sort': 'rating'})
+        self.assertEqual(response.context['paginator'].ordering, ('-rating_key', '-id'))
+
+        paginator = KeysetPaginator(
+            catalog.catalog_queryset({}, 'rating'), 2, ordering=catalog.SORT_ORDERINGS['rating']
+        )
+        page = paginator.page()
+        self.assertEqual([c.title for c in page.object_list], ['Rust', 'Python'])
+        self.assertEqual([c.title for c in paginator.page(page.next_cursor).object_list], ['Sketching'])
+
+    def test_sort_without_stats_rows(self):
+        """Test that courses missing their stats row sort as zero and still get cursors"""
+        CourseStats.objects.filter(course__in=[self.python, self.sketching]).delete()
+        paginator = KeysetPaginator(
+            catalog.catalog_queryset({}, 'popular'), 1, ordering=catalog.SORT_ORDERINGS['popular']
+        )
+        titles = []
+        page = paginator.page()
+        while True:
+            titles += [c.title for c in page.object_list]
+            if not page.has_next():
+                break
+            page = paginator.page(page.next_cursor)
+        self.assertEqual(titles, ['Rust', 'Sketching', 'Python'])
+
+        CourseStats.objects.filter(course__in=[self.python, self.sketching]).delete()
+        self.assertEqual(self.client.get(reverse('courses:course_list'), {'sort': 'rating'}).status_code, 200)
+        self.assertEqual(self.client.get('/api/courses/', {'sort': 'popular'}).status_code, 200)
+        # Related paths through a missing row encode as null
+        course = Course.objects.get(pk=self.python.pk)
+        KeysetPaginator(Course.objects.all(), 12, ordering=('-stats__rating_average', '-id')).encode_cursor(course, 'n')
+
+    def test_filters_combine(self):
+        """Test that category, level and price filters narrow the listing"""
+        self.assertEqual(self.titles(category=self.programming.pk, level='beginner'), ['Python'])
+        self.assertEqual(self.titles(price_type='free'), ['Sketching'])
+        self.assertEqual(len(self.titles(category='nope', level='expert')), 3)
+
+    def test_facet_counts_ignore_their_own_filter(self):
+        """Test that each facet is counted against the other filters only"""
+        facets = catalog.facet_counts({'category': self.programming.pk})
+        self.assertEqual(facets['category'], {self.programming.pk: 2, self.design.pk: 1})
+        self.assertEqual(facets['level'], {'beginner': 1, 'advanced': 1})
+        self.assertEqual(facets['price_type'], {'paid': 2})
+        self.assertEqual(facets['total'], 2)
+
+        facets = catalog.facet_counts({'category': self.programming.pk, 'level': 'beginner'})
+        self.assertEqual(facets['category'], {self.programming.pk: 1, self.design.pk: 1})
+        self.assertEqual(facets['total'], 1)
+
+    def test_facets_are_one_cached_query(self):
+        """Test that facets cost one grouped query and are then served from cache"""
+        with self.assertNumQueries(1):
+            catalog.facet_counts({})
+        with self.assertNumQueries(0):
+            catalog.facet_counts({'level': 'beginner'})
+            catalog.facet_counts({'category': self.design.pk})
+
+    def test_course_changes_invalidate_facets(self):
+        """Test that saving a course refreshes the cached counts"""
+        self.assertEqual(catalog.facet_counts({})['level'], {'beginner': 2, 'advanced': 1})
+        self.rust.difficulty_level = 'intermediate'
+        self.rust.save()
+        self.assertEqual(
+            catalog.facet_counts({})['level'], {'beginner': 2, 'intermediate': 1}
+        )
+
+    def test_listing_shows_counts_and_stats(self):
+        """Test that the page renders facet counts and real course stats"""
+        response = self.client.get(reverse('courses:course_list'), {'category': self.programming.pk})
+        self.assertEqual(response.context['total_matching'], 2)
+        self.assertIn((self.design, 1), response.context['categories'])
+        self.assertContains(response, '2 courses found')
+        self.assertContains(response, '(4.5)')
+        self.assertContains(response, '1 student')
+        self.assertNotContains(response, '(4.0)')
+
+    def test_rebuild_sets_rating_average(self):
+        """Test that reconciling recomputes the stored rating average"""
+        CourseStats.objects.filter(course=self.rust).update(rating_average=0)
+        call_command('reconcile_course_stats', stdout=StringIO())
+        self.assertEqual(CourseStats.objects.get(course=self.rust).rating_average, 4.5)
+
+
+class CourseTransferTestCase(TestCase):
+    """Test cases for NDJSON course export and import"""
+
+    def setUp(self):
+        """Set up test data"""
+        cache.clear()
+        self.instructor = User.objects.create_user(
+            username='instructor', email='instructor@test.com',
+            password='testpass123', user_type='instructor'
+        )
+        self.category = Category.objects.create(name='Programming')
+        self.course = create_course(self.instructor, slug='python-basics', category=self.category, price=25)
+        module = Module.objects.create(course=self.course, title='Intro', order=1)
+        self.lesson = Lesson.objects.create(module=module, title='Setup', order=1, duration_minutes=10)
+        Lesson.objects.create(module=module, title='Variables', order=2, duration_minutes=20)
+        self.course.resources.create(title='Cheat sheet', resource_type='link', url='https://example.com/')
+        quiz = Quiz.objects.create(course=self.course, module=module, lesson=self.lesson, title='Check')
+        question = Question.objects.create(quiz=quiz, text='2 + 2?', order=1)
+        AnswerChoice.objects.create(question=question, text='4', is_correct=True, order=1)
+        AnswerChoice.objects.create(question=question, text='5', order=2)
+
+    def export(self):
+        stream = StringIO()
+        export_courses(stream)
+        return stream.getvalue().splitlines()
+
+    def test_round_trip(self):
+        """Test that an exported tree imports into an empty catalog"""
+        lines = self.export()
+        Course.objects.all().delete()
+        Category.objects.all().delete()
+
+        counts = import_courses(lines)
+        self.assertEqual(counts['course'], 1)
+        self.assertEqual(counts['lesson'], 2)
+        self.assertEqual(counts['choice'], 2)
+
+        course = Course.objects.get(slug='python-basics')
+        self.assertEqual(course.category.name, 'Programming')
+        self.assertEqual(course.price, 25)
+        self.assertEqual([l.title for l in Lesson.objects.filter(module__course=course)], ['Setup', 'Variables'])
+        quiz = course.quizzes.get()
+        self.assertEqual(quiz.lesson.title, 'Setup')
+        self.assertEqual(list(quiz.questions.get().get_correct_answers().values_list('text', flat=True)), ['4'])
+        self.assertEqual(course.resources.get().url, 'https://example.com/')
+        # Stats are rebuilt even though bulk_create skipped the signals
+        self.assertEqual(course.stats.lesson_count, 2)
+        self.assertEqual(course.stats.total_duration_minutes, 30)
+
+    def test_queries_do_not_grow_with_rows(self):
+        """Test that rows are inserted in batches"""
+        module = self.course.modules.get()
+        for order in range(3, 40):
+            Lesson.objects.create(module=module, title=f'Lesson {order}', order=order)
+        lines = self.export()
+        Course.objects.all().delete()
+        with CaptureQueriesContext(connection) as queries:
+            import_courses(lines)
+        inserts = [q for q in queries.captured_queries if q['sql'].startswith('INSERT INTO "courses_lesson"')]
+        self.assertEqual(len(inserts), 1)
+        self.assertEqual(Lesson.objects.count(), 39)
+
+    def test_existing_slug_is_skipped(self):
+        """Test that an existing course and its tree are left alone by default"""
+        counts = import_courses(self.export())
+        self.assertEqual(counts['course'], 0)
+        self.assertEqual(counts['skipped'], 9)
+        self.assertEqual(Lesson.objects.count(), 2)
+
+    def test_upsert_updates_in_place(self):
+        """Test that upserting keeps lesson rows and drops removed ones"""
+        lines = [json.loads(line) for line in self.export()]
+        for record in lines:
+            if record['model'] == 'course':
+                record['fields']['title'] = 'Python Essentials'
+            if record['model'] == 'lesson' and record['fields']['title'] == 'Setup':
+                record['fields']['title'] = 'Installing Python'
+        lines = [json.dumps(r) for r in lines if r['fields'].get('title') != 'Variables']
+
+        counts = import_courses(lines, upsert=True)
+        self.assertEqual(counts['updated'], 1)
+        self.course.refresh_from_db()
+        self.assertEqual(self.course.title, 'Python Essentials')
+        self.assertEqual(Lesson.objects.get().pk, self.lesson.pk)
+        self.assertEqual(Lesson.objects.get().title, 'Installing Python')
+        self.assertEqual(Quiz.objects.count(), 1)
+        self.assertEqual(self.course.stats.lesson_count, 1)
+
+    def test_upsert_matches_lessons_by_slug(self):
+        """Test that upserted lessons keep their rows across reorders and new ones are added"""
+        student = User.objects.create_user(username='student', password='testpass123', user_type='student')
+        enrollment = Enrollment.objects.create(student=student, course=self.course)
+        LessonProgress.objects.create(enrollment=enrollment, lesson=self.lesson, is_completed=True)
+        lines = [json.loads(line) for line in self.export()]
+        lessons = [r for r in lines if r['model'] == 'lesson']
+        lessons[0]['fields']['order'], lessons[1]['fields']['order'] = 2, 1
+        added = {**lessons[1], 'id': 999, 'fields': {**lessons[1]['fields'], 'title': 'Loops', 'slug': '', 'order': 3}}
+        lines.insert(lines.index(lessons[1]) + 1, added)
+
+        counts = import_courses([json.dumps(r) for r in lines], upsert=True)
+        self.assertEqual(counts['lesson'], 3)
+        self.assertEqual(
+            list(Lesson.objects.order_by('order').values_list('title', flat=True)), ['Variables', 'Setup', 'Loops']
+        )
+        self.assertEqual(Lesson.objects.get(slug='setup').pk, self.lesson.pk)
+        self.assertTrue(LessonProgress.objects.filter(enrollment=enrollment, lesson=self.lesson).exists())
+
+    def test_upsert_keeps_quiz_attempts(self):
+        """Test that upserting updates quizzes in place instead of replacing them"""
+        student = User.objects.create_user(username='student', password='testpass123', user_type='student')
+        quiz = Quiz.objects.get()
+        attempt = QuizAttempt.objects.create(student=student, quiz=quiz, attempt_number=1)
+        lines = [json.loads(line) for line in self.export()]
+        for record in lines:
+            if record['model'] == 'question':
+                record['fields']['points'] = 3
+            if record['model'] == 'choice':
+                record['fields']['is_correct'] = record['fields']['text'] == '5'
+
+        import_courses([json.dumps(r) for r in lines], upsert=True)
+        self.assertEqual(Quiz.objects.get().pk, quiz.pk)
+        self.assertTrue(QuizAttempt.objects.filter(pk=attempt.pk).exists())
+        question = quiz.questions.get()
+        self.assertEqual(question.points, 3)
+        self.assertEqual(list(question.get_correct_answers().values_list('text', flat=True)), ['5'])
+        self.assertEqual(AnswerChoice.objects.count(), 2)
+
+    @override_settings(BACKGROUND_TASKS_EAGER=True)
+    def test_upsert_recounts_progress(self):
+        """Test that upserting recounts the progress of enrolled students"""
+        student = User.objects.create_user(username='student', password='testpass123', user_type='student')
+        enrollment = Enrollment.objects.create(student=student, course=self.course)
+        LessonProgress.objects.create(enrollment=enrollment, lesson=self.lesson, is_completed=True)
+        lines = [json.loads(line) for line in self.export()]
+        for record in lines:
+            if record['model'] == 'lesson' and record['fields']['title'] == 'Variables':
+                record['fields']['is_published'] = False
+
+        with self.captureOnCommitCallbacks(execute=True):
+            import_courses([json.dumps(r) for r in lines], upsert=True)
+        enrollment.refresh_from_db()
+        self.assertEqual((enrollment.completed_lessons, enrollment.total_lessons), (1, 1))
+        self.assertEqual(enrollment.status, 'completed')
+
+    def test_dry_run_saves_nothing(self):
+        """Test that --dry-run validates and rolls back"""
+        lines = self.export()
+        Course.objects.all().delete()
+        out = StringIO()
+        with mock.patch('sys.stdin', StringIO('\n'.join(lines))):
+            call_command('import_courses', '-', '--dry-run', stdout=out)
+        self.assertIn('Validated 1 course(s)', out.getvalue())
+        self.assertFalse(Course.objects.exists())
+
+    def test_invalid_record_reports_line(self):
+        """Test that validation errors name the offending line"""
+        lines = [json.loads(line) for line in self.export()]
+        Course.objects.all().delete()
+        lines[2]['fields']['lesson_type'] = 'hologram'
+        with self.assertRaisesMessage(InvalidImport, 'line 3: lesson_type'):
+            import_courses([json.dumps(r) for r in lines])
+        self.assertFalse(Course.objects.exists())
+
+    def test_export_command_writes_ndjson(self):
+        """Test that the export command streams one record per line"""
+        out, err = StringIO(), StringIO()
+        call_command('export_courses', '--course', 'python-basics', stdout=out, stderr=err)
+        records = [json.loads(line) for line in out.getvalue().splitlines()]
+        self.assertEqual(
+            [r['model'] for r in records],
+            ['course', 'module', 'lesson', 'lesson', 'resource', 'quiz', 'question', 'choice', 'choice'],
+        )
+        self.assertIn('Exported 1 course(s)', err.getvalue())
+
+
+class CourseCloneTestCase(TestCase):
+    """Test cases for deep course cloning"""
+
+    def setUp(self):
+        """Set up test data"""
+        cache.clear()
+        use_temporary_media_root(self)
+        self.instructor = User.objects.create_user(
+            username='instructor', email='instructor@test.com',
+            password='testpass123', user_type='instructor'
+        )
+        self.course = create_course(self.instructor, slug='python-basics')
+
+    def build_tree(self, course, modules, lessons_per_module):
+        for m in range(1, modules + 1):
+            module = Module.objects.create(course=course, title=f'Module {m}', order=m)
+            for l in range(1, lessons_per_module + 1):
+                lesson = Lesson.objects.create(module=module, title=f'Lesson {m}.{l}', order=l, duration_minutes=5)
+                quiz = Quiz.objects.create(course=course, module=module, lesson=lesson, title=f'Quiz {m}.{l}')
+                question = Question.objects.create(quiz=quiz, text='Ready?', order=1)
+                AnswerChoice.objects.create(question=question, text='Yes', is_correct=True, order=1)
+                AnswerChoice.objects.create(question=question, text='No', order=2)
+        course.resources.create(title='Slides', resource_type='link', url='https://example.com/')
+
+    def test_clone_copies_the_tree(self):
+        """Test that every level is copied and points at the copied parents"""
+        self.build_tree(self.course, 2, 2)
+        clone = self.course.clone()
+
+        self.assertEqual(clone.title, 'Python Basics (copy)')
+        self.assertEqual(clone.slug, 'python-basics-copy')
+        self.assertEqual(clone.status, 'draft')
+        self.assertEqual(self.course.clone().slug, 'python-basics-copy-2')
+
+        lessons = Lesson.objects.filter(module__course=clone)
+        self.assertEqual(lessons.count(), 4)
+        quizzes = Quiz.objects.filter(course=clone)
+        self.assertEqual(quizzes.count(), 4)
+        self.assertFalse(quizzes.exclude(lesson__module__course=clone).exists())
+        self.assertFalse(quizzes.exclude(module__course=clone).exists())
+        self.assertEqual(AnswerChoice.objects.filter(question__quiz__course=clone, is_correct=True).count(), 4)
+        self.assertEqual(clone.resources.count(), 1)
+        self.assertEqual(clone.stats.lesson_count, 4)
+        # The source is untouched
+        self.assertEqual(Lesson.objects.filter(module__course=self.course).count(), 4)
+
+    def test_query_count_is_flat(self):
+        """Benchmark: cloning a larger course costs the same number of queries"""
+        small = create_course(self.instructor, title='Small', slug='small')
+        self.build_tree(small, 1, 1)
+        self.build_tree(self.course, 4, 8)
+
+        with CaptureQueriesContext(connection) as small_queries:
+            small.clone()
+        with CaptureQueriesContext(connection) as large_queries:
+            self.course.clone()
+        self.assertEqual(Lesson.objects.filter(module__course__title='Python Basics (copy)').count(), 32)
+        self.assertEqual(len(large_queries), len(small_queries))
+
+    def test_media_is_shared_until_the_last_reference(self):
+        """Test that clones reuse stored files and deleting one copy keeps them"""
+        module = Module.objects.create(course=self.course, title='Intro', order=1)
+        lesson = Lesson.objects.create(
+            module=module, title='Slides', order=1,
+            pdf_file=SimpleUploadedFile('slides.pdf', b'%PDF-1.4 slides'),
+        )
+        storage = lesson.pdf_file.storage
+        name = lesson.pdf_file.name
+
+        clone = self.course.clone()
+        self.assertEqual(Lesson.objects.get(module__course=clone).pdf_file.name, name)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            clone.delete()
+        self.assertTrue(storage.exists(name))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.course.delete()
+        self.assertFalse(storage.exists(name))
+
+    def test_api_clone(self):
+        """Test that only the instructor (or staff) can clone through the API"""
+        self.build_tree(self.course, 1, 1)
+        url = f'/api/courses/{self.course.pk}/clone/'
+        other = User.objects.create_user(
+            username='other', email='other@test.com', password='testpass123', user_type='instructor'
+        )
+        self.client.force_login(other)
+        self.assertEqual(self.client.post(url).status_code, 403)
+
+        self.client.force_login(self.instructor)
+        response = self.client.post(url, {'title': 'Python Basics (Spring)'})
+        self.assertEqual(response.status_code, 201)
+        clone = Course.objects.get(pk=response.json()['id'])
+        self.assertEqual(clone.title, 'Python Basics (Spring)')
+        self.assertEqual(clone.modules.count(), 1)
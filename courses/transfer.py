@@ -0,0 +1,589 @@
+"""
+Streaming NDJSON export and import of course trees.
+
+The format is one JSON object per line, parents before children:
+
+    {"model": "course", "id": 3, "instructor": "ada", "category": "Programming", "fields": {...}}
+    {"model": "module", "id": 10, "course": 3, "fields": {...}}
+    {"model": "lesson", "id": 55, "module": 10, "fields": {...}}
+    {"model": "resource", "id": 7, "course": 3, "fields": {...}}
+    {"model": "quiz", "id": 4, "course": 3, "module": 10, "lesson": null, "fields": {...}}
+    {"model": "question", "id": 9, "quiz": 4, "fields": {...}}
+    {"model": "choice", "id": 20, "question": 9, "fields": {...}}
+
+Ids are the exporting database's primary keys and only serve to link
+records together. The exporter writes courses in chunks (the courses of a
+chunk, then their modules, lessons, ...), and the importer treats every
+run of course records plus the children that follow as one segment: it is
+imported in its own transaction and its id map is dropped afterwards, so
+memory depends on the chunk size rather than on the catalog size.
+
+Rows are written with bulk_create, which skips model signals, so once a
+segment is in the importer rebuilds CourseStats and the search index for
+its courses and retires their cached outlines and pages itself.
+"""
+import itertools
+import json
+from collections import Counter, defaultdict
+
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import DatabaseError, models, transaction
+from django.db.models import F
+from django.utils.text import slugify
+
+from .models import Category, Course, CourseResource, Lesson, Module, rebuild_course_stats
+
+EXPORT_CHUNK_SIZE = 200
+DEFAULT_BATCH_SIZE = 500
+
+# Order in which record types may appear within a segment
+MODEL_ORDER = ('course', 'module', 'lesson', 'resource', 'quiz', 'question', 'choice')
+
+# record type -> {reference key: record type it points to}
+REFERENCES = {
+    'course': {},
+    'module': {'course': 'course'},
+    'lesson': {'module': 'module'},
+    'resource': {'course': 'course'},
+    'quiz': {'course': 'course', 'module': 'module', 'lesson': 'lesson'},
+    'question': {'quiz': 'quiz'},
+    'choice': {'question': 'question'},
+}
+
+
+class InvalidImport(Exception):
+    """Raised for a record that cannot be imported; carries the line number"""
+
+    def __init__(self, line_number, message):
+        self.line_number = line_number
+        super().__init__(f'line {line_number}: {message}')
+
+
+def _models():
+    from quizzes.models import AnswerChoice, Question, Quiz
+    return {
+        'course': Course,
+        'module': Module,
+        'lesson': Lesson,
+        'resource': CourseResource,
+        'quiz': Quiz,
+        'question': Question,
+        'choice': AnswerChoice,
+    }
+
+
+def data_fields(model):
+    """Plain editable columns of a model: no keys, timestamps or derived data"""
+    return [
+        field for field in model._meta.concrete_fields
+        if not field.primary_key
+        and not field.is_relation
+        and field.editable
+        and not getattr(field, 'auto_now', False)
+        and not getattr(field, 'auto_now_add', False)
+    ]
+
+
+# Export
+
+def _chunks(iterable, size):
+    iterator = iter(iterable)
+    while chunk := list(itertools.islice(iterator, size)):
+        yield chunk
+
+
+def _rows(queryset, model, *extra):
+    names = [field.name for field in data_fields(model)]
+    for row in queryset.values('pk', *extra, *names).iterator(chunk_size=2000):
+        yield row, {name: row[name] for name in names}
+
+
+def export_records(courses=None, chunk_size=EXPORT_CHUNK_SIZE):
+    """Yield the NDJSON records of the given courses (all courses by default)"""
+    models_by_type = _models()
+    Quiz, Question, AnswerChoice = (models_by_type[name] for name in ('quiz', 'question', 'choice'))
+    if courses is None:
+        courses = Course.objects.all()
+    course_ids = courses.order_by('pk').values_list('pk', flat=True).iterator(chunk_size=chunk_size)
+
+    for chunk in _chunks(course_ids, chunk_size):
+        for row, fields in _rows(
+            Course.objects.filter(pk__in=chunk).order_by('pk'), Course,
+            'instructor__username', 'category__name',
+        ):
+            yield {
+                'model': 'course', 'id': row['pk'],
+                'instructor': row['instructor__username'], 'category': row['category__name'],
+                'fields': fields,
+            }
+        for row, fields in _rows(
+            Module.objects.filter(course_id__in=chunk).order_by('course_id', 'order', 'pk'), Module, 'course_id',
+        ):
+            yield {'model': 'module', 'id': row['pk'], 'course': row['course_id'], 'fields': fields}
+        for row, fields in _rows(
+            Lesson.objects.filter(module__course_id__in=chunk).order_by('module_id', 'order', 'pk'), Lesson,
+            'module_id',
+        ):
+            yield {'model': 'lesson', 'id': row['pk'], 'module': row['module_id'], 'fields': fields}
+        for row, fields in _rows(
+            CourseResource.objects.filter(course_id__in=chunk).order_by('course_id', 'order', 'pk'),
+            CourseResource, 'course_id',
+        ):
+            yield {'model': 'resource', 'id': row['pk'], 'course': row['course_id'], 'fields': fields}
+        for row, fields in _rows(
+            Quiz.objects.filter(course_id__in=chunk).order_by('course_id', 'order', 'pk'), Quiz,
+            'course_id', 'module_id', 'lesson_id',
+        ):
+            yield {
+                'model': 'quiz', 'id': row['pk'], 'course': row['course_id'],
+                'module': row['module_id'], 'lesson': row['lesson_id'], 'fields': fields,
+            }
+        for row, fields in _rows(
+            Question.objects.filter(quiz__course_id__in=chunk).order_by('quiz_id', 'order', 'pk'), Question,
+            'quiz_id',
+        ):
+            yield {'model': 'question', 'id': row['pk'], 'quiz': row['quiz_id'], 'fields': fields}
+        for row, fields in _rows(
+            AnswerChoice.objects.filter(question__quiz__course_id__in=chunk).order_by('question_id', 'order', 'pk'),
+            AnswerChoice, 'question_id',
+        ):
+            yield {'model': 'choice', 'id': row['pk'], 'question': row['question_id'], 'fields': fields}
+
+
+def export_courses(stream, courses=None, chunk_size=EXPORT_CHUNK_SIZE):
+    """Write courses to a text stream as NDJSON; returns a Counter of records per type"""
+    counts = Counter()
+    for record in export_records(courses, chunk_size):
+        stream.write(json.dumps(record, cls=DjangoJSONEncoder, ensure_ascii=False) + '\n')
+        counts[record['model']] += 1
+    return counts
+
+
+# Import
+
+class _Record:
+    __slots__ = ('line_number', 'model', 'id', 'refs', 'data', 'instance')
+
+    def __init__(self, line_number, model, source_id, refs, data, instance):
+        self.line_number = line_number
+        self.model = model
+        self.id = source_id
+        self.refs = refs
+        self.data = data
+        self.instance = instance
+
+
+class CourseImporter:
+    """
+    Import NDJSON course trees with batched bulk_create.
+
+    Existing course slugs are skipped together with everything below them,
+    unless upsert is set: then the course row is updated and its tree is
+    matched in place so progress and quiz attempts survive - modules on
+    (course, order), lessons on (module, slug), quizzes on (course, title),
+    questions on (quiz, text) and choices on (question, text). Unmatched
+    records are inserted, rows the import no longer has are removed and
+    resources are replaced.
+
+    With dry_run every segment is written and rolled back, so records are
+    checked against the same constraints as a real import.
+    """
+
+    def __init__(self, upsert=False, dry_run=False, batch_size=DEFAULT_BATCH_SIZE):
+        self.upsert = upsert
+        self.dry_run = dry_run
+        self.batch_size = batch_size
+        self.models = _models()
+        self.fields = {name: data_fields(model) for name, model in self.models.items()}
+        self.counts = Counter()
+
+    # Parsing
+
+    def _parse(self, lines):
+        for line_number, line in enumerate(lines, start=1):
+            if not line.strip():
+                continue
+            try:
+                raw = json.loads(line)
+            except ValueError as e:
+                raise InvalidImport(line_number, f'invalid JSON ({e})')
+            if not isinstance(raw, dict) or raw.get('model') not in REFERENCES:
+                raise InvalidImport(line_number, 'unknown record type')
+            yield line_number, raw
+
+    def _segments(self, records):
+        """Split records into runs of courses followed by their children"""
+        state = {'segment': 0, 'in_children': False}
+
+        def key(item):
+            is_course = item[1]['model'] == 'course'
+            if is_course and state['in_children']:
+                state['segment'] += 1
+            state['in_children'] = not is_course
+            return state['segment']
+
+        for _, segment in itertools.groupby(records, key=key):
+            yield segment
+
+    def _build(self, line_number, raw):
+        """Validate a record and build its unsaved model instance"""
+        name = raw['model']
+        model = self.models[name]
+        fields = raw.get('fields')
+        if not isinstance(fields, dict):
+            raise InvalidImport(line_number, '"fields" must be an object')
+        known = {field.name: field for field in self.fields[name]}
+        unknown = set(fields) - set(known)
+        if unknown:
+            raise InvalidImport(line_number, f'unknown {name} field(s): {", ".join(sorted(unknown))}')
+
+        data = {}
+        try:
+            for field_name, value in fields.items():
+                field = known[field_name]
+                if isinstance(field, models.FileField):
+                    data[field_name] = value or ''
+                else:
+                    data[field_name] = field.to_python(value)
+            instance = model(**data)
+            if name in ('course', 'lesson') and not instance.slug:
+                instance.slug = slugify(instance.title)
+            exclude = [f.name for f in model._meta.fields if f.is_relation]
+            instance.clean_fields(exclude=exclude)
+        except ValidationError as e:
+            raise InvalidImport(line_number, '; '.join(
+                f'{key}: {" ".join(messages)}' for key, messages in e.message_dict.items()
+            ) if hasattr(e, 'error_dict') else ' '.join(e.messages))
+        return _Record(
+            line_number, name, raw.get('id'),
+            {key: raw.get(key) for key in REFERENCES[name]},
+            raw, instance,
+        )
+
+    # Running
+
+    def run(self, lines):
+        """Import an iterable of NDJSON lines; returns a Counter of results"""
+        for segment in self._segments(self._parse(lines)):
+            imported = _Segment(self)
+            with transaction.atomic():
+                course_ids = imported.run(segment)
+                if self.dry_run:
+                    transaction.set_rollback(True)
+            if not self.dry_run and course_ids:
+                _refresh_derived_data(course_ids, imported.upserted_course_ids)
+        return self.counts
+
+
+class _Segment:
+    """Import state of one segment: pending rows and the source id -> pk maps"""
+
+    def __init__(self, importer):
+        self.importer = importer
+        self.counts = importer.counts
+        self.buffers = {name: [] for name in MODEL_ORDER}
+        self.pks = defaultdict(dict)  # record type -> {source id: pk}
+        self.skipped = defaultdict(set)  # record type -> source ids skipped with their course
+        self.course_ids = set()
+        self.upserted_course_ids = set()
+        self.kept = {name: set() for name in ('module', 'lesson', 'quiz', 'question', 'choice')}
+
+    def run(self, records):
+        for line_number, raw in records:
+            record = self.importer._build(line_number, raw)
+            level = MODEL_ORDER.index(record.model)
+            # Parents must be written before a child can point at them
+            for parent in MODEL_ORDER[:level]:
+                self.flush(parent)
+            self.buffers[record.model].append(record)
+            if len(self.buffers[record.model]) >= self.importer.batch_size:
+                self.flush(record.model)
+        for name in MODEL_ORDER:
+            self.flush(name)
+        if self.upserted_course_ids:
+            self._delete_stale()
+        return self.course_ids
+
+    def _delete_stale(self):
+        """Remove rows under upserted courses that the import no longer has"""
+        courses = self.upserted_course_ids
+        models_by_type = self.importer.models
+        for model, kept, lookup in (
+            (models_by_type['choice'], self.kept['choice'], 'question__quiz__course_id__in'),
+            (models_by_type['question'], self.kept['question'], 'quiz__course_id__in'),
+            (models_by_type['quiz'], self.kept['quiz'], 'course_id__in'),
+            (Lesson, self.kept['lesson'], 'module__course_id__in'),
+            (Module, self.kept['module'], 'course_id__in'),
+        ):
+            existing = model.objects.filter(**{lookup: courses}).values_list('pk', flat=True)
+            stale = sorted(set(existing) - kept)
+            for chunk in _chunks(stale, self.importer.batch_size):
+                model.objects.filter(pk__in=chunk).delete()
+
+    def resolve(self, record):
+        """
+        Map the record's references to local pks.
+
+        Returns None when the record belongs to a skipped course.
+        """
+        resolved = {}
+        for key, target in REFERENCES[record.model].items():
+            source_id = record.refs[key]
+            if source_id is None:
+                if record.model == 'quiz' and key in ('module', 'lesson'):
+                    resolved[key] = None
+                    continue
+                raise InvalidImport(record.line_number, f'missing "{key}" reference')
+            if source_id in self.skipped[target]:
+                self.skipped[record.model].add(record.id)
+                return None
+            try:
+                resolved[key] = self.pks[target][source_id]
+            except KeyError:
+                raise InvalidImport(
+                    record.line_number, f'{key} {source_id} does not appear earlier in this segment'
+                )
+        return resolved
+
+    def flush(self, name):
+        records = self.buffers[name]
+        if not records:
+            return
+        self.buffers[name] = []
+        try:
+            getattr(self, f'_flush_{name}')(records)
+        except DatabaseError as e:
+            raise InvalidImport(records[0].line_number, f'{name} batch starting here failed: {e}')
+
+    def _attach(self, records):
+        """Resolve references and set the foreign keys; drops skipped records"""
+        ready = []
+        for record in records:
+            resolved = self.resolve(record)
+            if resolved is None:
+                self.counts['skipped'] += 1
+                continue
+            for key, value in resolved.items():
+                setattr(record.instance, f'{key}_id', value)
+            ready.append(record)
+        return ready
+
+    def _create(self, records):
+        """bulk_create new rows and remember their pks"""
+        model = self.importer.models[records[0].model]
+        model.objects.bulk_create([r.instance for r in records], batch_size=self.importer.batch_size)
+        for record in records:
+            self.pks[record.model][record.id] = record.instance.pk
+        self.counts[records[0].model] += len(records)
+
+    def _flush_course(self, records):
+        User = get_user_model()
+        usernames = {r.data.get('instructor') for r in records}
+        instructors = dict(User.objects.filter(username__in=usernames).values_list('username', 'pk'))
+        categories = self._categories({r.data.get('category') for r in records} - {None, ''})
+        existing = dict(Course.objects.filter(
+            slug__in=[r.instance.slug for r in records]
+        ).values_list('slug', 'pk'))
+
+        new, updated = [], []
+        for record in records:
+            course = record.instance
+            if record.data.get('instructor') not in instructors:
+                raise InvalidImport(record.line_number, f'unknown instructor {record.data.get("instructor")!r}')
+            course.instructor_id = instructors[record.data['instructor']]
+            course.category_id = categories.get(record.data.get('category'))
+            if course.slug in existing:
+                if not self.importer.upsert:
+                    self.skipped['course'].add(record.id)
+                    self.counts['skipped'] += 1
+                    continue
+                course.pk = existing[course.slug]
+                updated.append(record)
+            else:
+                new.append(record)
+
+        if new:
+            self._create(new)
+        if updated:
+            names = [field.name for field in self.importer.fields['course']] + ['instructor', 'category']
+            Course.objects.bulk_update([r.instance for r in updated], names, batch_size=self.importer.batch_size)
+            upserted = [r.instance.pk for r in updated]
+            CourseResource.objects.filter(course_id__in=upserted).delete()
+            self.upserted_course_ids.update(upserted)
+            for record in updated:
+                self.pks['course'][record.id] = record.instance.pk
+            self.counts['course'] += len(updated)
+            self.counts['updated'] += len(updated)
+        self.course_ids.update(self.pks['course'][r.id] for r in new + updated)
+
+    def _categories(self, names):
+        """{name: pk} for the given category names, creating missing ones"""
+        found = dict(Category.objects.filter(name__in=names).values_list('name', 'pk'))
+        missing = [Category(name=name, slug=slugify(name)) for name in names - set(found)]
+        if missing:
+            Category.objects.bulk_create(missing)
+            found.update((category.name, category.pk) for category in missing)
+        return found
+
+    def _upsert_by_order(self, records, model, parent_field):
+        """
+        Insert or update rows keyed on (parent, order) and map their pks.
+
+        bulk_create(update_conflicts=True) does not report pks, so they are
+        read back with one query per batch.
+        """
+        names = [field.name for field in self.importer.fields[records[0].model]]
+        model.objects.bulk_create(
+            [r.instance for r in records],
+            batch_size=self.importer.batch_size,
+            update_conflicts=True,
+            unique_fields=[parent_field, 'order'],
+            update_fields=[name for name in names if name != 'order'],
+        )
+        parent_attname = f'{parent_field}_id'
+        pks = {
+            (parent_id, order): pk
+            for parent_id, order, pk in model.objects.filter(**{
+                f'{parent_attname}__in': {getattr(r.instance, parent_attname) for r in records}
+            }).values_list(parent_attname, 'order', 'pk')
+        }
+        for record in records:
+            pk = pks[(getattr(record.instance, parent_attname), record.instance.order)]
+            record.instance.pk = pk
+            self.pks[record.model][record.id] = pk
+        self.counts[records[0].model] += len(records)
+
+    def _flush_module(self, records):
+        records = self._attach(records)
+        if records:
+            self._upsert_by_order(records, Module, 'course')
+            self.kept['module'].update(r.instance.pk for r in records)
+
+    def _upsert_by_key(self, records, parent_field, key_field):
+        """
+        Update rows matched on (parent, key_field), insert the rest and map their pks.
+
+        Rows matched earlier in the segment are not matched again, so
+        duplicate keys pair up in order. Outside upserted courses there is
+        nothing to match and the records are just inserted.
+        """
+        name = records[0].model
+        if not self.upserted_course_ids:
+            self._create(records)
+            return
+        model = self.importer.models[name]
+        parent_attname = f'{parent_field}_id'
+        kept = self.kept[name]
+        rows = list(model.objects.filter(**{
+            f'{parent_attname}__in': {getattr(r.instance, parent_attname) for r in records}
+        }).order_by('order', 'pk').values_list('pk', parent_attname, key_field, 'order'))
+        existing = defaultdict(list)
+        for pk, parent_id, key, _ in rows:
+            if pk not in kept:
+                existing[parent_id, key].append(pk)
+
+        matched, new = [], []
+        for record in records:
+            candidates = existing.get((getattr(record.instance, parent_attname), getattr(record.instance, key_field)))
+            if candidates:
+                record.instance.pk = candidates.pop(0)
+                matched.append(record)
+            else:
+                new.append(record)
+
+        if model is Lesson:
+            self._free_lesson_orders(rows, max(r.instance.order for r in records))
+        if matched:
+            names = [field.name for field in self.importer.fields[name]] + list(REFERENCES[name])
+            model.objects.bulk_update([r.instance for r in matched], names, batch_size=self.importer.batch_size)
+            for record in matched:
+                self.pks[name][record.id] = record.instance.pk
+            self.counts[name] += len(matched)
+        if new:
+            self._create(new)
+
+    def _free_lesson_orders(self, rows, highest):
+        """
+        Move unmatched-so-far lessons off the orders a batch is about to take.
+
+        (module, order) is unique, so lessons of the batch's modules not yet
+        written by this import are shifted above every order in use before
+        the batch is written; the ones still in the import get their order
+        back when their batch comes.
+        """
+        shift = max((order for *_, order in rows), default=0) + 1
+        blocking = [pk for pk, _, _, order in rows if pk not in self.kept['lesson'] and order <= highest]
+        for chunk in _chunks(blocking, self.importer.batch_size):
+            Lesson.objects.filter(pk__in=chunk).update(order=F('order') + shift)
+
+    def _flush_lesson(self, records):
+        records = self._attach(records)
+        if records:
+            self._upsert_by_key(records, 'module', 'slug')
+            self.kept['lesson'].update(r.instance.pk for r in records)
+
+    def _flush_resource(self, records):
+        records = self._attach(records)
+        if records:
+            self._create(records)
+
+    def _flush_quiz(self, records):
+        records = self._attach(records)
+        if records:
+            self._upsert_by_key(records, 'course', 'title')
+            self.kept['quiz'].update(r.instance.pk for r in records)
+
+    def _flush_question(self, records):
+        records = self._attach(records)
+        if records:
+            self._upsert_by_key(records, 'quiz', 'text')
+            self.kept['question'].update(r.instance.pk for r in records)
+
+    def _flush_choice(self, records):
+        records = self._attach(records)
+        if records:
+            self._upsert_by_key(records, 'question', 'text')
+            self.kept['choice'].update(r.instance.pk for r in records)
+
+
+def _refresh_derived_data(course_ids, upserted_course_ids=()):
+    """
+    Redo what model signals would have done for bulk-written courses.
+
+    Upserted courses may have enrollments whose counted lessons changed, so
+    their progress is recounted in the background, and quizzes updated in
+    place drop their cached answer keys and delivery payloads.
+    """
+    from enrollments.models import schedule_course_recount
+    from quizzes.delivery import invalidate_quiz_delivery
+    from quizzes.grading import invalidate_answer_key
+    from quizzes.models import Quiz
+    from .catalog import invalidate_catalog
+    from .outline import invalidate_course_outline
+    from .page_cache import invalidate_course_page
+    from .search import index_courses
+
+    course_ids = sorted(course_ids)
+    rebuild_course_stats(course_ids)
+    index_courses(course_ids)
+    for course_id in course_ids:
+        invalidate_course_outline(course_id)
+        invalidate_course_page(course_id)
+    for course_id in sorted(upserted_course_ids):
+        schedule_course_recount(course_id)
+    for quiz_id in Quiz.objects.filter(course_id__in=upserted_course_ids).values_list('pk', flat=True):
+        invalidate_quiz_delivery(quiz_id)
+        invalidate_answer_key(quiz_id)
+    invalidate_catalog()
+
+
+def import_courses(lines, upsert=False, dry_run=False, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Import NDJSON lines.
+
+    Returns a Counter of records written per type, plus 'updated' (courses
+    upserted in place) and 'skipped' (records under existing courses).
+    """
+    return CourseImporter(upsert=upsert, dry_run=dry_run, batch_size=batch_size).run(lines)
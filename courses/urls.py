@@ -16,4 +16,9 @@ urlpatterns = [
     # Lesson views
     path('lesson/<int:pk>/', views.LessonDetailView.as_view(), name='lesson_detail'),
     path('lesson/<int:pk>/complete/', views.mark_lesson_complete, name='mark_lesson_complete'),
+    
+    # Protected media
+    path('lesson/<int:pk>/video/', views.lesson_media, {'kind': 'video'}, name='lesson_video'),
+    path('lesson/<int:pk>/pdf/', views.lesson_media, {'kind': 'pdf'}, name='lesson_pdf'),
+    path('resource/<int:pk>/file/', views.resource_file, name='resource_file'),
 ]
@@ -3,34 +3,73 @@ Course Views for LMS
 """
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
+from django.contrib.auth.views import redirect_to_login
+from django.core.exceptions import PermissionDenied
+from django.http import Http404
+from django.views.decorators.http import require_safe
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.contrib import messages
 from django.views.generic import ListView, DetailView, CreateView, UpdateView
 from django.urls import reverse_lazy
-from django.db.models import Avg, Count, Q
+from django.db.models import Q
 from django.core.paginator import Paginator
+from django.utils.functional import SimpleLazyObject
 
-from .models import Course, Category, Module, Lesson, CourseReview
+from lms_project.pagination import KeysetPaginationMixin
+
+from . import catalog
+from .media import serve_file
+from .models import Course, Category, Module, Lesson, CourseReview, CourseResource
+from .outline import get_course_outline
+from .page_cache import COURSE_PAGE_TIMEOUT, course_page_version
+from .recommendations import related_courses
 from enrollments.models import Enrollment, LessonProgress
+from enrollments.seats import AlreadyEnrolled, CourseFull, enroll_student, is_full, waitlist_position
 
 
-class CourseListView(ListView):
+class CourseListView(KeysetPaginationMixin, ListView):
     """List all published courses"""
     model = Course
     template_name = 'courses/course_list.html'
     context_object_name = 'courses'
     paginate_by = 12
     
+    def use_keyset_pagination(self, queryset):
+        # Relevance-ordered search results are paged by number
+        if self.search:
+            return False
+        return super().use_keyset_pagination(queryset)
+    
+    def get_keyset_ordering(self):
+        return catalog.SORT_ORDERINGS[self.sort]
+    
     def get_queryset(self):
-        return Course.objects.filter(status='published').select_related('instructor', 'category')
+        self.filters = catalog.parse_filters(self.request.GET)
+        self.sort = catalog.get_sort(self.request.GET)
+        self.search = self.request.GET.get('search', '').strip()
+        return catalog.catalog_queryset(self.filters, self.sort, self.search)
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['categories'] = Category.objects.all()
-        context['current_category'] = self.request.GET.get('category')
-        context['current_level'] = self.request.GET.get('level')
-        context['current_sort'] = self.request.GET.get('sort', '-created_at')
-        context['search_query'] = self.request.GET.get('search', '')
+        facets = catalog.facet_counts(self.filters, self.search)
+        context['categories'] = [
+            (category, facets['category'].get(category.pk, 0))
+            for category in Category.objects.all()
+        ]
+        context['levels'] = [
+            (value, label, facets['level'].get(value, 0))
+            for value, label in Course.DIFFICULTY_CHOICES
+        ]
+        context['price_types'] = [
+            (value, label, facets['price_type'].get(value, 0))
+            for value, label in Course.PRICE_TYPE_CHOICES
+        ]
+        context['total_matching'] = facets['total']
+        context['current_category'] = self.filters.get('category')
+        context['current_level'] = self.filters.get('level')
+        context['current_price_type'] = self.filters.get('price_type')
+        context['current_sort'] = self.sort
+        context['search_query'] = self.search
         return context
 
 
@@ -41,38 +80,48 @@ class CourseDetailView(DetailView):
     context_object_name = 'course'
     
     def get_queryset(self):
-        return Course.objects.filter(status='published').select_related('instructor', 'category').prefetch_related('modules__lessons', 'reviews__student')
+        return Course.objects.filter(status='published').select_related('instructor', 'category', 'stats')
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         course = self.object
         
-        # Calculate course statistics
-        context['average_rating'] = course.reviews.aggregate(avg=Avg('rating'))['avg'] or 0
-        context['total_reviews'] = course.reviews.count()
-        context['total_students'] = course.enrollments.count()
+        # The visitor-invariant parts of the page are cached template fragments
+        # (see courses.page_cache); everything they need is loaded lazily so a
+        # warm cache costs no queries beyond fetching the course itself.
+        context['page_version'] = course_page_version(course.pk)
+        context['page_timeout'] = COURSE_PAGE_TIMEOUT
         
-        # Check if user is enrolled
+        stats = course.get_stats()
+        context['average_rating'] = stats.average_rating
+        context['total_reviews'] = stats.review_count
+        context['total_students'] = stats.enrollment_count
+        context['outline'] = SimpleLazyObject(lambda: get_course_outline(course.pk))
+        context['reviews'] = SimpleLazyObject(lambda: list(
+            course.reviews.filter(is_approved=True).select_related('student')
+        ))
+        # Related courses are precomputed by the build_recommendations command;
+        # fall back to the same category until it has run
+        context['related_courses'] = SimpleLazyObject(lambda: related_courses(course, limit=4) or list(
+            Course.objects.filter(
+                category=course.category,
+                status='published'
+            ).exclude(id=course.id).select_related('instructor')[:4]
+        ))
+        
+        # Per-visitor overlay: one lookup on the (student, course) unique index
+        enrollment = None
         if self.request.user.is_authenticated:
-            context['is_enrolled'] = Enrollment.objects.filter(
+            enrollment = Enrollment.objects.filter(
                 student=self.request.user,
                 course=course
-            ).exists()
-            
-            # If enrolled, get progress
-            if context['is_enrolled']:
-                enrollment = Enrollment.objects.get(student=self.request.user, course=course)
-                context['enrollment'] = enrollment
-                context['progress_percentage'] = enrollment.progress_percentage
-        
-        # Course modules and lessons
-        context['modules'] = course.modules.prefetch_related('lessons').order_by('order')
-        
-        # Related courses
-        context['related_courses'] = Course.objects.filter(
-            category=course.category,
-            status='published'
-        ).exclude(id=course.id)[:4]
+            ).only('id', 'progress_percentage', 'is_active').first()
+        context['enrollment'] = enrollment
+        context['is_enrolled'] = enrollment is not None
+        context['progress_percentage'] = enrollment.progress_percentage if enrollment else 0
+        context['is_full'] = is_full(course, stats)
+        if context['is_full'] and self.request.user.is_authenticated and enrollment is None:
+            context['waitlist_position'] = waitlist_position(self.request.user, course)
         
         return context
 
@@ -82,12 +131,14 @@ def enroll_course(request, pk):
     """Enroll user in a course"""
     course = get_object_or_404(Course, pk=pk, status='published')
     
-    # Check if already enrolled
-    if Enrollment.objects.filter(student=request.user, course=course).exists():
-        messages.warning(request, 'You are already enrolled in this course.')
-    else:
-        Enrollment.objects.create(student=request.user, course=course)
+    # Claiming the seat and inserting the row is the only check
+    try:
+        enroll_student(request.user, course)
         messages.success(request, f'Successfully enrolled in {course.title}!')
+    except AlreadyEnrolled:
+        messages.warning(request, 'You are already enrolled in this course.')
+    except CourseFull:
+        messages.error(request, 'This course is full. You can join the waitlist instead.')
     
     return redirect('courses:course_detail', pk=course.pk)
 
@@ -132,22 +183,17 @@ class LessonDetailView(LoginRequiredMixin, DetailView):
         context['enrollment'] = enrollment
         context['lesson_progress'] = lesson_progress
         
-        # Get all lessons in the course for navigation
-        all_lessons = []
-        for module in course.modules.order_by('order'):
-            for lesson_item in module.lessons.order_by('order'):
-                all_lessons.append(lesson_item)
-        
-        context['all_lessons'] = all_lessons
-        
-        # Find previous and next lessons
-        try:
-            current_index = all_lessons.index(lesson)
-            context['previous_lesson'] = all_lessons[current_index - 1] if current_index > 0 else None
-            context['next_lesson'] = all_lessons[current_index + 1] if current_index < len(all_lessons) - 1 else None
-        except ValueError:
-            context['previous_lesson'] = None
-            context['next_lesson'] = None
+        # Navigation and sidebar come from the cached course outline
+        outline = get_course_outline(course.pk)
+        position = outline.position(lesson.pk)
+        context['outline'] = outline
+        context['all_lessons'] = outline.lessons
+        context['lesson_position'] = position + 1 if position is not None else None
+        context['previous_lesson'] = outline.previous(lesson.pk)
+        context['next_lesson'] = outline.next(lesson.pk)
+        context['completed_lesson_ids'] = set(
+            enrollment.lesson_progress.filter(is_completed=True).values_list('lesson_id', flat=True)
+        )
         
         return context
 
@@ -170,30 +216,67 @@ def mark_lesson_complete(request, pk):
         lesson=lesson
     )
     
-    if not lesson_progress.completed:
-        lesson_progress.completed = True
-        lesson_progress.save()
+    if not lesson_progress.is_completed:
+        lesson_progress.mark_as_completed()
         messages.success(request, f'Lesson "{lesson.title}" marked as completed!')
     
     return redirect('courses:lesson_detail', pk=lesson.pk)
 
 
-class CategoryListView(ListView):
+def _has_course_access(user, course):
+    """Instructors, staff and actively enrolled students see all course content"""
+    if not user.is_authenticated:
+        return False
+    if user.is_staff or course.instructor_id == user.pk:
+        return True
+    return Enrollment.objects.filter(student=user, course=course, is_active=True).exists()
+
+
+def _serve_protected(request, field_file, course, is_public, as_attachment=False):
+    if not field_file:
+        raise Http404('No file attached')
+    if not is_public and not _has_course_access(request.user, course):
+        if not request.user.is_authenticated:
+            return redirect_to_login(request.get_full_path())
+        raise PermissionDenied('You must be enrolled in this course to access this file.')
+    return serve_file(request, field_file, as_attachment=as_attachment)
+
+
+@require_safe
+def lesson_media(request, pk, kind):
+    """Stream a lesson's video or PDF (supports Range requests)"""
+    lesson = get_object_or_404(Lesson.objects.select_related('module__course'), pk=pk)
+    course = lesson.module.course
+    is_public = (
+        lesson.is_preview and lesson.is_published and lesson.module.is_published
+        and course.status == 'published'
+    )
+    field_file = lesson.video_file if kind == 'video' else lesson.pdf_file
+    return _serve_protected(request, field_file, course, is_public)
+
+
+@require_safe
+def resource_file(request, pk):
+    """Download a course resource file"""
+    resource = get_object_or_404(CourseResource.objects.select_related('course'), pk=pk)
+    is_public = resource.is_public and resource.course.status == 'published'
+    return _serve_protected(request, resource.file, resource.course, is_public, as_attachment=True)
+
+
+class CategoryListView(KeysetPaginationMixin, ListView):
     """List courses by category"""
     model = Course
     template_name = 'courses/category_courses.html'
     context_object_name = 'courses'
     paginate_by = 12
+    keyset_ordering = ('-created_at', '-id')
     
     def get_queryset(self):
         self.category = get_object_or_404(Category, slug=self.kwargs['slug'])
         return Course.objects.filter(
             category=self.category,
             status='published'
-        ).select_related('instructor').annotate(
-            average_rating=Avg('reviews__rating'),
-            total_students=Count('enrollments')
-        ).order_by('-created_at')
+        ).select_related('instructor', 'stats').order_by('-created_at')
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
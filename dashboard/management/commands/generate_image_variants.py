@@ -0,0 +1,57 @@
+"""
+Management command to backfill responsive image variants.
+Generates the WebP/JPEG sizes for course covers and avatars that were
+uploaded before the image pipeline existed (or whose variants are stale).
+"""
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from courses.models import Course
+from lms_project.images import AVATAR_VARIANTS, COVER_VARIANTS, generate_image_variants
+from users.models import User
+
+TARGETS = {
+    'covers': (Course, 'cover_image', 'cover_image_variants', COVER_VARIANTS),
+    'avatars': (User, 'avatar', 'avatar_variants', AVATAR_VARIANTS),
+}
+
+
+class Command(BaseCommand):
+    help = 'Generate missing image variants for course covers and avatars'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--only',
+            choices=sorted(TARGETS),
+            help='Process only course covers or only avatars'
+        )
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Regenerate variants even if they are up to date'
+        )
+
+    def handle(self, *args, **options):
+        names = [options['only']] if options['only'] else sorted(TARGETS)
+        for name in names:
+            model, field_name, variants_field, specs = TARGETS[name]
+            rows = model._default_manager.exclude(
+                Q(**{f'{field_name}__isnull': True}) | Q(**{field_name: ''})
+            ).values_list('pk', field_name, variants_field)
+
+            generated = failed = 0
+            for pk, source_name, record in rows.iterator():
+                if not options['force'] and (record or {}).get('source') == source_name:
+                    continue
+                try:
+                    generate_image_variants(
+                        model._meta.label, pk, field_name, variants_field, specs
+                    )
+                    generated += 1
+                except Exception as e:
+                    failed += 1
+                    self.stdout.write(self.style.WARNING(f'{name} #{pk} ({source_name}): {e}'))
+
+            self.stdout.write(self.style.SUCCESS(f'✓ {name}: generated variants for {generated} image(s)'))
+            if failed:
+                self.stdout.write(self.style.ERROR(f'✗ {name}: {failed} image(s) could not be processed'))
@@ -4,8 +4,9 @@ from django.contrib.auth.mixins import LoginRequiredMixin
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth import get_user_model
 from courses.models import Course
-from enrollments.models import Enrollment
-from dashboard.models import Announcement
+from courses.recommendations import recommend_for_student
+from enrollments.models import Enrollment, attach_next_lessons
+from dashboard.models import Announcement, DashboardSettings
 
 User = get_user_model()
 
@@ -59,13 +60,21 @@ class StudentDashboardView(LoginRequiredMixin, TemplateView):
             is_active=True
         ).select_related('course', 'course__instructor')
         
-        context['enrollments'] = enrollments
+        # "Continue" links resolve every next lesson in one query
+        context['enrollments'] = attach_next_lessons(enrollments)
         context['in_progress_courses'] = enrollments.filter(
             status='active',
             progress_percentage__lt=100
         )
         context['completed_courses'] = enrollments.filter(status='completed')
         
+        # "Because you took X" recommendations, unless the student opted out
+        opted_out = DashboardSettings.objects.filter(
+            user=self.request.user, show_course_recommendations=False
+        ).exists()
+        if not opted_out:
+            context['recommended_courses'] = recommend_for_student(self.request.user)
+        
         return context
 
 
@@ -79,13 +88,10 @@ class InstructorDashboardView(LoginRequiredMixin, TemplateView):
         # Get instructor courses
         courses = Course.objects.filter(
             instructor=self.request.user
-        ).prefetch_related('enrollments')
+        ).select_related('stats')
         
         context['courses'] = courses
-        context['total_students'] = sum(
-            course.enrollments.filter(is_active=True).count() 
-            for course in courses
-        )
+        context['total_students'] = sum(course.enrollment_count for course in courses)
         
         return context
 
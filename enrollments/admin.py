@@ -1,7 +1,8 @@
 from django.contrib import admin
 from django.utils.html import format_html
 from django.urls import reverse
-from .models import Enrollment, LessonProgress, ModuleProgress, StudentNote, Certificate
+from lms_project.tasks import run_in_background
+from .models import Enrollment, LessonProgress, ModuleProgress, StudentNote, Certificate, WaitlistEntry
 
 
 class LessonProgressInline(admin.TabularInline):
@@ -24,7 +25,7 @@ class EnrollmentAdmin(admin.ModelAdmin):
             'fields': ('student', 'course', 'status', 'is_active')
         }),
         ('Progress Tracking', {
-            'fields': ('progress_percentage', 'enrolled_at', 'started_at', 'completed_at', 'last_accessed')
+            'fields': ('progress_percentage', 'completed_lessons', 'total_lessons', 'enrolled_at', 'started_at', 'completed_at', 'last_accessed')
         }),
         ('Payment Information', {
             'fields': ('payment_amount', 'payment_date', 'payment_method', 'transaction_id'),
@@ -36,7 +37,7 @@ class EnrollmentAdmin(admin.ModelAdmin):
         }),
     )
     
-    readonly_fields = ('enrolled_at', 'started_at', 'completed_at', 'last_accessed', 'certificate_issued_at')
+    readonly_fields = ('completed_lessons', 'total_lessons', 'enrolled_at', 'started_at', 'completed_at', 'last_accessed', 'certificate_issued_at')
     
     def get_queryset(self, request):
         return super().get_queryset(request).select_related('student', 'course')
@@ -53,8 +54,17 @@ class EnrollmentAdmin(admin.ModelAdmin):
     complete_enrollments.short_description = "Mark as completed"
     
     def issue_certificates(self, request, queryset):
-        queryset.update(certificate_issued=True)
-    issue_certificates.short_description = "Issue certificates"
+        from .certificates import issue_certificates
+        
+        # Rendered in a process pool after the response; see enrollments.certificates
+        enrollment_ids = list(queryset.values_list('pk', flat=True))
+        run_in_background(issue_certificates, enrollment_ids)
+        self.message_user(
+            request,
+            f"Rendering certificates for {len(enrollment_ids)} enrollment(s) in the background. "
+            "Enrollments that are not completed are skipped."
+        )
+    issue_certificates.short_description = "Issue certificates (render PDFs)"
 
 
 @admin.register(LessonProgress)
@@ -138,3 +148,14 @@ class CertificateAdmin(admin.ModelAdmin):
     
     def get_queryset(self, request):
         return super().get_queryset(request).select_related('enrollment__student', 'enrollment__course')
+
+
+@admin.register(WaitlistEntry)
+class WaitlistEntryAdmin(admin.ModelAdmin):
+    list_display = ('student', 'course', 'created_at')
+    list_filter = ('created_at',)
+    search_fields = ('student__username', 'student__email', 'course__title')
+    raw_id_fields = ('student', 'course')
+    
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('student', 'course')
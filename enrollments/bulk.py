@@ -0,0 +1,177 @@
+"""
+Cohort enrollment: enroll many students in one course at once.
+
+Students are given as usernames or email addresses and handled in
+batches. Each batch resolves its users with one query and then, inside a
+transaction holding the course's stats row lock, reads the existing
+enrollments, inserts the new ones with a single conflict-tolerant
+bulk_create, bumps CourseStats.enrollment_count and writes the
+ActivityLog rows in bulk. Single enrollments claim their seats on the
+same row (see enrollments.seats), so the lock keeps Course.max_students
+from being exceeded.
+
+Every input row gets a BulkEnrollmentRow in the report.
+"""
+from collections import Counter, namedtuple
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from courses.models import CourseStats, rebuild_course_stats
+from courses.page_cache import invalidate_course_page
+
+from .models import Enrollment
+
+DEFAULT_BATCH_SIZE = 500
+
+# Row statuses
+ENROLLED = 'enrolled'
+ALREADY_ENROLLED = 'already_enrolled'
+DUPLICATE = 'duplicate'
+NOT_FOUND = 'not_found'
+AMBIGUOUS = 'ambiguous'
+COURSE_FULL = 'course_full'
+
+BulkEnrollmentRow = namedtuple('BulkEnrollmentRow', 'identifier status student_id')
+
+
+def _batches(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def _resolve_users(identifiers):
+    """{identifier: user_id or AMBIGUOUS} for usernames and emails, one query"""
+    User = get_user_model()
+    emails = {i for i in identifiers if '@' in i}
+    emails |= {email.lower() for email in emails}
+    usernames = [i for i in identifiers if '@' not in i]
+    rows = User.objects.filter(
+        Q(username__in=usernames) | Q(email__in=emails), is_active=True
+    ).values_list('pk', 'username', 'email')
+
+    by_username, by_email = {}, {}
+    for pk, username, email in rows:
+        by_username[username] = pk
+        email = email.lower()
+        by_email[email] = AMBIGUOUS if email in by_email else pk
+
+    resolved = {}
+    for identifier in identifiers:
+        if '@' in identifier:
+            user_id = by_email.get(identifier.lower())
+        else:
+            user_id = by_username.get(identifier)
+        if user_id is not None:
+            resolved[identifier] = user_id
+    return resolved
+
+
+def _locked_stats(course):
+    """The course's CourseStats row, locked for the rest of the transaction"""
+    stats = CourseStats.objects.select_for_update().filter(course_id=course.pk).first()
+    if stats is None:
+        rebuild_course_stats([course.pk])
+        stats = CourseStats.objects.select_for_update().get(course_id=course.pk)
+    return stats
+
+
+def _enroll_batch(course, student_ids):
+    """
+    Enroll a batch of resolved, de-duplicated students.
+
+    Returns {student_id: status} for the batch.
+    """
+    from dashboard.models import ActivityLog
+
+    with transaction.atomic():
+        stats = _locked_stats(course)
+        existing = set(Enrollment.objects.filter(
+            course=course, student_id__in=student_ids
+        ).values_list('student_id', flat=True))
+        statuses = {student_id: ALREADY_ENROLLED for student_id in existing}
+
+        candidates = [student_id for student_id in student_ids if student_id not in existing]
+        if course.max_students is not None:
+            seats = max(course.max_students - stats.enrollment_count, 0)
+            for student_id in candidates[seats:]:
+                statuses[student_id] = COURSE_FULL
+            candidates = candidates[:seats]
+        if not candidates:
+            return statuses
+
+        now = timezone.now()
+        Enrollment.objects.bulk_create(
+            [
+                Enrollment(
+                    student_id=student_id, course=course, enrolled_at=now,
+                    total_lessons=stats.lesson_count,
+                )
+                for student_id in candidates
+            ],
+            ignore_conflicts=True,
+        )
+        # Rows that lost a race with a single-student enrollment are not ours
+        enrolled = set(Enrollment.objects.filter(
+            course=course, student_id__in=candidates, enrolled_at=now
+        ).values_list('student_id', flat=True))
+        for student_id in candidates:
+            statuses[student_id] = ENROLLED if student_id in enrolled else ALREADY_ENROLLED
+
+        # bulk_create skips the post_save signals that maintain the stats
+        CourseStats.objects.filter(pk=stats.pk).update(
+            enrollment_count=F('enrollment_count') + len(enrolled), updated_at=now
+        )
+        ActivityLog.objects.bulk_create([
+            ActivityLog(
+                user_id=student_id, course=course, action='course_enrolled',
+                description=f'Enrolled in {course.title}'[:255],
+            )
+            for student_id in enrolled
+        ])
+    return statuses
+
+
+def enroll_students(course, identifiers, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Enroll students given by username or email in a course.
+
+    Returns a list of BulkEnrollmentRow in input order; student_id is None
+    for rows that did not resolve to exactly one active user.
+    """
+    identifiers = [str(identifier).strip() for identifier in identifiers]
+    rows = []
+    seen = set()
+    for batch in _batches(identifiers, batch_size):
+        resolved = _resolve_users({identifier for identifier in batch if identifier})
+        pending = []
+        for identifier in batch:
+            student_id = resolved.get(identifier)
+            if student_id is None:
+                rows.append(BulkEnrollmentRow(identifier, NOT_FOUND, None))
+            elif student_id == AMBIGUOUS:
+                rows.append(BulkEnrollmentRow(identifier, AMBIGUOUS, None))
+            elif student_id in seen:
+                rows.append(BulkEnrollmentRow(identifier, DUPLICATE, student_id))
+            else:
+                seen.add(student_id)
+                pending.append(student_id)
+                rows.append(BulkEnrollmentRow(identifier, None, student_id))
+
+        if pending:
+            statuses = _enroll_batch(course, pending)
+            rows[-len(batch):] = [
+                row if row.status else row._replace(status=statuses[row.student_id])
+                for row in rows[-len(batch):]
+            ]
+
+    if any(row.status == ENROLLED for row in rows):
+        invalidate_course_page(course.pk)
+    return rows
+
+
+def summarize(rows):
+    """{status: count} for a report"""
+    return dict(Counter(row.status for row in rows))
@@ -0,0 +1,79 @@
+"""
+Certificate page layout, drawn with Pillow and saved as a one-page PDF.
+
+The page is drawn on top of an optional background template image
+(settings.CERTIFICATE_TEMPLATE). This module deliberately imports nothing
+from Django, so process pool workers can load it without setting Django up.
+"""
+import logging
+from io import BytesIO
+
+from PIL import Image, ImageDraw, ImageFont
+
+logger = logging.getLogger(__name__)
+
+# A4 landscape at 150 dpi
+PAGE_SIZE = (1754, 1240)
+PAGE_DPI = 150
+INK = (33, 37, 41)
+ACCENT = (102, 126, 234)
+
+FONT_FILES = {
+    'regular': 'DejaVuSerif.ttf',
+    'bold': 'DejaVuSerif-Bold.ttf',
+}
+
+
+def _font(path, size):
+    try:
+        return ImageFont.truetype(path, size)
+    except OSError:
+        logger.warning('Certificate font %s not found; using the default font', path)
+        return ImageFont.load_default()
+
+
+def _background(template_path):
+    if template_path:
+        with Image.open(template_path) as template:
+            return template.convert('RGB').resize(PAGE_SIZE)
+    page = Image.new('RGB', PAGE_SIZE, (255, 255, 255))
+    draw = ImageDraw.Draw(page)
+    draw.rectangle([40, 40, PAGE_SIZE[0] - 41, PAGE_SIZE[1] - 41], outline=ACCENT, width=12)
+    draw.rectangle([70, 70, PAGE_SIZE[0] - 71, PAGE_SIZE[1] - 71], outline=ACCENT, width=2)
+    return page
+
+
+def render_certificate_pdf(data, template_path=None, fonts=None):
+    """
+    PDF bytes for one certificate.
+
+    data holds certificate_id, student_name, course_title, instructor_name
+    and completion_date (a string). fonts maps 'regular' and 'bold' to
+    TrueType files, overriding FONT_FILES.
+    """
+    fonts = {**FONT_FILES, **(fonts or {})}
+    page = _background(template_path)
+    draw = ImageDraw.Draw(page)
+    center = PAGE_SIZE[0] // 2
+    lines = [
+        ('Certificate of Completion', 'bold', 84, ACCENT, 260),
+        ('This certifies that', 'regular', 40, INK, 420),
+        (data['student_name'], 'bold', 72, INK, 520),
+        ('has successfully completed', 'regular', 40, INK, 640),
+        (data['course_title'], 'bold', 56, INK, 730),
+        (f"Instructor: {data['instructor_name']}", 'regular', 34, INK, 880),
+        (f"Completed on {data['completion_date']}", 'regular', 34, INK, 940),
+        (f"Certificate ID: {data['certificate_id']}", 'regular', 26, INK, 1100),
+    ]
+    for text, style, size, color, y in lines:
+        draw.text((center, y), text, font=_font(fonts[style], size), fill=color, anchor='mm')
+
+    buffer = BytesIO()
+    page.save(buffer, 'PDF', resolution=PAGE_DPI, title=f"Certificate {data['certificate_id']}")
+    return buffer.getvalue()
+
+
+def render_job(job):
+    """(certificate_id, pdf bytes) for a (certificate_id, data, template_path, fonts) job"""
+    certificate_id, data, template_path, fonts = job
+    return certificate_id, render_certificate_pdf(data, template_path, fonts)
@@ -0,0 +1,142 @@
+"""
+Certificate PDFs, rendered in a pool of worker processes.
+
+Pages are drawn by enrollments.certificate_pdf. Rendering is CPU-bound,
+so batches are spread over a ProcessPoolExecutor: workers only turn plain
+dicts into PDF bytes, while this process reads the database and writes
+the files through the storage backend. Requests never render; they
+schedule their one certificate in the background, rendered in the
+background thread itself since a pool is not worth starting for one page,
+and the download view serves the stored file.
+
+Certificates are keyed by enrollment (Certificate.enrollment is one to
+one), so issuing the same enrollment twice reuses its row and, unless
+forced, its existing PDF.
+"""
+import multiprocessing
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.db.models import Q
+from django.utils import timezone
+
+from .certificate_pdf import render_job
+from lms_project.tasks import run_in_background
+
+from .models import Certificate, Enrollment, new_certificate_id
+
+DEFAULT_BATCH_SIZE = 100
+
+# A scheduled render blocks further requests for the same enrollment this long
+SCHEDULE_LOCK_TIMEOUT = 60 * 5
+
+
+def _certificate_data(certificate):
+    return {
+        'certificate_id': certificate.certificate_id,
+        'student_name': certificate.student_name,
+        'course_title': certificate.course_title,
+        'instructor_name': certificate.instructor_name,
+        'completion_date': certificate.completion_date.strftime('%B %d, %Y').replace(' 0', ' '),
+    }
+
+
+def _ensure_certificates(enrollments):
+    """Create the missing Certificate rows for completed enrollments in one insert"""
+    missing = enrollments.filter(certificate__isnull=True).select_related('student', 'course__instructor')
+    Certificate.objects.bulk_create(
+        [
+            Certificate(
+                enrollment=enrollment,
+                certificate_id=new_certificate_id(),
+                student_name=enrollment.student.get_full_name() or enrollment.student.username,
+                course_title=enrollment.course.title,
+                instructor_name=(
+                    enrollment.course.instructor.get_full_name() or enrollment.course.instructor.username
+                ),
+                completion_date=(enrollment.completed_at or timezone.now()).date(),
+            )
+            for enrollment in missing
+        ],
+        # Another batch may issue the same enrollment concurrently
+        ignore_conflicts=True,
+    )
+
+
+def completed_enrollments():
+    return Enrollment.objects.filter(Q(status='completed') | Q(progress_percentage__gte=100))
+
+
+def _render_batch(certificates, executor, template_path, fonts):
+    jobs = [(c.certificate_id, _certificate_data(c), template_path, fonts) for c in certificates]
+    if executor is None:
+        return map(render_job, jobs)
+    return executor.map(render_job, jobs)
+
+
+def issue_certificates(enrollment_ids=None, force=False, workers=None, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Create and render certificates for completed enrollments.
+
+    Covers every completed enrollment when enrollment_ids is None.
+    Certificates that already have a PDF are skipped unless force is set.
+    workers=0 renders in this process. Returns a Counter with 'rendered',
+    'skipped' and 'not_completed'.
+    """
+    if workers is None:
+        workers = getattr(settings, 'CERTIFICATE_RENDER_PROCESSES', 2)
+    template_path = getattr(settings, 'CERTIFICATE_TEMPLATE', None)
+    fonts = getattr(settings, 'CERTIFICATE_FONTS', None)
+    counts = Counter()
+
+    enrollments = completed_enrollments()
+    if enrollment_ids is not None:
+        enrollment_ids = set(enrollment_ids)
+        enrollments = enrollments.filter(pk__in=enrollment_ids)
+        counts['not_completed'] = len(enrollment_ids) - enrollments.count()
+    _ensure_certificates(enrollments)
+
+    certificates = Certificate.objects.filter(enrollment__in=enrollments).order_by('pk')
+    if not force:
+        counts['skipped'] = certificates.exclude(pdf_file='').exclude(pdf_file__isnull=True).count()
+        certificates = certificates.filter(Q(pdf_file='') | Q(pdf_file__isnull=True))
+
+    executor = None
+    if workers:
+        # Spawned workers import only the Pillow renderer, never Django
+        executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+    try:
+        pending = list(certificates)
+        for start in range(0, len(pending), batch_size):
+            batch = {c.certificate_id: c for c in pending[start:start + batch_size]}
+            for certificate_id, pdf in _render_batch(batch.values(), executor, template_path, fonts):
+                certificate = batch[certificate_id]
+                old_name = certificate.pdf_file.name
+                certificate.pdf_file.save(f'{certificate_id}.pdf', ContentFile(pdf), save=False)
+                if old_name and old_name != certificate.pdf_file.name:
+                    certificate.pdf_file.storage.delete(old_name)
+            Certificate.objects.bulk_update(batch.values(), ['pdf_file'])
+            Enrollment.objects.filter(certificate__in=batch.values(), certificate_issued=False).update(
+                certificate_issued=True, certificate_issued_at=timezone.now()
+            )
+            counts['rendered'] += len(batch)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    return counts
+
+
+def schedule_certificate(enrollment_id):
+    """Render one enrollment's certificate in the background, at most once at a time"""
+    if cache.add(f'certificate_render:{enrollment_id}', True, SCHEDULE_LOCK_TIMEOUT):
+        run_in_background(_issue_and_unlock, [enrollment_id])
+
+
+def _issue_and_unlock(enrollment_ids):
+    try:
+        issue_certificates(enrollment_ids, workers=0)
+    finally:
+        cache.delete_many([f'certificate_render:{enrollment_id}' for enrollment_id in enrollment_ids])
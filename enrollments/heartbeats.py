@@ -0,0 +1,240 @@
+"""
+Write-behind buffer for video heartbeats and study time.
+
+Players report their position and watched seconds every few seconds.
+Instead of a read-modify-save per report, events are coalesced in the
+cache - the highest position and the summed seconds per
+(enrollment, lesson) - and flush_heartbeats applies them with one bulk
+UPDATE per batch.
+
+Buffered pairs live in numbered generations. Writers use the current
+generation; a flush starts a new one and drains the generations before
+the one it retires, so a writer that read the generation number just
+before the switch still lands in a generation nobody is draining. Events
+are therefore written one flush later. Within a generation the first
+event for a pair claims a slot number from an atomic counter, so a flush
+can find all pairs with get_many() and no key scans. A crash loses at
+most the events buffered since the last flush.
+"""
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Value, When
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from .models import LessonProgress
+
+DEFAULT_BATCH_SIZE = 500
+
+# Limits for one ingestion request
+MAX_EVENTS_PER_REQUEST = 100
+MAX_SECONDS_PER_EVENT = 5 * 60
+
+# Buffered keys outlive a missed flush or two, then expire on their own
+BUFFER_TIMEOUT = 60 * 60 * 6
+
+GENERATION_KEY = 'heartbeat:generation'
+DRAINED_KEY = 'heartbeat:drained'
+
+
+def _cache():
+    return caches[getattr(settings, 'HEARTBEAT_CACHE', 'default')]
+
+
+def _seq_key(generation):
+    return f'heartbeat:{generation}:seq'
+
+
+def _slot_key(generation, n):
+    return f'heartbeat:{generation}:slot:{n}'
+
+
+def _seconds_key(generation, enrollment_id, lesson_id):
+    return f'heartbeat:{generation}:seconds:{enrollment_id}:{lesson_id}'
+
+
+def _position_key(generation, enrollment_id, lesson_id):
+    return f'heartbeat:{generation}:position:{enrollment_id}:{lesson_id}'
+
+
+def _incr(cache, key, delta=1):
+    """Atomic increment that creates the counter if needed"""
+    cache.add(key, 0, BUFFER_TIMEOUT)
+    return cache.incr(key, delta)
+
+
+def current_generation(cache=None):
+    cache = cache or _cache()
+    cache.add(GENERATION_KEY, 1, None)
+    return cache.get(GENERATION_KEY)
+
+
+def _buffer(cache, generation, enrollment_id, lesson_id, position=None, seconds=0):
+    seconds_key = _seconds_key(generation, enrollment_id, lesson_id)
+    if cache.add(seconds_key, seconds, BUFFER_TIMEOUT):
+        # First event for this pair in this generation: register it
+        n = _incr(cache, _seq_key(generation))
+        cache.set(_slot_key(generation, n), (enrollment_id, lesson_id), BUFFER_TIMEOUT)
+    elif seconds:
+        _incr(cache, seconds_key, seconds)
+
+    if position is not None:
+        # Only the student's own player reports a pair, so races here are
+        # rare and lose a position at worst
+        position_key = _position_key(generation, enrollment_id, lesson_id)
+        buffered = cache.get(position_key)
+        if buffered is None or position > buffered:
+            cache.set(position_key, position, BUFFER_TIMEOUT)
+
+
+def parse_events(events, outline):
+    """
+    Validate request events into (lesson_id, position, seconds) tuples.
+
+    Each event is {"lesson_id": int, "position": int or null, "seconds": int}
+    and must name a lesson of the outline's course. Raises ValueError.
+    """
+    if not isinstance(events, list) or not events:
+        raise ValueError('events must be a non-empty list')
+    if len(events) > MAX_EVENTS_PER_REQUEST:
+        raise ValueError(f'at most {MAX_EVENTS_PER_REQUEST} events per request')
+    parsed = []
+    for event in events:
+        try:
+            lesson_id = int(event['lesson_id'])
+            position = event.get('position')
+            position = None if position is None else max(0, int(position))
+            seconds = min(max(0, int(event.get('seconds') or 0)), MAX_SECONDS_PER_EVENT)
+        except (KeyError, TypeError, ValueError, AttributeError):
+            raise ValueError('each event needs an integer lesson_id, position and seconds')
+        if outline.get(lesson_id) is None:
+            raise ValueError(f'lesson {lesson_id} is not part of this course')
+        parsed.append((lesson_id, position, seconds))
+    return parsed
+
+
+def record_heartbeats(enrollment_id, events):
+    """
+    Buffer heartbeat events for one enrollment.
+
+    events is an iterable of (lesson_id, position_seconds, watched_seconds);
+    position may be None. Nothing touches the database.
+    """
+    cache = _cache()
+    generation = current_generation(cache)
+    for lesson_id, position, seconds in events:
+        _buffer(cache, generation, enrollment_id, lesson_id, position, seconds)
+
+
+def _drain_generation(cache, generation, batch_size):
+    """Yield batches of {(enrollment_id, lesson_id): (position, seconds)} and drop the keys"""
+    count = cache.get(_seq_key(generation)) or 0
+    for start in range(1, count + 1, batch_size):
+        slot_keys = [_slot_key(generation, n) for n in range(start, min(start + batch_size, count + 1))]
+        pairs = list(cache.get_many(slot_keys).values())
+        data_keys = {
+            pair: (_position_key(generation, *pair), _seconds_key(generation, *pair)) for pair in pairs
+        }
+        values = cache.get_many([key for keys in data_keys.values() for key in keys])
+        batch = {
+            pair: (values.get(position_key), values.get(seconds_key) or 0)
+            for pair, (position_key, seconds_key) in data_keys.items()
+        }
+        yield batch
+        cache.delete_many(slot_keys + [key for keys in data_keys.values() for key in keys])
+    cache.delete(_seq_key(generation))
+
+
+def _remainder_key(enrollment_id, lesson_id):
+    return f'heartbeat:remainder:{enrollment_id}:{lesson_id}'
+
+
+def apply_heartbeats(batch):
+    """
+    Write one batch of coalesced heartbeats with a single UPDATE.
+
+    batch maps (enrollment_id, lesson_id) to (position, seconds). Missing
+    LessonProgress rows are created first; pairs whose enrollment or lesson
+    has been deleted are dropped. Returns the pairs written.
+    """
+    from courses.models import Lesson
+    from .models import Enrollment
+
+    enrollment_ids = set(Enrollment.objects.filter(
+        pk__in={e for e, _ in batch}
+    ).values_list('pk', flat=True))
+    lesson_ids = set(Lesson.objects.filter(pk__in={l for _, l in batch}).values_list('pk', flat=True))
+    batch = {pair: value for pair, value in batch.items() if pair[0] in enrollment_ids and pair[1] in lesson_ids}
+    if not batch:
+        return 0
+
+    LessonProgress.objects.bulk_create(
+        [LessonProgress(enrollment_id=e, lesson_id=l) for e, l in batch],
+        ignore_conflicts=True,
+    )
+    rows = LessonProgress.objects.filter(
+        enrollment_id__in=enrollment_ids, lesson_id__in=lesson_ids
+    ).values_list('pk', 'enrollment_id', 'lesson_id')
+    pks = {(e, l): pk for pk, e, l in rows if (e, l) in batch}
+
+    positions, minutes = [], []
+    for pair, (position, seconds) in batch.items():
+        if position is not None:
+            positions.append(When(pk=pks[pair], then=Value(position)))
+        if seconds >= 60:
+            minutes.append(When(pk=pks[pair], then=Value(seconds // 60)))
+
+    now = timezone.now()
+    changes = {'last_accessed': now, 'updated_at': now}
+    if positions:
+        changes['video_progress_seconds'] = Greatest(
+            F('video_progress_seconds'), Case(*positions, default=Value(0), output_field=IntegerField())
+        )
+    if minutes:
+        changes['time_spent_minutes'] = F('time_spent_minutes') + Case(
+            *minutes, default=Value(0), output_field=IntegerField()
+        )
+    LessonProgress.objects.filter(pk__in=pks.values()).update(**changes)
+    return len(batch)
+
+
+def _carry_remainders(cache, batch):
+    """
+    Add the seconds left over from earlier flushes to a batch.
+
+    Study time is stored in whole minutes; the sub-minute rest of each pair
+    waits in the cache until the pair is active again.
+    """
+    keys = {pair: _remainder_key(*pair) for pair in batch}
+    remainders = cache.get_many(list(keys.values()))
+    carried = {}
+    for pair, (position, seconds) in batch.items():
+        seconds += remainders.get(keys[pair], 0)
+        carried[pair] = (position, seconds)
+    cache.set_many({keys[pair]: seconds % 60 for pair, (_, seconds) in carried.items()}, BUFFER_TIMEOUT)
+    return carried
+
+
+def flush_heartbeats(batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Apply every buffered generation older than the one this flush retires.
+
+    The retired generation is left to the next flush, giving writers still
+    using it one interval to finish.
+
+    Returns the number of (enrollment, lesson) pairs written.
+    """
+    cache = _cache()
+    generation = current_generation(cache)
+    cache.incr(GENERATION_KEY)
+    cache.add(DRAINED_KEY, 0, None)
+    drained = cache.get(DRAINED_KEY)
+
+    written = 0
+    for old in range(drained + 1, generation):
+        for batch in _drain_generation(cache, old, batch_size):
+            with transaction.atomic():
+                written += apply_heartbeats(_carry_remainders(cache, batch))
+        cache.set(DRAINED_KEY, old, None)
+    return written
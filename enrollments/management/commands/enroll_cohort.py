@@ -0,0 +1,74 @@
+"""
+Management command to enroll a cohort of students from a CSV file.
+
+The CSV needs a `username` or `email` column; without a header row the
+first column is used. A per-row report can be written with --report.
+"""
+import csv
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from courses.models import Course
+from enrollments.bulk import BulkEnrollmentRow, DEFAULT_BATCH_SIZE, enroll_students, summarize
+
+
+class Command(BaseCommand):
+    help = 'Enroll the students listed in a CSV file in a course'
+
+    def add_arguments(self, parser):
+        parser.add_argument('course', help='Course id or slug')
+        parser.add_argument('path', help='CSV file of usernames or emails, or - for stdin')
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=DEFAULT_BATCH_SIZE,
+            help=f'Students resolved and inserted per batch (default: {DEFAULT_BATCH_SIZE})'
+        )
+        parser.add_argument(
+            '--report',
+            help='Write the per-row results to this CSV file'
+        )
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be at least 1')
+
+        lookup = {'pk': options['course']} if options['course'].isdigit() else {'slug': options['course']}
+        course = Course.objects.filter(**lookup).first()
+        if course is None:
+            raise CommandError(f"Course '{options['course']}' does not exist")
+
+        if options['path'] == '-':
+            identifiers = self.read_identifiers(sys.stdin)
+        else:
+            try:
+                with open(options['path'], newline='', encoding='utf-8-sig') as f:
+                    identifiers = self.read_identifiers(f)
+            except OSError as e:
+                raise CommandError(str(e))
+
+        rows = enroll_students(course, identifiers, batch_size=options['batch_size'])
+
+        if options['report']:
+            with open(options['report'], 'w', newline='', encoding='utf-8') as f:
+                writer = csv.writer(f)
+                writer.writerow(BulkEnrollmentRow._fields)
+                writer.writerows(rows)
+
+        summary = ', '.join(f'{count} {status}' for status, count in sorted(summarize(rows).items()))
+        self.stdout.write(self.style.SUCCESS(f'✓ {course.title}: {summary or "no students in file"}'))
+
+    def read_identifiers(self, f):
+        reader = csv.reader(f)
+        header = next(reader, None)
+        if header is None:
+            return []
+        columns = [name.strip().lower() for name in header]
+        for name in ('username', 'email'):
+            if name in columns:
+                index = columns.index(name)
+                return [row[index] for row in reader if len(row) > index and row[index].strip()]
+        # No header: the first row is data
+        rows = [header, *reader]
+        return [row[0] for row in rows if row and row[0].strip()]
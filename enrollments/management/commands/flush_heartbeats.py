@@ -0,0 +1,45 @@
+"""
+Management command to write buffered video heartbeats to the database.
+Run it every minute from cron, or keep it running with --loop.
+"""
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from enrollments.heartbeats import DEFAULT_BATCH_SIZE, flush_heartbeats
+
+
+class Command(BaseCommand):
+    help = 'Flush buffered video positions and study time to LessonProgress'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=DEFAULT_BATCH_SIZE,
+            help=f'Lesson progress rows per UPDATE (default: {DEFAULT_BATCH_SIZE})'
+        )
+        parser.add_argument(
+            '--loop',
+            action='store_true',
+            help='Keep flushing every --interval seconds'
+        )
+        parser.add_argument(
+            '--interval',
+            type=int,
+            default=30,
+            help='Seconds between flushes with --loop (default: 30)'
+        )
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1 or options['interval'] < 1:
+            raise CommandError('--batch-size and --interval must be at least 1')
+
+        while True:
+            written = flush_heartbeats(options['batch_size'])
+            self.stdout.write(
+                self.style.SUCCESS(f'✓ Flushed heartbeats for {written} lesson progress row(s)')
+            )
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,58 @@
+"""
+Management command to issue certificate PDFs for completed enrollments.
+Rendering runs in a pool of worker processes; see enrollments/certificates.py.
+"""
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from enrollments.certificates import DEFAULT_BATCH_SIZE, completed_enrollments, issue_certificates
+
+
+class Command(BaseCommand):
+    help = 'Create and render certificates for completed enrollments'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--course',
+            type=int,
+            action='append',
+            help='Only enrollments in this course id (repeatable)'
+        )
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Re-render certificates that already have a PDF'
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=settings.CERTIFICATE_RENDER_PROCESSES,
+            help=f'Rendering processes, 0 to render inline (default: {settings.CERTIFICATE_RENDER_PROCESSES})'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=DEFAULT_BATCH_SIZE,
+            help=f'Certificates stored per batch (default: {DEFAULT_BATCH_SIZE})'
+        )
+
+    def handle(self, *args, **options):
+        if options['workers'] < 0 or options['batch_size'] < 1:
+            raise CommandError('--workers must be 0 or more and --batch-size at least 1')
+
+        enrollment_ids = None
+        if options['course']:
+            enrollment_ids = list(
+                completed_enrollments().filter(course_id__in=options['course']).values_list('pk', flat=True)
+            )
+
+        counts = issue_certificates(
+            enrollment_ids,
+            force=options['force'],
+            workers=options['workers'],
+            batch_size=options['batch_size'],
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"✓ Rendered {counts['rendered']} certificate(s), "
+            f"{counts['skipped']} already had a PDF"
+        ))
@@ -0,0 +1,44 @@
+"""
+Management command to recompute module progress with set-based statements.
+Use it after bulk content changes or to repair drifted ModuleProgress rows.
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from enrollments.models import ROLLUP_BATCH_SIZE, Enrollment, rollup_module_progress
+
+
+class Command(BaseCommand):
+    help = 'Recompute ModuleProgress for enrollments with set-based statements'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--course',
+            type=int,
+            action='append',
+            help='Only enrollments in this course id (repeatable)'
+        )
+        parser.add_argument(
+            '--enrollment',
+            type=int,
+            action='append',
+            help='Only this enrollment id (repeatable)'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=ROLLUP_BATCH_SIZE,
+            help=f'Missing module progress rows per INSERT (default: {ROLLUP_BATCH_SIZE})'
+        )
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be at least 1')
+
+        enrollments = Enrollment.objects.all()
+        if options['course']:
+            enrollments = enrollments.filter(course_id__in=options['course'])
+        if options['enrollment']:
+            enrollments = enrollments.filter(pk__in=options['enrollment'])
+
+        written = rollup_module_progress(enrollments, batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'✓ Recomputed {written} module progress row(s)'))
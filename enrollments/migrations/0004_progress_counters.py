@@ -0,0 +1,67 @@
+# Generated by Django 4.2.7 on 2026-10-18 06:03
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def fill_progress_counters(apps, schema_editor):
+    Lesson = apps.get_model('courses', 'Lesson')
+    Enrollment = apps.get_model('enrollments', 'Enrollment')
+    LessonProgress = apps.get_model('enrollments', 'LessonProgress')
+    ModuleProgress = apps.get_model('enrollments', 'ModuleProgress')
+
+    counted = Lesson.objects.filter(is_published=True, module__is_published=True)
+    course_totals = counted.filter(module__course=OuterRef('course')).order_by().values(
+        'module__course'
+    ).annotate(n=Count('id')).values('n')
+    module_totals = counted.filter(module=OuterRef('module')).order_by().values(
+        'module'
+    ).annotate(n=Count('id')).values('n')
+    completed = LessonProgress.objects.filter(
+        enrollment=OuterRef('pk'), is_completed=True, lesson__in=counted
+    ).order_by().values('enrollment').annotate(n=Count('id')).values('n')
+    module_completed = LessonProgress.objects.filter(
+        enrollment=OuterRef('enrollment'), lesson__module=OuterRef('module'),
+        is_completed=True, lesson__in=counted,
+    ).order_by().values('enrollment').annotate(n=Count('id')).values('n')
+
+    Enrollment.objects.update(
+        total_lessons=Coalesce(Subquery(course_totals), 0),
+        completed_lessons=Coalesce(Subquery(completed), 0),
+    )
+    ModuleProgress.objects.update(
+        total_lessons=Coalesce(Subquery(module_totals), 0),
+        completed_lessons=Coalesce(Subquery(module_completed), 0),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('enrollments', '0003_keyset_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='enrollment',
+            name='completed_lessons',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='enrollment',
+            name='total_lessons',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='moduleprogress',
+            name='completed_lessons',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='moduleprogress',
+            name='total_lessons',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(fill_progress_counters, migrations.RunPython.noop),
+    ]
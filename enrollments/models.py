@@ -1,7 +1,22 @@
-from django.db import models
+import logging
+import uuid
+from collections import Counter
+from urllib.parse import quote
+
+from django.db import models, transaction
+from django.db.models import Case, Count, Exists, F, FloatField, OuterRef, Q, Subquery, Value, When
+from django.db.models.functions import Cast, Coalesce, Greatest, Round
+from django.db.models.lookups import GreaterThan, GreaterThanOrEqual
+from django.db.models.signals import post_init, post_save, post_delete
+from django.dispatch import receiver
 from django.conf import settings
+from django.core.cache import cache
+from django.urls import reverse
 from django.utils import timezone
-from courses.models import Course, Lesson, Module
+from courses.models import Course, CourseStats, Lesson, Module
+from lms_project.tasks import run_in_background
+
+logger = logging.getLogger(__name__)
 
 
 class Enrollment(models.Model):
@@ -28,8 +43,12 @@ class Enrollment(models.Model):
     completed_at = models.DateTimeField(null=True, blank=True)
     last_accessed = models.DateTimeField(auto_now=True)
     
-    # Progress tracking
+    # Progress tracking. The counters only include published lessons in
+    # published modules and are kept current with F() increments; the
+    # percentage is derived from them in the same UPDATE.
     progress_percentage = models.DecimalField(max_digits=5, decimal_places=2, default=0.00)
+    completed_lessons = models.PositiveIntegerField(default=0)
+    total_lessons = models.PositiveIntegerField(default=0)
     is_active = models.BooleanField(default=True)
     
     # Payment information (for paid courses)
@@ -51,11 +70,22 @@ class Enrollment(models.Model):
         indexes = [
             models.Index(fields=['student', 'status']),
             models.Index(fields=['course', 'status']),
+            # Keyset pagination key for per-student listings
+            models.Index(fields=['student', '-created_at', '-id']),
         ]
     
     def __str__(self):
         return f"{self.student.username} enrolled in {self.course.title}"
     
+    def save(self, *args, **kwargs):
+        if self._state.adding and not self.total_lessons:
+            self.total_lessons = CourseStats.objects.filter(
+                course_id=self.course_id
+            ).values_list('lesson_count', flat=True).first() or 0
+        # Keep CourseStats in the same transaction as the row itself
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+    
     def mark_as_started(self):
         """Mark the enrollment as started when first lesson is accessed"""
         if not self.started_at:
@@ -70,42 +100,31 @@ class Enrollment(models.Model):
         self.save(update_fields=['status', 'completed_at', 'progress_percentage'])
     
     def calculate_progress(self):
-        """Calculate and update progress percentage"""
-        total_lessons = self.course.total_lessons
-        if total_lessons == 0:
-            self.progress_percentage = 0.00
-        else:
-            completed_lessons = self.lesson_progress.filter(is_completed=True).count()
-            self.progress_percentage = (completed_lessons / total_lessons) * 100
+        """
+        Recount progress from the lesson_progress rows.
         
-        self.save(update_fields=['progress_percentage'])
+        Normal progress is maintained incrementally (see
+        apply_lesson_completion); this is the repair path.
+        """
+        self.total_lessons = _counted_lessons().filter(module__course_id=self.course_id).count()
+        self.completed_lessons = self.lesson_progress.filter(
+            is_completed=True, lesson__in=_counted_lessons()
+        ).count()
+        self.progress_percentage = _percent(self.completed_lessons, self.total_lessons)
+        self.save(update_fields=['completed_lessons', 'total_lessons', 'progress_percentage'])
+        rollup_module_progress(Enrollment.objects.filter(pk=self.pk))
         
         # Auto-complete if all lessons are done
         if self.progress_percentage >= 100 and self.status == 'active':
             self.mark_as_completed()
     
     def get_next_lesson(self):
-        """Get the next lesson the student should take"""
-        # Get all lessons in order
-        all_lessons = []
-        for module in self.course.modules.filter(is_published=True).order_by('order'):
-            all_lessons.extend(module.lessons.filter(is_published=True).order_by('order'))
-        
-        # Find first incomplete lesson
-        for lesson in all_lessons:
-            progress, created = LessonProgress.objects.get_or_create(
-                enrollment=self,
-                lesson=lesson,
-                defaults={'is_completed': False}
-            )
-            if not progress.is_completed:
-                return lesson
-        
-        return None
+        """Get the next lesson the student should take (one query, no writes)"""
+        return _pending_lessons(self.course_id, self.pk).first()
     
     def get_completed_lessons_count(self):
         """Get number of completed lessons"""
-        return self.lesson_progress.filter(is_completed=True).count()
+        return self.completed_lessons
     
     def get_total_study_time(self):
         """Get total time spent studying in minutes"""
@@ -147,25 +166,40 @@ class LessonProgress(models.Model):
         status = "✓" if self.is_completed else "○"
         return f"{status} {self.enrollment.student.username} - {self.lesson.title}"
     
+    def save(self, *args, **kwargs):
+        # The counter deltas applied by the post_save signal commit with the
+        # row, so a course recount sees both or neither
+        with transaction.atomic(savepoint=False):
+            super().save(*args, **kwargs)
+    
     def mark_as_completed(self):
-        """Mark lesson as completed and update enrollment progress"""
+        """Mark lesson as completed; enrollment progress follows via signals"""
         if not self.is_completed:
             self.is_completed = True
             self.completed_at = timezone.now()
             self.save(update_fields=['is_completed', 'completed_at'])
-            
-            # Update enrollment progress
-            self.enrollment.calculate_progress()
+    
+    def mark_as_incomplete(self):
+        """Undo a completion"""
+        if self.is_completed:
+            self.is_completed = False
+            self.completed_at = None
+            self.save(update_fields=['is_completed', 'completed_at'])
     
     def add_study_time(self, minutes):
-        """Add study time to the lesson"""
+        """Add study time to the lesson (players should use enrollments.heartbeats)"""
+        LessonProgress.objects.filter(pk=self.pk).update(
+            time_spent_minutes=F('time_spent_minutes') + minutes, last_accessed=timezone.now()
+        )
         self.time_spent_minutes += minutes
-        self.save(update_fields=['time_spent_minutes'])
     
     def update_video_progress(self, seconds):
-        """Update video watching progress"""
+        """Update video watching progress (players should use enrollments.heartbeats)"""
+        LessonProgress.objects.filter(pk=self.pk).update(
+            video_progress_seconds=Greatest(F('video_progress_seconds'), Value(seconds)),
+            last_accessed=timezone.now(),
+        )
         self.video_progress_seconds = max(self.video_progress_seconds, seconds)
-        self.save(update_fields=['video_progress_seconds'])
 
 
 class ModuleProgress(models.Model):
@@ -176,6 +210,8 @@ class ModuleProgress(models.Model):
     is_completed = models.BooleanField(default=False)
     completed_at = models.DateTimeField(null=True, blank=True)
     progress_percentage = models.DecimalField(max_digits=5, decimal_places=2, default=0.00)
+    completed_lessons = models.PositiveIntegerField(default=0)
+    total_lessons = models.PositiveIntegerField(default=0)
     
     first_accessed = models.DateTimeField(auto_now_add=True)
     last_accessed = models.DateTimeField(auto_now=True)
@@ -191,23 +227,22 @@ class ModuleProgress(models.Model):
         return f"{self.enrollment.student.username} - {self.module.title}"
     
     def calculate_progress(self):
-        """Calculate module progress based on lesson completion"""
-        total_lessons = self.module.lessons.filter(is_published=True).count()
-        if total_lessons == 0:
-            self.progress_percentage = 100.00
-        else:
-            completed_lessons = self.enrollment.lesson_progress.filter(
-                lesson__module=self.module,
-                is_completed=True
-            ).count()
-            self.progress_percentage = (completed_lessons / total_lessons) * 100
+        """Recount module progress from the lesson_progress rows"""
+        lessons = _counted_lessons().filter(module_id=self.module_id)
+        self.total_lessons = lessons.count()
+        self.completed_lessons = LessonProgress.objects.filter(
+            enrollment_id=self.enrollment_id, lesson__in=lessons, is_completed=True
+        ).count()
+        self.progress_percentage = _percent(self.completed_lessons, self.total_lessons, empty=100)
         
         # Mark as completed if all lessons are done
         if self.progress_percentage >= 100 and not self.is_completed:
             self.is_completed = True
             self.completed_at = timezone.now()
         
-        self.save(update_fields=['progress_percentage', 'is_completed', 'completed_at'])
+        self.save(update_fields=[
+            'completed_lessons', 'total_lessons', 'progress_percentage', 'is_completed', 'completed_at',
+        ])
 
 
 class StudentNote(models.Model):
@@ -235,6 +270,10 @@ class StudentNote(models.Model):
         return f"{self.student.username} - {self.lesson.title} note"
 
 
+def new_certificate_id():
+    return f"CERT-{uuid.uuid4().hex[:8].upper()}"
+
+
 class Certificate(models.Model):
     """Course completion certificates"""
     enrollment = models.OneToOneField(Enrollment, on_delete=models.CASCADE, related_name='certificate')
@@ -256,8 +295,394 @@ class Certificate(models.Model):
     def __str__(self):
         return f"Certificate - {self.student_name} - {self.course_title}"
     
+    def get_download_url(self):
+        """Stored PDF URL; the file name makes it safe to cache for good"""
+        url = reverse('enrollments:download_certificate', kwargs={'certificate_id': self.certificate_id})
+        return f"{url}?v={quote(self.pdf_file.name.rsplit('/', 1)[-1])}"
+    
     def save(self, *args, **kwargs):
         if not self.certificate_id:
-            import uuid
-            self.certificate_id = f"CERT-{uuid.uuid4().hex[:8].upper()}"
+            self.certificate_id = new_certificate_id()
         super().save(*args, **kwargs)
+
+
+class WaitlistEntry(models.Model):
+    """A student waiting for a seat in a full course (see enrollments.seats)"""
+    student = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='waitlist_entries'
+    )
+    course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='waitlist_entries')
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        unique_together = ['student', 'course']
+        # Queue order; the (course, id) index serves promotion and positions
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['course', 'id']),
+        ]
+    
+    def __str__(self):
+        return f"{self.student.username} waiting for {self.course.title}"
+
+
+def _counted_lessons():
+    """Lessons that count towards progress: published, in a published module"""
+    return Lesson.objects.filter(is_published=True, module__is_published=True)
+
+
+# Outline order: module order, then lesson order (see courses.outline)
+NEXT_LESSON_ORDERING = ('module__order', 'module__created_at', 'module_id', 'order', 'created_at', 'id')
+
+
+def _pending_lessons(course_id, enrollment_id):
+    """
+    Counted lessons of a course not completed in an enrollment, in outline order.
+
+    An anti-join against the completed progress rows. Both arguments may be
+    OuterRef()s relative to an enclosing Enrollment query.
+    """
+    if isinstance(enrollment_id, OuterRef):
+        # One level deeper inside the Exists()
+        enrollment_id = OuterRef(enrollment_id)
+    completed = LessonProgress.objects.filter(
+        enrollment_id=enrollment_id, lesson_id=OuterRef('pk'), is_completed=True
+    )
+    return _counted_lessons().filter(module__course_id=course_id).exclude(
+        Exists(completed)
+    ).order_by(*NEXT_LESSON_ORDERING)
+
+
+def with_next_lesson(enrollments):
+    """Annotate an Enrollment queryset with next_lesson_id (None once every lesson is done)"""
+    pending = _pending_lessons(OuterRef('course_id'), OuterRef('pk'))
+    return enrollments.annotate(next_lesson_id=Subquery(pending.values('pk')[:1]))
+
+
+def attach_next_lessons(enrollments):
+    """
+    Resolve the next lesson of many enrollments at once.
+
+    Evaluates the queryset with the next_lesson_id annotation and loads the
+    lessons with one more query, setting enrollment.next_lesson on each.
+    Returns the enrollments as a list.
+    """
+    enrollments = list(with_next_lesson(enrollments))
+    lessons = Lesson.objects.in_bulk({e.next_lesson_id for e in enrollments if e.next_lesson_id})
+    for enrollment in enrollments:
+        enrollment.next_lesson = lessons.get(enrollment.next_lesson_id)
+    return enrollments
+
+
+# Missing rows per INSERT in rollup_module_progress
+ROLLUP_BATCH_SIZE = 1000
+
+
+def _percent(completed, total, empty=0):
+    return round(completed * 100 / total, 2) if total else empty
+
+
+def _percent_expression(completed, total, empty=0):
+    """SQL for progress_percentage given completed/total expressions, rounded like _percent()"""
+    return Case(
+        When(GreaterThan(total, 0), then=Round(Cast(completed * 100, FloatField()) / total, 2)),
+        default=Value(float(empty)),
+        output_field=FloatField(),
+    )
+
+
+def _progress_changes(delta, now, done, empty=0, reopenable=Q()):
+    """
+    UPDATE kwargs applying a completion delta to a progress row.
+
+    done is (field, pending value, finished value) for the row's completion
+    flag. A finished row that a removal takes below its total goes back to
+    pending, as recalculate_course_progress would do, when it also matches
+    reopenable. An UPDATE reads the pre-update row, so conditions apply the
+    delta too.
+    """
+    field, pending, finished_value = done
+    completed = F('completed_lessons') + delta
+    finished = Q(**{field: pending}, total_lessons__gt=0, completed_lessons__gte=F('total_lessons') - delta)
+    whens = [When(finished, then=Value(finished_value))]
+    at_whens = [When(finished, then=Value(now))]
+    if delta < 0:
+        reopened = Q(**{field: finished_value}, completed_lessons__lt=F('total_lessons') - delta) & reopenable
+        whens.append(When(reopened, then=Value(pending)))
+        at_whens.append(When(reopened, then=Value(None)))
+    return {
+        'completed_lessons': completed,
+        'progress_percentage': _percent_expression(completed, F('total_lessons'), empty),
+        field: Case(*whens, default=F(field)),
+        'completed_at': Case(*at_whens, default=F('completed_at')),
+    }
+
+
+def apply_lesson_completion(enrollment_id, lesson_id, delta):
+    """
+    Add (delta=1) or remove (delta=-1) one completed lesson.
+
+    Costs a lookup and two UPDATEs whatever the size of the course.
+    Completing the last lesson completes the enrollment and the module in
+    the same statements; removing a completion reopens them (the enrollment
+    only while no certificate was issued).
+    """
+    module_id = _counted_lessons().filter(pk=lesson_id).values_list('module_id', flat=True).first()
+    if module_id is None:
+        return
+    now = timezone.now()
+    Enrollment.objects.filter(pk=enrollment_id).update(
+        **_progress_changes(delta, now, ('status', 'active', 'completed'), reopenable=Q(certificate_issued=False))
+    )
+    updated = ModuleProgress.objects.filter(enrollment_id=enrollment_id, module_id=module_id).update(
+        **_progress_changes(delta, now, ('is_completed', False, True), empty=100)
+    )
+    if not updated and delta > 0:
+        # First completion in this module: start the row from a recount
+        module_progress, _ = ModuleProgress.objects.get_or_create(
+            enrollment_id=enrollment_id, module_id=module_id
+        )
+        module_progress.calculate_progress()
+
+
+def recalculate_course_progress(course_id):
+    """
+    Recount the progress of every enrollment in a course with set-based UPDATEs.
+
+    Only needed when the set of counted lessons changes (lessons added,
+    removed, moved or (un)published); completions never trigger it. Active
+    enrollments that reach 100% are completed, completed ones that fall
+    below it are reopened unless a certificate was issued, and modules are
+    rolled up and reopened the same way. The enrollment rows stay locked
+    until the end, so completions made meanwhile apply their deltas on top
+    of the recount. Returns a Counter with 'enrollments', 'completed' and
+    'reopened'.
+    """
+    counts = Counter()
+    now = timezone.now()
+    lessons = _counted_lessons().filter(module__course_id=course_id)
+    completed = LessonProgress.objects.filter(
+        enrollment=OuterRef('pk'), is_completed=True, lesson__in=lessons
+    ).order_by().values('enrollment').annotate(n=Count('id')).values('n')
+    completed = Coalesce(Subquery(completed), 0)
+    enrollments = Enrollment.objects.filter(course_id=course_id)
+
+    with transaction.atomic():
+        counts['enrollments'] = len(enrollments.select_for_update().order_by('pk').values_list('pk', flat=True))
+        if not counts['enrollments']:
+            return counts
+        total = lessons.count()
+        enrollments.update(
+            total_lessons=total,
+            completed_lessons=completed,
+            progress_percentage=Round(Cast(completed * 100, FloatField()) / float(total), 2) if total else Value(0.0),
+        )
+        counts['completed'] = enrollments.filter(
+            status='active', total_lessons__gt=0, completed_lessons__gte=F('total_lessons')
+        ).update(status='completed', completed_at=now)
+        counts['reopened'] = enrollments.filter(
+            status='completed', completed_lessons__lt=F('total_lessons'), certificate_issued=False
+        ).update(status='active', completed_at=None)
+
+        rollup_module_progress(enrollments)
+        ModuleProgress.objects.filter(
+            enrollment__course_id=course_id, is_completed=True, completed_lessons__lt=F('total_lessons')
+        ).update(is_completed=False, completed_at=None, updated_at=now)
+    return counts
+
+
+# A queued recount absorbs further content changes to its course until it starts
+RECOUNT_LOCK_TIMEOUT = 60 * 5
+
+
+def _recount_key(course_id):
+    return f'progress_recount:{course_id}'
+
+
+def schedule_course_recount(course_id):
+    """Recount a course's progress in the background once this transaction commits"""
+    def enqueue():
+        if cache.add(_recount_key(course_id), True, RECOUNT_LOCK_TIMEOUT):
+            run_in_background(_run_course_recount, course_id)
+
+    transaction.on_commit(enqueue)
+
+
+def _run_course_recount(course_id):
+    # Changes committed from here on queue another pass
+    cache.delete(_recount_key(course_id))
+    counts = recalculate_course_progress(course_id)
+    logger.info(
+        'Recounted %d enrollment(s) of course %s: %d completed, %d reopened',
+        counts['enrollments'], course_id, counts['completed'], counts['reopened'],
+    )
+
+
+def rollup_module_progress(enrollments, batch_size=ROLLUP_BATCH_SIZE):
+    """
+    Recompute ModuleProgress for every module of the given enrollments.
+
+    One grouped query finds the (enrollment, module) pairs with completions
+    but no row, which are inserted empty in batches of batch_size; one
+    UPDATE with correlated grouped counts then recomputes every row of the
+    enrollments. Rows exist for modules with completions or an earlier row;
+    a module once completed stays completed. Returns the rows written.
+    """
+    now = timezone.now()
+    completions = LessonProgress.objects.filter(is_completed=True, lesson__in=_counted_lessons())
+    missing = completions.filter(enrollment__in=enrollments).exclude(Exists(ModuleProgress.objects.filter(
+        enrollment_id=OuterRef('enrollment_id'), module_id=OuterRef('lesson__module_id')
+    ))).order_by().values_list('enrollment_id', 'lesson__module_id').distinct()
+    ModuleProgress.objects.bulk_create(
+        [ModuleProgress(enrollment_id=enrollment_id, module_id=module_id) for enrollment_id, module_id in missing],
+        batch_size=batch_size,
+        ignore_conflicts=True,
+    )
+
+    completed = Coalesce(Subquery(
+        completions.filter(enrollment=OuterRef('enrollment_id'), lesson__module=OuterRef('module_id'))
+        .order_by().values('enrollment').annotate(n=Count('id')).values('n')
+    ), 0)
+    total = Coalesce(Subquery(
+        _counted_lessons().filter(module=OuterRef('module_id'))
+        .order_by().values('module').annotate(n=Count('id')).values('n')
+    ), 0)
+    # An UPDATE reads the pre-update row, so conditions use the counts again
+    finished = Q(is_completed=False) & Q(GreaterThanOrEqual(completed, total))
+    return ModuleProgress.objects.filter(enrollment__in=enrollments).update(
+        completed_lessons=completed,
+        total_lessons=total,
+        progress_percentage=_percent_expression(completed, total, empty=100),
+        is_completed=Case(When(finished, then=Value(True)), default=F('is_completed')),
+        completed_at=Case(When(finished, then=Value(now)), default=F('completed_at')),
+        updated_at=now,
+    )
+
+
+# Signals keeping the progress counters in sync. Completions apply O(1)
+# deltas; only changes to the set of counted lessons queue a course recount.
+
+@receiver(post_init, sender=LessonProgress)
+def snapshot_lesson_progress(sender, instance, **kwargs):
+    if instance.pk is None:
+        instance._progress_snapshot = None
+    else:
+        instance._progress_snapshot = tuple(
+            instance.__dict__.get(field) for field in ('enrollment_id', 'lesson_id', 'is_completed')
+        )
+
+
+@receiver(post_save, sender=LessonProgress)
+def update_progress_on_lesson_progress_save(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    previous = instance._progress_snapshot
+    current = (instance.enrollment_id, instance.lesson_id, instance.is_completed)
+    if previous != current:
+        if previous is not None and previous[2]:
+            apply_lesson_completion(previous[0], previous[1], -1)
+        if current[2]:
+            apply_lesson_completion(current[0], current[1], 1)
+    instance._progress_snapshot = current
+
+
+@receiver(post_delete, sender=LessonProgress)
+def update_progress_on_lesson_progress_delete(sender, instance, origin=None, **kwargs):
+    # Deleting the enrollment or the lesson (or anything above them) is
+    # covered elsewhere; only deletes of the rows themselves, one at a time
+    # or through a queryset, give the completion back
+    origin_model = origin.model if isinstance(origin, models.QuerySet) else type(origin)
+    if instance.is_completed and origin_model is LessonProgress:
+        apply_lesson_completion(instance.enrollment_id, instance.lesson_id, -1)
+
+
+@receiver(post_init, sender=Lesson)
+def snapshot_lesson_structure(sender, instance, **kwargs):
+    instance._progress_snapshot = (
+        (instance.__dict__.get('module_id'), instance.__dict__.get('is_published')) if instance.pk else None
+    )
+
+
+def _recalculate_for_modules(module_ids):
+    course_ids = Module.objects.filter(pk__in=module_ids).values_list('course_id', flat=True).distinct()
+    for course_id in course_ids:
+        schedule_course_recount(course_id)
+
+
+@receiver(post_save, sender=Lesson)
+def recalculate_progress_on_lesson_save(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    previous = instance._progress_snapshot
+    current = (instance.module_id, instance.is_published)
+    if previous != current:
+        _recalculate_for_modules({instance.module_id, previous[0] if previous else None} - {None})
+    instance._progress_snapshot = current
+
+
+@receiver(post_delete, sender=Lesson)
+def recalculate_progress_on_lesson_delete(sender, instance, **kwargs):
+    _recalculate_for_modules([instance.module_id])
+
+
+@receiver(post_init, sender=Module)
+def snapshot_module_structure(sender, instance, **kwargs):
+    instance._progress_snapshot = instance.__dict__.get('is_published') if instance.pk else None
+
+
+@receiver(post_save, sender=Module)
+def recalculate_progress_on_module_save(sender, instance, created, raw=False, **kwargs):
+    # A new module has no lessons yet; its lessons trigger the recount
+    if not raw and not created and instance._progress_snapshot != instance.is_published:
+        schedule_course_recount(instance.course_id)
+    instance._progress_snapshot = instance.is_published
+
+
+@receiver(post_delete, sender=Module)
+def recalculate_progress_on_module_delete(sender, instance, **kwargs):
+    schedule_course_recount(instance.course_id)
+
+
+# Freed seats go to the waitlist once the freeing transaction commits
+
+def _promote_after_commit(course_id):
+    from .seats import promote_waitlist
+    transaction.on_commit(lambda: promote_waitlist(course_id))
+
+
+@receiver(post_init, sender=Enrollment)
+def snapshot_enrollment_seat(sender, instance, **kwargs):
+    instance._seat_snapshot = instance.__dict__.get('is_active') if instance.pk else None
+
+
+@receiver(post_save, sender=Enrollment)
+def promote_waitlist_on_deactivation(sender, instance, raw=False, **kwargs):
+    if not raw and instance._seat_snapshot and not instance.is_active:
+        _promote_after_commit(instance.course_id)
+    instance._seat_snapshot = instance.is_active
+
+
+@receiver(post_delete, sender=Enrollment)
+def promote_waitlist_on_delete(sender, instance, **kwargs):
+    if instance.is_active:
+        _promote_after_commit(instance.course_id)
+
+
+# Public verification answers are cached; drop them when a certificate changes
+
+def _invalidate_verification_after_commit(certificate_id):
+    from .verification import invalidate_verification
+    transaction.on_commit(lambda: invalidate_verification(certificate_id))
+
+
+@receiver(post_save, sender=Certificate)
+def invalidate_verification_on_save(sender, instance, raw=False, **kwargs):
+    if not raw:
+        _invalidate_verification_after_commit(instance.certificate_id)
+
+
+@receiver(post_delete, sender=Certificate)
+def invalidate_verification_on_delete(sender, instance, **kwargs):
+    _invalidate_verification_after_commit(instance.certificate_id)
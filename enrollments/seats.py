@@ -0,0 +1,115 @@
+"""
+Seat reservation for courses with Course.max_students.
+
+CourseStats.enrollment_count is the seat counter. A seat is claimed with a
+single conditional UPDATE that only matches while the count is below the
+cap, so concurrent enrollments can never overshoot it and a full course is
+rejected without counting anything. The enrollment row is inserted in the
+same transaction; if it fails (the student is already enrolled) the claim
+rolls back with it.
+
+Students who find a course full may join its waitlist. Whenever an active
+enrollment is deleted or deactivated, the oldest waitlisted students are
+enrolled into the freed seats after the transaction commits.
+"""
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from courses.models import Course, CourseStats, rebuild_course_stats
+from courses.page_cache import invalidate_course_page
+
+from .models import Enrollment, WaitlistEntry
+
+
+class CourseFull(Exception):
+    """No seat is left in the course"""
+
+
+class AlreadyEnrolled(Exception):
+    """The student already has an enrollment in the course"""
+
+
+def claim_seats(course, count=1):
+    """
+    Atomically take `count` seats of a course. Returns False if they are not free.
+
+    Uncapped courses always succeed; the counter is still incremented.
+    """
+    seats = CourseStats.objects.filter(course_id=course.pk)
+    if course.max_students is not None:
+        seats = seats.filter(enrollment_count__lte=course.max_students - count)
+    changes = {'enrollment_count': F('enrollment_count') + count, 'updated_at': timezone.now()}
+    if seats.update(**changes):
+        return True
+    if not CourseStats.objects.filter(course_id=course.pk).exists():
+        # No stats row yet: build it and try once more
+        rebuild_course_stats([course.pk])
+        return bool(seats.update(**changes))
+    return False
+
+
+def is_full(course, stats=None):
+    if course.max_students is None:
+        return False
+    stats = stats or course.stats
+    return stats.enrollment_count >= course.max_students
+
+
+def enroll_student(student, course, **fields):
+    """
+    Claim a seat and create an active enrollment.
+
+    Raises CourseFull or AlreadyEnrolled; neither leaves anything behind.
+    """
+    with transaction.atomic():
+        if not claim_seats(course):
+            if Enrollment.objects.filter(student=student, course=course).exists():
+                raise AlreadyEnrolled
+            raise CourseFull
+        enrollment = Enrollment(student=student, course=course, **fields)
+        # The claim already counted this row
+        enrollment.stats_counted = True
+        try:
+            with transaction.atomic():
+                enrollment.save()
+        except IntegrityError:
+            raise AlreadyEnrolled
+    # The student count is part of the cached page
+    transaction.on_commit(lambda: invalidate_course_page(course.pk))
+    return enrollment
+
+
+def add_to_waitlist(student, course):
+    """Add a student to a course's waitlist; returns (entry, created)"""
+    return WaitlistEntry.objects.get_or_create(student=student, course=course)
+
+
+def waitlist_position(student, course):
+    """1-based place in the queue, or None if the student is not waiting"""
+    entry = WaitlistEntry.objects.filter(student=student, course=course).first()
+    if entry is None:
+        return None
+    return WaitlistEntry.objects.filter(course=course, pk__lte=entry.pk).count()
+
+
+def promote_waitlist(course_id):
+    """
+    Enroll waitlisted students, oldest first, until the course is full again.
+
+    Returns the new enrollments.
+    """
+    course = Course.objects.filter(pk=course_id).first()
+    if course is None:
+        return []
+    promoted = []
+    queue = WaitlistEntry.objects.filter(course=course).select_related('student').order_by('pk')
+    for entry in queue.iterator(chunk_size=20):
+        try:
+            promoted.append(enroll_student(entry.student, course))
+        except CourseFull:
+            break
+        except AlreadyEnrolled:
+            pass
+        entry.delete()
+    return promoted
@@ -1,3 +1,797 @@
-from django.test import TestCase
+import csv
+import os
+import shutil
+import tempfile
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.urls import reverse
+from django.utils import timezone
+
+from courses.models import Course, CourseStats, Lesson, Module
+from courses.tests import use_temporary_media_root
+from dashboard.models import ActivityLog
+from .bulk import enroll_students, summarize
+from . import verification
+from .certificates import issue_certificates
+from .heartbeats import current_generation, flush_heartbeats, record_heartbeats
+from .models import (
+    Certificate, Enrollment, LessonProgress, ModuleProgress, WaitlistEntry, attach_next_lessons,
+    recalculate_course_progress, rollup_module_progress,
+)
+from .seats import AlreadyEnrolled, CourseFull, add_to_waitlist, enroll_student, waitlist_position
+
+User = get_user_model()
+
+
+@override_settings(BACKGROUND_TASKS_EAGER=True)
+class EnrollmentProgressTestCase(TestCase):
+    """Test cases for the incremental progress counters"""
+
+    def setUp(self):
+        """Set up test data"""
+        cache.clear()
+        self.instructor = User.objects.create_user(
+            username='instructor', email='instructor@test.com',
+            password='testpass123', user_type='instructor'
+        )
+        self.student = User.objects.create_user(
+            username='student', email='student@test.com', password='testpass123'
+        )
+        self.course = Course.objects.create(
+            title='Python Basics', description='Learn Python', short_description='Python',
+            instructor=self.instructor, duration_weeks=4, estimated_hours=20, status='published',
+        )
+        self.modules = [
+            Module.objects.create(course=self.course, title=f'Module {m}', order=m) for m in (1, 2)
+        ]
+        self.lessons = [
+            Lesson.objects.create(module=module, title=f'Lesson {m}.{l}', order=l)
+            for m, module in enumerate(self.modules, start=1) for l in (1, 2)
+        ]
+        self.enrollment = Enrollment.objects.create(student=self.student, course=self.course)
+
+    def complete(self, lesson):
+        progress, _ = LessonProgress.objects.get_or_create(enrollment=self.enrollment, lesson=lesson)
+        progress.mark_as_completed()
+        return progress
+
+    def refresh(self):
+        self.enrollment.refresh_from_db()
+        return self.enrollment
+
+    def test_total_set_on_enrollment(self):
+        """Test that a new enrollment starts with the course's lesson count"""
+        self.assertEqual(self.enrollment.total_lessons, 4)
+        self.assertEqual(self.enrollment.completed_lessons, 0)
+
+    def test_completion_is_constant_cost(self):
+        """Test that completing a lesson does not recount the course"""
+        progress = LessonProgress.objects.create(enrollment=self.enrollment, lesson=self.lessons[0])
+        self.complete(self.lessons[1])
+        # save, lesson lookup, enrollment UPDATE, module progress UPDATE
+        with self.assertNumQueries(4):
+            progress.mark_as_completed()
+        enrollment = self.refresh()
+        self.assertEqual(enrollment.completed_lessons, 2)
+        self.assertEqual(enrollment.progress_percentage, 50)
+
+    def test_module_rollup_and_course_completion(self):
+        """Test that modules and the enrollment complete with their last lesson"""
+        for lesson in self.lessons[:2]:
+            self.complete(lesson)
+        module_progress = ModuleProgress.objects.get(enrollment=self.enrollment, module=self.modules[0])
+        self.assertTrue(module_progress.is_completed)
+        self.assertEqual(module_progress.progress_percentage, 100)
+        self.assertEqual(self.refresh().status, 'active')
+
+        for lesson in self.lessons[2:]:
+            self.complete(lesson)
+        enrollment = self.refresh()
+        self.assertEqual(enrollment.status, 'completed')
+        self.assertIsNotNone(enrollment.completed_at)
+        self.assertEqual(enrollment.progress_percentage, 100)
+
+    def test_uncomplete_and_delete(self):
+        """Test that undoing or deleting a completion gives it back"""
+        first = self.complete(self.lessons[0])
+        second = self.complete(self.lessons[1])
+        first.mark_as_incomplete()
+        self.assertEqual(self.refresh().completed_lessons, 1)
+        second.delete()
+        self.assertEqual(self.refresh().completed_lessons, 0)
+        module_progress = ModuleProgress.objects.get(enrollment=self.enrollment, module=self.modules[0])
+        self.assertEqual(module_progress.completed_lessons, 0)
+
+    def test_uncomplete_reopens(self):
+        """Test that undoing a completion reopens the module and enrollment like a recount"""
+        progress = [self.complete(lesson) for lesson in self.lessons]
+        self.assertEqual(self.refresh().status, 'completed')
+
+        progress[0].mark_as_incomplete()
+        enrollment = self.refresh()
+        self.assertEqual((enrollment.status, enrollment.completed_at), ('active', None))
+        module_progress = ModuleProgress.objects.get(enrollment=self.enrollment, module=self.modules[0])
+        self.assertEqual((module_progress.is_completed, module_progress.completed_at), (False, None))
+        self.assertEqual(module_progress.progress_percentage, 50)
+
+        # A certified enrollment stays completed, as recalculate_course_progress leaves it
+        progress[0].mark_as_completed()
+        Enrollment.objects.filter(pk=self.enrollment.pk).update(certificate_issued=True)
+        progress[1].mark_as_incomplete()
+        self.assertEqual(self.refresh().status, 'completed')
+
+    def test_bulk_delete_gives_completions_back(self):
+        """Test that queryset deletes (e.g. the admin action) update the counters"""
+        for lesson in self.lessons[:3]:
+            self.complete(lesson)
+        LessonProgress.objects.filter(lesson__in=self.lessons[1:3]).delete()
+        enrollment = self.refresh()
+        self.assertEqual((enrollment.completed_lessons, enrollment.progress_percentage), (1, 25))
+        self.assertEqual(
+            dict(ModuleProgress.objects.values_list('module_id', 'completed_lessons')),
+            {self.modules[0].pk: 1, self.modules[1].pk: 0},
+        )
+
+    def test_content_changes_recount(self):
+        """Test that adding, unpublishing and deleting lessons recounts the course"""
+        self.complete(self.lessons[0])
+        with self.captureOnCommitCallbacks(execute=True):
+            Lesson.objects.create(module=self.modules[0], title='Extra', order=3)
+        enrollment = self.refresh()
+        self.assertEqual(enrollment.total_lessons, 5)
+        self.assertEqual(enrollment.progress_percentage, 20)
+
+        self.lessons[0].is_published = False
+        with self.captureOnCommitCallbacks(execute=True):
+            self.lessons[0].save()
+        enrollment = self.refresh()
+        self.assertEqual((enrollment.completed_lessons, enrollment.total_lessons), (0, 4))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.modules[1].delete()
+        enrollment = self.refresh()
+        self.assertEqual(enrollment.total_lessons, 2)
+        module_progress = ModuleProgress.objects.get(enrollment=self.enrollment, module=self.modules[0])
+        self.assertEqual(module_progress.total_lessons, 2)
+
+    def test_recount_updates_completion_status(self):
+        """Test that a recount completes and reopens enrollments and modules"""
+        for lesson in self.lessons[:3]:
+            self.complete(lesson)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.lessons[3].delete()
+        enrollment = self.refresh()
+        self.assertEqual((enrollment.status, enrollment.progress_percentage), ('completed', 100))
+        self.assertIsNotNone(enrollment.completed_at)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Lesson.objects.create(module=self.modules[0], title='Extra', order=3)
+        enrollment = self.refresh()
+        self.assertEqual((enrollment.status, enrollment.completed_lessons), ('active', 3))
+        self.assertIsNone(enrollment.completed_at)
+        module_progress = ModuleProgress.objects.get(enrollment=self.enrollment, module=self.modules[0])
+        self.assertEqual((module_progress.total_lessons, module_progress.is_completed), (3, False))
+
+    def test_recount_keeps_certified_enrollments_completed(self):
+        """Test that a recount never reopens an enrollment with a certificate"""
+        for lesson in self.lessons:
+            self.complete(lesson)
+        Enrollment.objects.filter(pk=self.enrollment.pk).update(certificate_issued=True)
+        Lesson.objects.create(module=self.modules[0], title='Extra', order=3)
+        counts = recalculate_course_progress(self.course.pk)
+        self.assertEqual(counts, {'enrollments': 1, 'completed': 0, 'reopened': 0})
+        self.assertEqual(self.refresh().status, 'completed')
+
+    def test_recount_is_constant_cost(self):
+        """Test that the recount costs the same for one or many enrollments"""
+        self.complete(self.lessons[0])
+        with CaptureQueriesContext(connection) as single:
+            recalculate_course_progress(self.course.pk)
+        for n in range(5):
+            enrollment = Enrollment.objects.create(
+                student=User.objects.create_user(username=f'other{n}', password='testpass123'),
+                course=self.course,
+            )
+            LessonProgress.objects.create(enrollment=enrollment, lesson=self.lessons[n % 4], is_completed=True)
+        with CaptureQueriesContext(connection) as many:
+            counts = recalculate_course_progress(self.course.pk)
+        self.assertEqual(len(many), len(single))
+        self.assertEqual(counts['enrollments'], 6)
+
+    def test_content_changes_queue_one_recount(self):
+        """Test that many changes in one transaction queue a single recount"""
+        with mock.patch('enrollments.models.recalculate_course_progress') as recount:
+            with self.captureOnCommitCallbacks(execute=True):
+                Lesson.objects.create(module=self.modules[0], title='Extra', order=3)
+                self.lessons[0].delete()
+                self.modules[1].delete()
+        recount.assert_called_once_with(self.course.pk)
+
+    def test_calculate_progress_repairs_drift(self):
+        """Test that the full recount fixes drifted counters"""
+        self.complete(self.lessons[0])
+        Enrollment.objects.filter(pk=self.enrollment.pk).update(completed_lessons=3, total_lessons=9)
+        enrollment = self.refresh()
+        enrollment.calculate_progress()
+        self.assertEqual((enrollment.completed_lessons, enrollment.total_lessons), (1, 4))
+        self.assertEqual(enrollment.progress_percentage, 25)
+
+    def test_mark_lesson_complete_view(self):
+        """Test that the lesson completion view updates the counters"""
+        self.client.login(username='student', password='testpass123')
+        self.client.post(reverse('courses:mark_lesson_complete', kwargs={'pk': self.lessons[0].pk}))
+        self.assertEqual(self.refresh().completed_lessons, 1)
+
+    def test_next_lesson_is_one_query(self):
+        """Test that the next lesson skips completed and unpublished lessons in one query"""
+        self.complete(self.lessons[0])
+        self.lessons[1].is_published = False
+        self.lessons[1].save()
+        with self.assertNumQueries(1):
+            self.assertEqual(self.enrollment.get_next_lesson(), self.lessons[2])
+        for lesson in self.lessons[2:]:
+            self.complete(lesson)
+        self.assertIsNone(self.enrollment.get_next_lesson())
+        # Asking never creates progress rows
+        self.assertEqual(LessonProgress.objects.count(), 3)
+
+    def test_next_lessons_in_bulk(self):
+        """Test that the next lessons of many enrollments cost two queries"""
+        other = Course.objects.create(
+            title='Django', description='Learn Django', short_description='Django',
+            instructor=self.instructor, duration_weeks=4, estimated_hours=20, status='published',
+        )
+        module = Module.objects.create(course=other, title='Intro', order=1)
+        # Ordered by module and lesson order, not creation
+        later = Lesson.objects.create(module=module, title='Later', order=2)
+        first = Lesson.objects.create(module=module, title='First', order=1)
+        Enrollment.objects.create(student=self.student, course=other)
+        self.complete(self.lessons[0])
+
+        with self.assertNumQueries(2):
+            enrollments = attach_next_lessons(Enrollment.objects.filter(student=self.student))
+        next_lessons = {e.course_id: e.next_lesson for e in enrollments}
+        self.assertEqual(next_lessons, {self.course.pk: self.lessons[1], other.pk: first})
+        self.assertNotEqual(next_lessons[other.pk], later)
+
+    def test_continue_links(self):
+        """Test that My courses and the dashboard link to the next lesson"""
+        self.client.login(username='student', password='testpass123')
+        next_url = reverse('courses:lesson_detail', kwargs={'pk': self.lessons[0].pk})
+        for url in (reverse('enrollments:my_courses'), reverse('dashboard:student_dashboard')):
+            self.assertContains(self.client.get(url), next_url)
+
+
+class HeartbeatBufferTestCase(TestCase):
+    """Test cases for the buffered video heartbeats"""
+
+    def setUp(self):
+        """Set up test data"""
+        cache.clear()
+        self.instructor = User.objects.create_user(
+            username='instructor', email='instructor@test.com',
+            password='testpass123', user_type='instructor'
+        )
+        self.student = User.objects.create_user(
+            username='student', email='student@test.com', password='testpass123'
+        )
+        self.course = Course.objects.create(
+            title='Python Basics', description='Learn Python', short_description='Python',
+            instructor=self.instructor, duration_weeks=4, estimated_hours=20, status='published',
+        )
+        module = Module.objects.create(course=self.course, title='Module 1', order=1)
+        self.lessons = [Lesson.objects.create(module=module, title=f'Lesson {n}', order=n) for n in (1, 2)]
+        self.enrollment = Enrollment.objects.create(student=self.student, course=self.course)
+        self.url = reverse('enrollment-heartbeat', kwargs={'pk': self.enrollment.pk})
+
+    def progress(self, lesson):
+        return LessonProgress.objects.get(enrollment=self.enrollment, lesson=lesson)
+
+    def flush(self):
+        # Buffered events are written by the second flush after them
+        return flush_heartbeats() + flush_heartbeats()
+
+    def test_coalesce_and_flush(self):
+        """Test that events keep the furthest position and sum the watched time"""
+        LessonProgress.objects.create(enrollment=self.enrollment, lesson=self.lessons[0], video_progress_seconds=500)
+        record_heartbeats(self.enrollment.pk, [
+            (self.lessons[0].pk, 120, 50), (self.lessons[0].pk, 90, 40),
+            (self.lessons[1].pk, 300, 30), (self.lessons[1].pk, 330, 45),
+        ])
+        self.assertEqual(flush_heartbeats(), 0)
+        self.assertEqual(flush_heartbeats(), 2)
+
+        first, second = self.progress(self.lessons[0]), self.progress(self.lessons[1])
+        # The stored position never moves backwards
+        self.assertEqual((first.video_progress_seconds, first.time_spent_minutes), (500, 1))
+        self.assertEqual((second.video_progress_seconds, second.time_spent_minutes), (330, 1))
+        self.assertEqual(self.flush(), 0)
+
+    def test_sub_minute_remainders_carry_over(self):
+        """Test that leftover seconds count towards the next flush"""
+        LessonProgress.objects.create(enrollment=self.enrollment, lesson=self.lessons[0])
+        for _ in range(3):
+            record_heartbeats(self.enrollment.pk, [(self.lessons[0].pk, None, 40)])
+            self.flush()
+        self.assertEqual(self.progress(self.lessons[0]).time_spent_minutes, 2)
+
+    def test_flush_is_one_update_per_batch(self):
+        """Test that a batch is written with a single UPDATE"""
+        LessonProgress.objects.create(enrollment=self.enrollment, lesson=self.lessons[0])
+        record_heartbeats(self.enrollment.pk, [(l.pk, 60, 60) for l in self.lessons])
+        flush_heartbeats()
+        with CaptureQueriesContext(connection) as queries:
+            flush_heartbeats()
+        updates = [q for q in queries.captured_queries if q['sql'].startswith('UPDATE')]
+        self.assertEqual(len(updates), 1)
+        # The missing row was created by the flush
+        self.assertEqual(self.progress(self.lessons[1]).video_progress_seconds, 60)
+
+    def test_deleted_enrollment_is_dropped(self):
+        """Test that buffered events for a deleted enrollment are discarded"""
+        record_heartbeats(self.enrollment.pk, [(self.lessons[0].pk, 60, 60)])
+        self.enrollment.delete()
+        self.assertEqual(self.flush(), 0)
+        self.assertFalse(LessonProgress.objects.exists())
+
+    def test_api_buffers_without_writing(self):
+        """Test that the endpoint accepts events without touching LessonProgress"""
+        self.client.login(username='student', password='testpass123')
+        events = [{'lesson_id': self.lessons[0].pk, 'position': 42, 'seconds': 15}]
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(self.url, {'events': events}, content_type='application/json')
+        self.assertEqual(response.status_code, 202)
+        self.assertFalse(any('lessonprogress' in q['sql'] for q in queries.captured_queries))
+
+        flush_heartbeats()
+        out = StringIO()
+        call_command('flush_heartbeats', stdout=out)
+        self.assertIn('1 lesson progress', out.getvalue())
+        self.assertEqual(self.progress(self.lessons[0]).video_progress_seconds, 42)
+
+    def test_writer_racing_a_flush_is_kept(self):
+        """Test that events written into a generation just retired are not lost"""
+        LessonProgress.objects.create(enrollment=self.enrollment, lesson=self.lessons[0])
+        record_heartbeats(self.enrollment.pk, [(self.lessons[0].pk, 30, 60)])
+        with mock.patch('enrollments.heartbeats.current_generation', return_value=current_generation()):
+            flush_heartbeats()
+            # A writer that read the generation before the flush switched it
+            record_heartbeats(self.enrollment.pk, [(self.lessons[0].pk, 90, 60), (self.lessons[1].pk, 10, 0)])
+        self.assertEqual(flush_heartbeats(), 2)
+        first = self.progress(self.lessons[0])
+        self.assertEqual((first.video_progress_seconds, first.time_spent_minutes), (90, 2))
+        self.assertEqual(self.progress(self.lessons[1]).video_progress_seconds, 10)
+
+    def test_api_rejects_bad_events(self):
+        """Test that malformed events and foreign lessons are refused"""
+        other = Course.objects.create(
+            title='Other', description='Other', short_description='Other',
+            instructor=self.instructor, duration_weeks=1, estimated_hours=1, status='published',
+        )
+        foreign = Lesson.objects.create(
+            module=Module.objects.create(course=other, title='M', order=1), title='L', order=1
+        )
+        self.client.login(username='student', password='testpass123')
+        for events in ([], [{'position': 1}], [{'lesson_id': foreign.pk, 'seconds': 5}], 'x'):
+            response = self.client.post(self.url, {'events': events}, content_type='application/json')
+            self.assertEqual(response.status_code, 400)
+
+
+class CohortEnrollmentTestCase(TestCase):
+    """Test cases for bulk cohort enrollment"""
+
+    def setUp(self):
+        """Set up test data"""
+        cache.clear()
+        self.instructor = User.objects.create_user(
+            username='instructor', email='instructor@test.com',
+            password='testpass123', user_type='instructor'
+        )
+        self.course = Course.objects.create(
+            title='Python Basics', description='Learn Python', short_description='Python',
+            instructor=self.instructor, duration_weeks=4, estimated_hours=20, status='published',
+        )
+        module = Module.objects.create(course=self.course, title='Module 1', order=1)
+        Lesson.objects.create(module=module, title='Lesson 1', order=1)
+        self.students = [
+            User.objects.create_user(username=f'student{n}', email=f'student{n}@test.com', password='testpass123')
+            for n in range(6)
+        ]
+
+    def stats(self):
+        return CourseStats.objects.get(course=self.course)
+
+    def test_report_rows(self):
+        """Test that every row reports what happened to it"""
+        Enrollment.objects.create(student=self.students[0], course=self.course)
+        rows = enroll_students(self.course, [
+            'student0', 'student1', 'STUDENT2@test.com', 'student1@test.com', 'nobody',
+        ])
+        self.assertEqual([row.status for row in rows], [
+            'already_enrolled', 'enrolled', 'enrolled', 'duplicate', 'not_found',
+        ])
+        self.assertEqual(rows[2].student_id, self.students[2].pk)
+
+        self.assertEqual(self.stats().enrollment_count, 3)
+        enrollment = Enrollment.objects.get(student=self.students[1], course=self.course)
+        self.assertEqual(enrollment.total_lessons, 1)
+        self.assertEqual(
+            ActivityLog.objects.filter(course=self.course, action='course_enrolled').count(), 2
+        )
+
+    def test_max_students(self):
+        """Test that the course cap is respected"""
+        self.course.max_students = 3
+        self.course.save()
+        Enrollment.objects.create(student=self.students[0], course=self.course)
+        rows = enroll_students(self.course, [s.username for s in self.students[1:]], batch_size=2)
+        self.assertEqual(summarize(rows), {'enrolled': 2, 'course_full': 3})
+        self.assertEqual(Enrollment.objects.filter(course=self.course).count(), 3)
+        self.assertEqual(self.stats().enrollment_count, 3)
+
+    def test_queries_do_not_grow_with_cohort(self):
+        """Test that a batch costs the same number of queries for 2 or 6 students"""
+        other = Course.objects.create(
+            title='Django', description='Learn Django', short_description='Django',
+            instructor=self.instructor, duration_weeks=4, estimated_hours=20, status='published',
+        )
+        with CaptureQueriesContext(connection) as small:
+            enroll_students(self.course, ['student0', 'student1'])
+        with CaptureQueriesContext(connection) as large:
+            enroll_students(other, [s.username for s in self.students])
+        self.assertEqual(len(small), len(large))
+
+    def test_api_endpoint(self):
+        """Test that only the instructor can enroll a cohort through the API"""
+        url = reverse('course-enroll-cohort', kwargs={'pk': self.course.pk})
+        self.client.login(username='student0', password='testpass123')
+        response = self.client.post(url, {'students': ['student1']}, content_type='application/json')
+        self.assertEqual(response.status_code, 403)
+
+        self.client.login(username='instructor', password='testpass123')
+        response = self.client.post(url, {'students': ['student1', 'ghost']}, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['summary'], {'enrolled': 1, 'not_found': 1})
+        self.assertEqual(response.json()['results'][1]['identifier'], 'ghost')
+
+    def test_admin_action(self):
+        """Test that the admin action enrolls pasted usernames"""
+        User.objects.create_superuser(username='admin', email='admin@test.com', password='testpass123')
+        self.client.login(username='admin', password='testpass123')
+        url = reverse('admin:courses_course_changelist')
+        response = self.client.post(url, {'action': 'enroll_cohort', '_selected_action': [self.course.pk]})
+        self.assertContains(response, 'Enroll students')
+        self.client.post(url, {
+            'action': 'enroll_cohort', '_selected_action': [self.course.pk],
+            'apply': '1', 'students': 'student1, student2\nstudent3',
+        })
+        self.assertEqual(Enrollment.objects.filter(course=self.course).count(), 3)
+
+    def test_csv_command(self):
+        """Test that the command reads a CSV and writes a report"""
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path, report = os.path.join(directory, 'cohort.csv'), os.path.join(directory, 'report.csv')
+        with open(path, 'w', newline='') as f:
+            csv.writer(f).writerows([['name', 'email'], ['One', 'student1@test.com'], ['X', 'ghost@test.com']])
+
+        out = StringIO()
+        call_command('enroll_cohort', self.course.slug, path, report=report, stdout=out)
+        self.assertIn('1 enrolled', out.getvalue())
+        with open(report, newline='') as f:
+            rows = list(csv.reader(f))
+        self.assertEqual(rows[0], ['identifier', 'status', 'student_id'])
+        self.assertEqual(rows[2][:2], ['ghost@test.com', 'not_found'])
+
+
+class SeatReservationTestCase(TestCase):
+    """Test cases for capped courses and the waitlist"""
+
+    def setUp(self):
+        """Set up test data"""
+        cache.clear()
+        self.instructor = User.objects.create_user(
+            username='instructor', email='instructor@test.com',
+            password='testpass123', user_type='instructor'
+        )
+        self.course = Course.objects.create(
+            title='Python Basics', description='Learn Python', short_description='Python',
+            instructor=self.instructor, duration_weeks=4, estimated_hours=20, status='published',
+            max_students=2,
+        )
+        self.students = [
+            User.objects.create_user(username=f'student{n}', email=f'student{n}@test.com', password='testpass123')
+            for n in range(4)
+        ]
+
+    def seats_taken(self):
+        return CourseStats.objects.get(course=self.course).enrollment_count
+
+    def test_claim_rejects_when_full(self):
+        """Test that the cap holds and a full course is rejected in one UPDATE"""
+        for student in self.students[:2]:
+            enroll_student(student, self.course)
+        self.assertEqual(self.seats_taken(), 2)
+        with CaptureQueriesContext(connection) as queries, self.assertRaises(CourseFull):
+            enroll_student(self.students[2], self.course)
+        # One conditional UPDATE claims the seat; nothing counts enrollments
+        statements = [q['sql'] for q in queries.captured_queries]
+        self.assertEqual(len([sql for sql in statements if sql.startswith('UPDATE')]), 1)
+        self.assertFalse(any('COUNT' in sql or sql.startswith('INSERT') for sql in statements))
+        self.assertEqual(self.seats_taken(), 2)
+        self.assertEqual(Enrollment.objects.filter(course=self.course).count(), 2)
+
+    def test_already_enrolled_gives_seat_back(self):
+        """Test that a duplicate enrollment rolls its claim back"""
+        self.course.max_students = None
+        self.course.save()
+        enroll_student(self.students[0], self.course)
+        with self.assertRaises(AlreadyEnrolled):
+            enroll_student(self.students[0], self.course)
+        self.assertEqual(self.seats_taken(), 1)
+
+    def test_claimed_enrollment_is_tracked_after_save(self):
+        """Test that only the claiming save skips the stats signal"""
+        enrollment = enroll_student(self.students[0], self.course)
+        self.assertEqual(self.seats_taken(), 1)
+        enrollment.is_active = False
+        enrollment.save()
+        self.assertEqual(self.seats_taken(), 0)
+
+    def test_waitlist_promotion_on_unenroll(self):
+        """Test that a freed seat goes to the first student on the waitlist"""
+        first = enroll_student(self.students[0], self.course)
+        enroll_student(self.students[1], self.course)
+        for student in self.students[2:]:
+            add_to_waitlist(student, self.course)
+        self.assertEqual(waitlist_position(self.students[3], self.course), 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            first.delete()
+        self.assertTrue(Enrollment.objects.filter(student=self.students[2], course=self.course).exists())
+        self.assertFalse(Enrollment.objects.filter(student=self.students[3], course=self.course).exists())
+        self.assertEqual(waitlist_position(self.students[3], self.course), 1)
+        self.assertEqual(self.seats_taken(), 2)
+
+    def test_views_and_api(self):
+        """Test that the enroll endpoints refuse a full course and offer the waitlist"""
+        for student in self.students[:2]:
+            enroll_student(student, self.course)
+        self.client.login(username='student2', password='testpass123')
+
+        response = self.client.post(reverse('course-enroll', kwargs={'pk': self.course.pk}))
+        self.assertEqual(response.status_code, 409)
+        response = self.client.get(reverse('courses:enroll_course', kwargs={'pk': self.course.pk}), follow=True)
+        self.assertContains(response, 'Join Waitlist')
+
+        response = self.client.post(reverse('course-waitlist', kwargs={'pk': self.course.pk}))
+        self.assertEqual(response.json(), {'position': 1})
+        self.client.post(reverse('enrollments:leave_waitlist', kwargs={'course_id': self.course.pk}))
+        self.assertFalse(WaitlistEntry.objects.exists())
+
+
+@override_settings(BACKGROUND_TASKS_EAGER=True, CERTIFICATE_RENDER_PROCESSES=0)
+class CertificateTestCase(TestCase):
+    """Test cases for certificate rendering and downloads"""
+
+    def setUp(self):
+        """Set up test data"""
+        cache.clear()
+        use_temporary_media_root(self)
+        self.instructor = User.objects.create_user(
+            username='instructor', email='instructor@test.com', password='testpass123',
+            user_type='instructor', first_name='Grace', last_name='Hopper',
+        )
+        self.course = Course.objects.create(
+            title='Python Basics', description='Learn Python', short_description='Python',
+            instructor=self.instructor, duration_weeks=4, estimated_hours=20, status='published',
+        )
+        self.students = [
+            User.objects.create_user(username=f'student{n}', email=f'student{n}@test.com', password='testpass123')
+            for n in range(3)
+        ]
+        self.enrollments = [Enrollment.objects.create(student=s, course=self.course) for s in self.students]
+        for enrollment in self.enrollments[:2]:
+            enrollment.mark_as_completed()
+
+    def test_issue_renders_and_dedupes(self):
+        """Test that completed enrollments get one stored PDF each"""
+        counts = issue_certificates([e.pk for e in self.enrollments], workers=0)
+        self.assertEqual((counts['rendered'], counts['not_completed']), (2, 1))
+
+        certificate = Certificate.objects.get(enrollment=self.enrollments[0])
+        self.assertEqual(certificate.instructor_name, 'Grace Hopper')
+        with certificate.pdf_file.open('rb') as f:
+            self.assertEqual(f.read(5), b'%PDF-')
+        self.enrollments[0].refresh_from_db()
+        self.assertTrue(self.enrollments[0].certificate_issued)
+
+        counts = issue_certificates(workers=0)
+        self.assertEqual((counts['rendered'], counts['skipped']), (0, 2))
+        self.assertEqual(Certificate.objects.count(), 2)
+
+    def test_process_pool(self):
+        """Test that rendering in worker processes stores the same result"""
+        out = StringIO()
+        call_command('issue_certificates', workers=1, stdout=out)
+        self.assertIn('Rendered 2 certificate(s)', out.getvalue())
+        self.assertEqual(Certificate.objects.exclude(pdf_file='').count(), 2)
+
+    def test_certificate_page_and_download(self):
+        """Test that the page schedules rendering and the file is served cacheably"""
+        self.client.login(username='student0', password='testpass123')
+        with mock.patch('enrollments.certificates.ProcessPoolExecutor') as pool:
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.get(
+                    reverse('enrollments:certificate', kwargs={'enrollment_id': self.enrollments[0].pk})
+                )
+        self.assertContains(response, 'being prepared')
+        # One certificate renders in the background thread, without a process pool
+        pool.assert_not_called()
+
+        certificate = Certificate.objects.get(enrollment=self.enrollments[0])
+        response = self.client.get(reverse('enrollments:certificate', kwargs={'enrollment_id': self.enrollments[0].pk}))
+        self.assertContains(response, certificate.get_download_url())
+
+        response = self.client.get(certificate.get_download_url())
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertIn('immutable', response['Cache-Control'])
+
+        self.client.login(username='student1', password='testpass123')
+        self.assertEqual(self.client.get(certificate.get_download_url()).status_code, 404)
+
+
+class CertificateVerificationTestCase(TestCase):
+    """Test cases for the public verification endpoint"""
+
+    def setUp(self):
+        """Set up test data"""
+        cache.clear()
+        instructor = User.objects.create_user(
+            username='instructor', email='instructor@test.com', password='testpass123', user_type='instructor'
+        )
+        student = User.objects.create_user(username='student', email='student@test.com', password='testpass123')
+        course = Course.objects.create(
+            title='Python Basics', description='Learn Python', short_description='Python',
+            instructor=instructor, duration_weeks=4, estimated_hours=20, status='published',
+        )
+        self.certificate = Certificate.objects.create(
+            enrollment=Enrollment.objects.create(student=student, course=course),
+            student_name='Ada Lovelace', course_title='Python Basics', instructor_name='instructor',
+            completion_date=timezone.now().date(),
+        )
+        self.url = reverse('verify_certificate', kwargs={'certificate_id': self.certificate.certificate_id})
+
+    def test_json_payload_is_cached(self):
+        """Test that repeat lookups are served from the cache with validators"""
+        response = self.client.get(self.url, {'format': 'json'})
+        self.assertEqual(response.json()['student_name'], 'Ada Lovelace')
+        self.assertTrue(response.json()['valid'])
+        self.assertIn('public', response['Cache-Control'])
+
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url, {'format': 'json'}, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_unknown_ids_are_cached(self):
+        """Test that misses are cached too"""
+        url = reverse('verify_certificate', kwargs={'certificate_id': 'CERT-NOPE'})
+        self.assertContains(self.client.get(url), 'No certificate', status_code=404)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(url, HTTP_ACCEPT='application/json').status_code, 404)
+
+    def test_revocation_invalidates(self):
+        """Test that changing is_valid is visible on the next lookup"""
+        self.assertContains(self.client.get(self.url), 'is valid')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.certificate.is_valid = False
+            self.certificate.save()
+        self.assertContains(self.client.get(self.url), 'revoked')
+
+    def test_rate_limit(self):
+        """Test that one client is throttled per window"""
+        with mock.patch.object(verification, 'VERIFY_RATE_LIMIT', 2):
+            statuses = [self.client.get(self.url).status_code for _ in range(3)]
+        self.assertEqual(statuses, [200, 200, 429])
+
+
+class ModuleProgressRollupTestCase(TestCase):
+    """Test cases for the grouped module progress rollup"""
+
+    def setUp(self):
+        """Set up test data"""
+        cache.clear()
+        self.instructor = User.objects.create_user(
+            username='instructor', email='instructor@test.com',
+            password='testpass123', user_type='instructor'
+        )
+        self.course = Course.objects.create(
+            title='Python Basics', description='Learn Python', short_description='Python',
+            instructor=self.instructor, duration_weeks=4, estimated_hours=20, status='published',
+        )
+        self.modules = [Module.objects.create(course=self.course, title=f'Module {n}', order=n) for n in (1, 2)]
+        self.lessons = [
+            Lesson.objects.create(module=module, title=f'Lesson {n}', order=n)
+            for module in self.modules for n in (1, 2)
+        ]
+        self.enrollments = [
+            Enrollment.objects.create(
+                student=User.objects.create_user(username=f'student{n}', password='testpass123'),
+                course=self.course,
+            )
+            for n in range(3)
+        ]
+
+    def complete(self, enrollment, lessons):
+        # bulk_create skips the signals, leaving ModuleProgress out of date
+        LessonProgress.objects.bulk_create([
+            LessonProgress(enrollment=enrollment, lesson=lesson, is_completed=True, completed_at=timezone.now())
+            for lesson in lessons
+        ])
+
+    def test_rollup_creates_and_updates_rows(self):
+        """Test that every touched module gets its counts in one pass"""
+        first, second, third = self.enrollments
+        self.complete(first, self.lessons[:3])
+        self.complete(second, self.lessons[2:3])
+        ModuleProgress.objects.create(enrollment=third, module=self.modules[0], completed_lessons=2)
+
+        self.assertEqual(rollup_module_progress(Enrollment.objects.filter(course=self.course)), 4)
+        progress = {
+            (row.enrollment_id, row.module_id): row
+            for row in ModuleProgress.objects.all()
+        }
+        done = progress[first.pk, self.modules[0].pk]
+        self.assertEqual((done.completed_lessons, done.total_lessons, done.progress_percentage), (2, 2, 100))
+        self.assertTrue(done.is_completed)
+        self.assertIsNotNone(done.completed_at)
+        self.assertEqual(progress[first.pk, self.modules[1].pk].progress_percentage, 50)
+        self.assertEqual(progress[second.pk, self.modules[1].pk].completed_lessons, 1)
+        # A stale row with no completions is reset rather than skipped
+        stale = progress[third.pk, self.modules[0].pk]
+        self.assertEqual((stale.completed_lessons, stale.progress_percentage), (0, 0))
+        self.assertNotIn((second.pk, self.modules[0].pk), progress)
+
+    def test_query_count_does_not_grow(self):
+        """Test that the rollup costs the same number of queries for more data"""
+        for enrollment in self.enrollments:
+            self.complete(enrollment, self.lessons)
+        enrollments = Enrollment.objects.filter(course=self.course)
+        with CaptureQueriesContext(connection) as small:
+            rollup_module_progress(enrollments.filter(pk=self.enrollments[0].pk))
+        with CaptureQueriesContext(connection) as large:
+            rollup_module_progress(enrollments)
+        self.assertEqual(len(large), len(small))
+        # Missing pairs, their INSERT and the recount UPDATE
+        self.assertEqual(len(large), 3)
+        self.assertEqual(ModuleProgress.objects.filter(is_completed=True).count(), 6)
+
+    def test_completed_module_stays_completed(self):
+        """Test that a module completed earlier is not un-completed"""
+        enrollment = self.enrollments[0]
+        self.complete(enrollment, self.lessons[:2])
+        rollup_module_progress(Enrollment.objects.filter(pk=enrollment.pk))
+        Lesson.objects.create(module=self.modules[0], title='Lesson 3', order=3)
+
+        rollup_module_progress(Enrollment.objects.filter(pk=enrollment.pk))
+        progress = ModuleProgress.objects.get(enrollment=enrollment, module=self.modules[0])
+        self.assertEqual((progress.completed_lessons, progress.total_lessons), (2, 3))
+        self.assertTrue(progress.is_completed)
+        # Rounded as ModuleProgress.calculate_progress() rounds it
+        self.assertEqual(progress.progress_percentage, Decimal('66.67'))
+
+    def test_management_command(self):
+        """Test the rollup_module_progress command"""
+        self.complete(self.enrollments[0], self.lessons[:1])
+        out = StringIO()
+        call_command('rollup_module_progress', '--course', str(self.course.pk), stdout=out)
+        self.assertIn('Recomputed 1 module progress row(s)', out.getvalue())
+        self.assertEqual(ModuleProgress.objects.get().completed_lessons, 1)
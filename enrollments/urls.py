@@ -6,7 +6,10 @@ app_name = 'enrollments'
 urlpatterns = [
     path('enroll/<int:course_id>/', views.enroll_in_course, name='enroll'),
     path('unenroll/<int:course_id>/', views.unenroll_from_course, name='unenroll'),
+    path('waitlist/<int:course_id>/join/', views.join_waitlist, name='join_waitlist'),
+    path('waitlist/<int:course_id>/leave/', views.leave_waitlist, name='leave_waitlist'),
     path('my-courses/', views.my_courses, name='my_courses'),
     path('progress/<int:enrollment_id>/', views.enrollment_progress, name='progress'),
     path('certificate/<int:enrollment_id>/', views.generate_certificate, name='certificate'),
+    path('certificates/<str:certificate_id>/download/', views.download_certificate, name='download_certificate'),
 ]
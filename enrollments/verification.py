@@ -0,0 +1,69 @@
+"""
+Public certificate verification.
+
+Employers and crawlers look certificates up by certificate_id, so the
+lookup is built to never reach the database twice for the same id: the
+compact payload is cached, unknown ids are cached as misses for a shorter
+time, and the Certificate signals in enrollments.models drop the entry
+when a certificate is saved (e.g. revoked through is_valid) or deleted.
+Responses carry an ETag and a public Cache-Control so a CDN can answer
+repeat requests on its own.
+"""
+import hashlib
+import json
+
+from django.core.cache import cache
+
+from .models import Certificate
+
+VERIFY_TIMEOUT = 60 * 60 * 24
+NOT_FOUND_TIMEOUT = 60 * 10
+# Shared caches keep answers briefly, so a revocation shows within minutes
+VERIFY_CACHE_CONTROL = 'public, max-age=300'
+NOT_FOUND_CACHE_CONTROL = 'public, max-age=60'
+
+# Per client IP
+VERIFY_RATE_LIMIT = 30
+VERIFY_RATE_WINDOW = 60
+
+# Cached for unknown ids, since None means "not cached"
+_NOT_FOUND = 'not-found'
+
+
+def _cache_key(certificate_id):
+    return f'certificate_verify:{certificate_id}'
+
+
+def _payload(certificate):
+    return {
+        'certificate_id': certificate.certificate_id,
+        'valid': certificate.is_valid,
+        'student_name': certificate.student_name,
+        'course_title': certificate.course_title,
+        'instructor_name': certificate.instructor_name,
+        'completion_date': certificate.completion_date.isoformat(),
+        'issued_at': certificate.issued_at.date().isoformat(),
+    }
+
+
+def get_verification(certificate_id):
+    """The verification payload for an id, or None if there is no such certificate"""
+    key = _cache_key(certificate_id)
+    payload = cache.get(key)
+    if payload is None:
+        certificate = Certificate.objects.filter(certificate_id=certificate_id).first()
+        if certificate is None:
+            cache.set(key, _NOT_FOUND, NOT_FOUND_TIMEOUT)
+            return None
+        payload = _payload(certificate)
+        cache.set(key, payload, VERIFY_TIMEOUT)
+    return None if payload == _NOT_FOUND else payload
+
+
+def payload_etag(payload):
+    body = json.dumps(payload, sort_keys=True).encode()
+    return f'"{hashlib.md5(body).hexdigest()}"'
+
+
+def invalidate_verification(certificate_id):
+    cache.delete(_cache_key(certificate_id))
@@ -1,29 +1,58 @@
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.http import JsonResponse
+from django.http import Http404, HttpResponse, JsonResponse
+from django.template.loader import render_to_string
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.views.decorators.http import require_POST, require_safe
+from courses.media import IMMUTABLE_CACHE_CONTROL, serve_file
 from courses.models import Course
-from .models import Enrollment, LessonProgress
+from lms_project.ratelimit import is_rate_limited, retry_after
+from . import verification
+from .certificates import schedule_certificate
+from .models import Certificate, Enrollment, LessonProgress, WaitlistEntry, attach_next_lessons
+from .seats import AlreadyEnrolled, CourseFull, add_to_waitlist, enroll_student, waitlist_position
 
 @login_required
 def enroll_in_course(request, course_id):
     """Enroll user in a course"""
     course = get_object_or_404(Course, id=course_id, status='published')
     
-    # Check if already enrolled
-    if Enrollment.objects.filter(student=request.user, course=course).exists():
+    try:
+        enroll_student(request.user, course)
+    except AlreadyEnrolled:
         messages.warning(request, 'You are already enrolled in this course.')
-        return redirect('courses:course_detail', slug=course.slug)
-    
-    # Create enrollment
-    enrollment = Enrollment.objects.create(
-        student=request.user,
-        course=course,
-        status='active'
-    )
+    except CourseFull:
+        messages.error(request, 'This course is full. You can join the waitlist instead.')
+    else:
+        messages.success(request, f'Successfully enrolled in {course.title}!')
+    return redirect('courses:course_detail', pk=course.pk)
+
+@login_required
+@require_POST
+def join_waitlist(request, course_id):
+    """Queue for a seat in a full course"""
+    course = get_object_or_404(Course, id=course_id, status='published')
     
-    messages.success(request, f'Successfully enrolled in {course.title}!')
-    return redirect('courses:course_detail', slug=course.slug)
+    # A seat may have freed up since the page was rendered
+    try:
+        enroll_student(request.user, course)
+        messages.success(request, f'A seat was free - you are now enrolled in {course.title}!')
+    except AlreadyEnrolled:
+        messages.warning(request, 'You are already enrolled in this course.')
+    except CourseFull:
+        add_to_waitlist(request.user, course)
+        position = waitlist_position(request.user, course)
+        messages.success(request, f'You are #{position} on the waitlist. You will be enrolled when a seat frees up.')
+    return redirect('courses:course_detail', pk=course.pk)
+
+@login_required
+@require_POST
+def leave_waitlist(request, course_id):
+    """Give up a place on a course's waitlist"""
+    WaitlistEntry.objects.filter(student=request.user, course_id=course_id).delete()
+    messages.success(request, 'You have left the waitlist.')
+    return redirect('courses:course_detail', pk=course_id)
 
 @login_required
 def unenroll_from_course(request, course_id):
@@ -38,7 +67,9 @@ def unenroll_from_course(request, course_id):
 @login_required
 def my_courses(request):
     """Display user's enrolled courses"""
-    enrollments = Enrollment.objects.filter(student=request.user).select_related('course')
+    enrollments = attach_next_lessons(
+        Enrollment.objects.filter(student=request.user).select_related('course', 'course__instructor')
+    )
     return render(request, 'enrollments/my_courses.html', {
         'enrollments': enrollments
     })
@@ -63,12 +94,61 @@ def generate_certificate(request, enrollment_id):
         messages.error(request, 'Course must be 100% complete to generate certificate.')
         return redirect('enrollments:progress', enrollment_id=enrollment_id)
     
-    # In a real implementation, you would generate a PDF certificate here
-    messages.success(request, 'Certificate generated successfully!')
+    # The PDF is rendered by a worker; this page polls until it is stored
+    certificate = Certificate.objects.filter(enrollment=enrollment).first()
+    if certificate is None or not certificate.pdf_file:
+        schedule_certificate(enrollment.pk)
     return render(request, 'enrollments/certificate.html', {
-        'enrollment': enrollment
+        'enrollment': enrollment,
+        'certificate': certificate,
     })
 
+@require_safe
+@login_required
+def download_certificate(request, certificate_id):
+    """Serve a stored certificate PDF"""
+    certificate = get_object_or_404(
+        Certificate.objects.select_related('enrollment'), certificate_id=certificate_id, is_valid=True
+    )
+    if certificate.enrollment.student_id != request.user.pk and not request.user.is_staff:
+        raise Http404
+    if not certificate.pdf_file:
+        raise Http404
+    # A re-render stores a new file name, which changes the ?v= of the URL
+    return serve_file(request, certificate.pdf_file, cache_control=IMMUTABLE_CACHE_CONTROL)
+
+@require_safe
+def verify_certificate(request, certificate_id):
+    """Public certificate lookup by id, as HTML or JSON (?format=json)"""
+    wants_json = request.GET.get('format') == 'json' or (
+        request.accepts('application/json') and not request.accepts('text/html')
+    )
+    
+    if is_rate_limited(request, 'certificate_verify', verification.VERIFY_RATE_LIMIT, verification.VERIFY_RATE_WINDOW):
+        response = JsonResponse({'error': 'Too many requests'}, status=429)
+        response['Retry-After'] = retry_after(verification.VERIFY_RATE_WINDOW)
+        return response
+    
+    payload = verification.get_verification(certificate_id)
+    etag = verification.payload_etag({'payload': payload, 'id': certificate_id, 'json': wants_json})
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        status = 200 if payload else 404
+        if wants_json:
+            response = JsonResponse(payload or {'certificate_id': certificate_id, 'valid': False}, status=status)
+        else:
+            # Rendered without the request: the page must not vary per visitor
+            response = HttpResponse(render_to_string('enrollments/verify_certificate.html', {
+                'certificate_id': certificate_id,
+                'certificate': payload,
+            }), status=status)
+    response['ETag'] = etag
+    response['Cache-Control'] = (
+        verification.VERIFY_CACHE_CONTROL if payload else verification.NOT_FOUND_CACHE_CONTROL
+    )
+    patch_vary_headers(response, ['Accept'])
+    return response
+
 def enrollment_list(request):
     """Placeholder view for enrollments"""
     return render(request, 'enrollments/enrollment_list.html')
@@ -0,0 +1,38 @@
+"""
+Version tokens for cache namespaces.
+
+Cached data is stored under a key that embeds the current version of its
+namespace (e.g. one course). Invalidation replaces the token instead of
+deleting keys, so stale entries are simply never read again and expire on
+their own timeout.
+"""
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+
+
+def _version_key(namespace):
+    return f'version:{namespace}'
+
+
+def _new_version(namespace):
+    version = time.time_ns()
+    cache.set(_version_key(namespace), version, None)
+    return version
+
+
+def get_version(namespace):
+    """Current version token of a namespace, creating one if needed"""
+    return cache.get(_version_key(namespace)) or _new_version(namespace)
+
+
+def bump_version(namespace):
+    """
+    Retire everything cached under a namespace.
+
+    The version is replaced immediately and again on commit, so an entry
+    rebuilt by another request from pre-commit data is never served.
+    """
+    _new_version(namespace)
+    transaction.on_commit(lambda: _new_version(namespace))
@@ -0,0 +1,216 @@
+"""
+Responsive image derivatives for uploaded media.
+
+When an ImageField changes, the source is read through the storage API (so
+it works with S3 as well as the local filesystem) and resized into a set of
+named variants, each written as WebP and JPEG. This happens in the background
+after the transaction commits; the result is recorded in a JSONField next to
+the image:
+
+    {
+        'source': 'course_covers/intro.png',
+        'sizes': {
+            'card': {'width': 600, 'height': 338,
+                     'webp': {'name': ..., 'url': ...},
+                     'jpeg': {'name': ..., 'url': ...}},
+            ...
+        },
+    }
+
+Templates use the record (via the responsive_image tag) to emit srcset, and
+fall back to the original file until the variants exist.
+"""
+import logging
+import posixpath
+from io import BytesIO
+
+from django.apps import apps
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps
+
+from .tasks import run_in_background
+
+logger = logging.getLogger(__name__)
+
+# name -> (width, height)
+COVER_VARIANTS = {
+    'thumbnail': (320, 180),
+    'card': (600, 338),
+    'hero': (1280, 720),
+}
+AVATAR_VARIANTS = {
+    'small': (64, 64),
+    'medium': (150, 150),
+    'large': (300, 300),
+}
+
+FORMATS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+
+
+def variant_name(source_name, variant, extension):
+    """Storage name of one derivative, e.g. avatars/variants/me_small.webp"""
+    directory, filename = posixpath.split(source_name)
+    stem = posixpath.splitext(filename)[0]
+    return posixpath.join(directory, 'variants', f'{stem}_{variant}.{extension}')
+
+
+def _variant_names(source_name, specs):
+    return [
+        variant_name(source_name, variant, extension)
+        for variant in specs for extension in FORMATS
+    ]
+
+
+def _target_size(source_size, size):
+    """Requested size scaled down (never up) to fit inside the source"""
+    width, height = size
+    scale = min(1.0, source_size[0] / width, source_size[1] / height)
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+
+def _encode(image, extension):
+    format_name, options = FORMATS[extension]
+    if format_name == 'JPEG' and image.mode != 'RGB':
+        # JPEG has no alpha channel; flatten transparent images onto white
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        rgba = image.convert('RGBA')
+        background.paste(rgba, mask=rgba.getchannel('A'))
+        image = background
+    buffer = BytesIO()
+    image.save(buffer, format_name, **options)
+    return buffer.getvalue()
+
+
+def render_variants(source, source_name, specs, storage):
+    """Write every variant of an open image file and return the 'sizes' record"""
+    with Image.open(source) as original:
+        image = ImageOps.exif_transpose(original)
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA' if 'transparency' in image.info else 'RGB')
+
+        sizes = {}
+        for variant, size in specs.items():
+            resized = ImageOps.fit(image, _target_size(image.size, size), Image.LANCZOS)
+            entry = {'width': resized.width, 'height': resized.height}
+            for extension in FORMATS:
+                name = variant_name(source_name, variant, extension)
+                # Names are derived from the (unique) source name, so
+                # regenerating overwrites instead of piling up copies
+                storage.delete(name)
+                name = storage.save(name, ContentFile(_encode(resized, extension)))
+                entry[extension] = {'name': name, 'url': storage.url(name)}
+            sizes[variant] = entry
+    return sizes
+
+
+def delete_variant_files(storage, names):
+    for name in names:
+        try:
+            storage.delete(name)
+        except Exception:
+            logger.warning('Could not delete image variant %s', name, exc_info=True)
+
+
+def _recorded_names(record):
+    return [
+        entry[extension]['name']
+        for entry in (record or {}).get('sizes', {}).values()
+        for extension in FORMATS if extension in entry
+    ]
+
+
+def generate_image_variants(model_label, pk, field_name, variants_field, specs, stale_names=()):
+    """
+    Build the variants for one row and record them.
+
+    The record is only written if the row still points at the same source
+    file, so a slow job can never overwrite the result of a newer upload.
+    """
+    model = apps.get_model(model_label)
+    field = model._meta.get_field(field_name)
+    storage = field.storage
+    source_name = model._default_manager.filter(pk=pk).values_list(field_name, flat=True).first()
+    if not source_name:
+        delete_variant_files(storage, stale_names)
+        return None
+
+    with storage.open(source_name, 'rb') as source:
+        sizes = render_variants(source, source_name, specs, storage)
+
+    record = {'source': source_name, 'sizes': sizes}
+    updated = model._default_manager.filter(pk=pk, **{field_name: source_name}).update(
+        **{variants_field: record}
+    )
+    new_names = set(_recorded_names(record))
+    if not updated:
+        # The image was replaced or removed while we were working
+        delete_variant_files(storage, new_names)
+        return None
+    delete_variant_files(storage, [name for name in stale_names if name not in new_names])
+    return record
+
+
+def _source_in_use(model, field_name, source_name, exclude_pk=None):
+    # Rows may share a source file (e.g. course clones), and with it the
+    # variants, which are named after the source
+    if not source_name:
+        return False
+    rows = model._default_manager.filter(**{field_name: source_name})
+    if exclude_pk is not None:
+        rows = rows.exclude(pk=exclude_pk)
+    return rows.exists()
+
+
+def schedule_image_variants(instance, field_name, variants_field, specs):
+    """
+    Queue variant generation if the image differs from the recorded source.
+
+    Call after the instance has been saved. Saves that leave the image alone
+    cost nothing beyond a string comparison.
+    """
+    file = getattr(instance, field_name)
+    record = getattr(instance, variants_field) or {}
+    source_name = file.name or ''
+    if source_name == record.get('source', ''):
+        return
+
+    model = type(instance)
+    stale_names = _recorded_names(record)
+    if _source_in_use(model, field_name, record.get('source'), exclude_pk=instance.pk):
+        stale_names = []
+    if not source_name:
+        # Image cleared: drop the record now, the files after commit
+        model._default_manager.filter(pk=instance.pk).update(**{variants_field: {}})
+        setattr(instance, variants_field, {})
+        run_in_background(delete_variant_files, file.storage, stale_names)
+        return
+
+    run_in_background(
+        generate_image_variants,
+        model._meta.label, instance.pk, field_name, variants_field, specs, stale_names,
+    )
+
+
+def schedule_variant_cleanup(instance, field_name, variants_field):
+    """Remove the variant files of a deleted row once the delete commits"""
+    record = getattr(instance, variants_field)
+    names = _recorded_names(record)
+    if names and not _source_in_use(type(instance), field_name, (record or {}).get('source')):
+        storage = getattr(instance, field_name).storage
+        run_in_background(delete_variant_files, storage, names)
+
+
+def variant_urls(file, record, extension):
+    """(url, width) pairs for one format, smallest first; empty if stale"""
+    if not file or not record or record.get('source') != file.name:
+        return []
+    entries = sorted(record.get('sizes', {}).values(), key=lambda entry: entry['width'])
+    return [(entry[extension]['url'], entry['width']) for entry in entries if extension in entry]
+
+
+def srcset(file, record, extension='jpeg'):
+    """A srcset attribute value such as 'a.jpg 320w, b.jpg 600w'"""
+    return ', '.join(f'{url} {width}w' for url, width in variant_urls(file, record, extension))
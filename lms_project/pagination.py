@@ -0,0 +1,209 @@
+"""
+Keyset (cursor) pagination shared by the HTML views and the API.
+
+Instead of COUNT(*) plus OFFSET, each page is fetched with a WHERE clause
+that continues after the last row of the previous page, so deep pages cost
+the same as the first one. Cursors are signed so clients cannot forge
+arbitrary positions, and they are tied to the ordering they were issued for.
+"""
+import copy
+
+from django.core import signing
+from django.core.exceptions import ObjectDoesNotExist
+from django.db.models import Q
+from django.http import Http404
+
+PAGE_NUMBER_PARAM = 'page'
+CURSOR_PARAM = 'cursor'
+
+
+class InvalidCursor(Exception):
+    """Raised when a cursor is malformed, tampered with or stale"""
+
+
+def _resolve_field(queryset, path):
+    """Return the model field at the end of a 'relation__field' path, or the field of an annotation"""
+    annotation = queryset.query.annotations.get(path)
+    if annotation is not None:
+        field = copy.copy(annotation.output_field)
+        field.set_attributes_from_name(path)
+        return field
+    model = queryset.model
+    field = None
+    for name in path.split('__'):
+        field = model._meta.get_field(name)
+        if field.is_relation:
+            model = field.related_model
+    return field
+
+
+class KeysetPage:
+    """One page of keyset results; quacks enough like Page for templates"""
+
+    def __init__(self, object_list, paginator, has_next, has_previous, next_cursor, previous_cursor):
+        self.object_list = object_list
+        self.paginator = paginator
+        self._has_next = has_next
+        self._has_previous = has_previous
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+        self.number = None
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_other_pages(self):
+        return self._has_next or self._has_previous
+
+
+class KeysetPaginator:
+    """
+    Paginate a queryset on a unique, non-null ordering such as ('-created_at', '-id').
+
+    The last ordering field must be unique (normally the primary key) so that
+    every row has exactly one position. Ordering names may be fields, related
+    fields or annotations of the queryset; wrap nullable keys in Coalesce.
+    """
+    is_keyset = True
+
+    def __init__(self, queryset, per_page, ordering=('-created_at', '-id'), salt='keyset'):
+        self.queryset = queryset
+        self.per_page = int(per_page)
+        self.ordering = tuple(ordering)
+        self.salt = f'lms.pagination.{salt}'
+        self.fields = [
+            (name.lstrip('-'), name.startswith('-')) for name in self.ordering
+        ]
+        self._model_fields = [_resolve_field(queryset, name) for name, _ in self.fields]
+
+    # Cursor encoding
+
+    def encode_cursor(self, obj, direction):
+        values = []
+        for (name, _), field in zip(self.fields, self._model_fields):
+            value = obj
+            for part in name.split('__'):
+                try:
+                    value = getattr(value, part)
+                except ObjectDoesNotExist:
+                    # A missing one-to-one row, e.g. a course without stats
+                    value = None
+                if value is None:
+                    break
+            values.append(None if value is None else field.value_to_string(_Holder(field, value)))
+        return signing.dumps({'o': self.ordering, 'd': direction, 'v': values}, salt=self.salt, compress=True)
+
+    def decode_cursor(self, cursor):
+        try:
+            payload = signing.loads(cursor, salt=self.salt)
+        except signing.BadSignature:
+            raise InvalidCursor('Invalid cursor')
+        if tuple(payload.get('o', ())) != self.ordering or payload.get('d') not in ('n', 'p'):
+            raise InvalidCursor('Cursor does not match this listing')
+        try:
+            values = [
+                field.to_python(value)
+                for field, value in zip(self._model_fields, payload['v'])
+            ]
+        except Exception:
+            raise InvalidCursor('Invalid cursor')
+        if len(values) != len(self.fields):
+            raise InvalidCursor('Invalid cursor')
+        return payload['d'], values
+
+    # Query building
+
+    def _after(self, values, reverse=False):
+        """Q matching rows strictly after (or before, if reverse) the given position"""
+        # (a < x) OR (a = x AND b < y) OR ... for a lexicographic comparison
+        condition = None
+        equal = Q()
+        for (name, descending), value in zip(self.fields, values):
+            lookup = 'lt' if descending != reverse else 'gt'
+            clause = equal & Q(**{f'{name}__{lookup}': value})
+            condition = clause if condition is None else condition | clause
+            equal &= Q(**{name: value})
+        return condition
+
+    def _order_by(self, reverse=False):
+        if not reverse:
+            return self.ordering
+        return tuple(
+            name if descending else f'-{name}' for name, descending in self.fields
+        )
+
+    def page(self, cursor=None):
+        direction, values = ('n', None)
+        if cursor:
+            direction, values = self.decode_cursor(cursor)
+        backwards = direction == 'p'
+
+        queryset = self.queryset.order_by(*self._order_by(reverse=backwards))
+        if values is not None:
+            queryset = queryset.filter(self._after(values, reverse=backwards))
+
+        # One extra row tells us whether another page exists in this direction
+        rows = list(queryset[:self.per_page + 1])
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if backwards:
+            rows.reverse()
+
+        has_next = has_more if not backwards else True
+        has_previous = values is not None if not backwards else has_more
+        return KeysetPage(
+            rows, self,
+            has_next=has_next and bool(rows),
+            has_previous=has_previous and bool(rows),
+            next_cursor=self.encode_cursor(rows[-1], 'n') if rows else None,
+            previous_cursor=self.encode_cursor(rows[0], 'p') if rows else None,
+        )
+
+
+class KeysetPaginationMixin:
+    """
+    ListView mixin serving cursor pages by default.
+
+    Requests carrying ?page= keep the classic page-number behaviour so old
+    links keep working, as does any listing for which
+    use_keyset_pagination() returns False (e.g. relevance-ordered search).
+    """
+    keyset_ordering = ('-created_at', '-id')
+    keyset_salt = None
+
+    def use_keyset_pagination(self, queryset):
+        return PAGE_NUMBER_PARAM not in self.request.GET
+
+    def get_keyset_ordering(self):
+        return self.keyset_ordering
+
+    def paginate_queryset(self, queryset, page_size):
+        if not self.use_keyset_pagination(queryset):
+            return super().paginate_queryset(queryset, page_size)
+
+        paginator = KeysetPaginator(
+            queryset, page_size, self.get_keyset_ordering(),
+            salt=self.keyset_salt or self.__class__.__name__,
+        )
+        try:
+            page = paginator.page(self.request.GET.get(CURSOR_PARAM))
+        except InvalidCursor as e:
+            raise Http404(str(e))
+        return (paginator, page, page.object_list, page.has_other_pages())
+
+
+class _Holder:
+    """Minimal object so Field.value_to_string() can serialise a bare value"""
+
+    def __init__(self, field, value):
+        self.__dict__[field.attname] = value
+
@@ -0,0 +1,36 @@
+"""
+Fixed-window rate limiting on the cache.
+
+Each client gets one counter per window, created with add() and bumped
+with incr(), so checking a request is a couple of cache round trips and
+no database access. Clients are keyed by REMOTE_ADDR; behind a proxy,
+make sure it carries the real client address.
+"""
+import time
+
+from django.core.cache import cache
+
+
+def client_ip(request):
+    return request.META.get('REMOTE_ADDR', '')
+
+
+def is_rate_limited(request, scope, limit, window=60):
+    """
+    Count this request and report whether the client exceeded `limit`
+    requests in the current `window` seconds of `scope`.
+    """
+    bucket = int(time.time() // window)
+    key = f'ratelimit:{scope}:{client_ip(request)}:{bucket}'
+    cache.add(key, 0, window + 1)
+    try:
+        count = cache.incr(key)
+    except ValueError:
+        # Evicted between add() and incr(); let the request through
+        return False
+    return count > limit
+
+
+def retry_after(window=60):
+    """Seconds until the current window ends"""
+    return int(window - time.time() % window) + 1
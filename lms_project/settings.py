@@ -145,6 +145,11 @@ STATICFILES_DIRS = [
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Lesson videos, PDFs and resources are authorised by Django and, when
+# enabled, handed to nginx's internal location (see nginx.conf)
+MEDIA_ACCEL_REDIRECT = config('MEDIA_ACCEL_REDIRECT', default=False, cast=bool)
+MEDIA_ACCEL_PREFIX = '/protected-media/'
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
 
@@ -234,6 +239,15 @@ CORS_ALLOWED_ORIGINS = [
     "http://127.0.0.1:3000",
 ]
 
+# Background tasks (see lms_project/tasks.py)
+BACKGROUND_TASK_WORKERS = config('BACKGROUND_TASK_WORKERS', default=2, cast=int)
+BACKGROUND_TASKS_EAGER = config('BACKGROUND_TASKS_EAGER', default=False, cast=bool)
+
+# Certificate PDFs (see enrollments/certificates.py)
+CERTIFICATE_RENDER_PROCESSES = config('CERTIFICATE_RENDER_PROCESSES', default=2, cast=int)
+# Optional background image for the certificate page (A4 landscape)
+CERTIFICATE_TEMPLATE = config('CERTIFICATE_TEMPLATE', default='') or None
+
 # Caching Configuration
 USE_REDIS = config('USE_REDIS', default=False, cast=bool)
 
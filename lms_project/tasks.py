@@ -0,0 +1,48 @@
+"""
+Minimal in-process background execution.
+
+Work is handed to a small thread pool once the surrounding transaction
+commits, keeping slow tasks (image processing, cache flushes, ...) off the
+request path without requiring a separate queue service. Set
+BACKGROUND_TASKS_EAGER = True to run tasks inline instead (tests, scripts).
+"""
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connections, transaction
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=getattr(settings, 'BACKGROUND_TASK_WORKERS', 2),
+            thread_name_prefix='lms-background',
+        )
+    return _executor
+
+
+def _run(func, args, kwargs):
+    try:
+        func(*args, **kwargs)
+    except Exception:
+        logger.exception('Background task %s failed', getattr(func, '__name__', func))
+    finally:
+        # Worker threads own their connections; don't leak them between tasks
+        connections.close_all()
+
+
+def run_in_background(func, *args, **kwargs):
+    """Run func(*args, **kwargs) after the current transaction commits"""
+    def submit():
+        if getattr(settings, 'BACKGROUND_TASKS_EAGER', False):
+            func(*args, **kwargs)
+        else:
+            _get_executor().submit(_run, func, args, kwargs)
+
+    transaction.on_commit(submit)
@@ -20,6 +20,7 @@ from django.conf import settings
 from django.conf.urls.static import static
 from django.views.generic import RedirectView
 from dashboard.health import HealthCheckView
+from enrollments.views import verify_certificate
 
 # Admin site customization
 admin.site.site_header = "LMS Administration"
@@ -39,6 +40,9 @@ urlpatterns = [
     path('enrollments/', include('enrollments.urls')),
     path('quizzes/', include('quizzes.urls')),
     
+    # Public, cacheable certificate lookups for employers
+    path('certificates/verify/<slug:certificate_id>/', verify_certificate, name='verify_certificate'),
+    
     # API URLs (for future mobile app or frontend)
     path('api/', include('api.urls')),
     
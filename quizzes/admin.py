@@ -31,7 +31,10 @@ class QuizAdmin(admin.ModelAdmin):
             'fields': ('time_limit_minutes', 'max_attempts', 'pass_percentage')
         }),
         ('Display Options', {
-            'fields': ('show_correct_answers', 'show_explanations', 'randomize_questions', 'randomize_answers')
+            'fields': (
+                'show_correct_answers', 'show_explanations', 'randomize_questions', 'randomize_answers',
+                'questions_per_attempt'
+            )
         }),
         ('Availability', {
             'fields': ('is_published', 'available_from', 'available_until')
@@ -0,0 +1,232 @@
+"""
+Write-behind autosave for answers of quiz attempts in progress.
+
+The take page posts the answers a student changes every few seconds.
+Instead of a write per post, they are coalesced in the cache - the latest
+answer per (attempt, question) - and flush_quiz_autosaves grades and
+upserts them into StudentAnswer on the (attempt, question) unique key,
+one statement per batch. Submitting grades the saved state: the stored
+rows, overlaid with the answers still buffered and whatever the
+submission itself carries. By the deadline most answer rows already
+exist, so a submission writes only what changed since the last flush.
+
+Buffering follows enrollments.heartbeats: answers live in numbered
+generations, the first answer for a pair in a generation claims a slot
+from an atomic counter so a flush finds every pair with get_many(), and a
+flush drains the generations before the one it retires, so an answer
+written just as the generation switches is never lost. Answers reach the
+table one flush later; until then submissions read them from the cache.
+A crash of the cache loses at most the answers buffered since the last
+flush.
+"""
+from django.core.cache import cache
+from django.db import transaction
+
+from .grading import (
+    answers_from_form, answers_from_list, answers_from_rows, get_answer_key, grade, stored_rows,
+    submit_attempt, write_answers,
+)
+from .models import QuizAttempt
+
+DEFAULT_BATCH_SIZE = 500
+
+# Buffered keys outlive a missed flush or two, then expire on their own
+BUFFER_TIMEOUT = 60 * 60 * 6
+
+GENERATION_KEY = 'quiz_autosave:generation'
+DRAINED_KEY = 'quiz_autosave:drained'
+
+# Buffered value of an answer the student removed
+CLEARED = ''
+
+
+def _seq_key(generation):
+    return f'quiz_autosave:{generation}:seq'
+
+
+def _slot_key(generation, n):
+    return f'quiz_autosave:{generation}:slot:{n}'
+
+
+def _answer_key(generation, attempt_id, question_id):
+    return f'quiz_autosave:{generation}:answer:{attempt_id}:{question_id}'
+
+
+def current_generation():
+    cache.add(GENERATION_KEY, 1, None)
+    return cache.get(GENERATION_KEY)
+
+
+def _with_cleared(answers, pairs, answer_key):
+    """Add CLEARED for questions of the key whose value in pairs is blank"""
+    for question_id, value in pairs:
+        if value is not None and str(value).strip():
+            continue
+        try:
+            question_id = int(question_id)
+        except (TypeError, ValueError):
+            continue
+        if question_id in answer_key.types:
+            answers.setdefault(question_id, CLEARED)
+    return answers
+
+
+def delta_from_list(items, answer_key):
+    """
+    Changed answers from API items, as for answers_from_list().
+
+    A null or blank answer clears the question. Raises ValueError if items
+    is not a list of objects.
+    """
+    answers = answers_from_list(items, answer_key)
+    return _with_cleared(
+        answers,
+        ((item.get('question'), item.get('selected_choice', item.get('text_answer'))) for item in items),
+        answer_key,
+    )
+
+
+def delta_from_form(data, answer_key):
+    """Answers from POST fields named question_<id>; a blank field clears the question"""
+    return _with_cleared(
+        answers_from_form(data, answer_key),
+        (
+            (question_id, data.get(f'question_{question_id}'))
+            for question_id in answer_key.question_ids if f'question_{question_id}' in data
+        ),
+        answer_key,
+    )
+
+
+def record_answers(attempt_id, answers):
+    """
+    Buffer changed answers of one attempt.
+
+    answers is {question_id: answer or CLEARED}. A later answer to the same
+    question replaces the buffered one. Nothing touches the database.
+    """
+    generation = current_generation()
+    for question_id, answer in answers.items():
+        key = _answer_key(generation, attempt_id, question_id)
+        if cache.add(key, answer, BUFFER_TIMEOUT):
+            # First answer for this pair in this generation: register it
+            cache.add(_seq_key(generation), 0, BUFFER_TIMEOUT)
+            n = cache.incr(_seq_key(generation))
+            cache.set(_slot_key(generation, n), (attempt_id, question_id), BUFFER_TIMEOUT)
+        else:
+            cache.set(key, answer, BUFFER_TIMEOUT)
+
+
+def buffered_answers(attempts):
+    """
+    Answers buffered but not yet flushed.
+
+    attempts maps attempt ids to the question ids to look up. Returns
+    {attempt_id: {question_id: answer or CLEARED}}, newest generation
+    winning.
+    """
+    generation = current_generation()
+    drained = cache.get(DRAINED_KEY) or 0
+    answers = {attempt_id: {} for attempt_id in attempts}
+    for buffered in range(drained + 1, generation + 1):
+        keys = {
+            _answer_key(buffered, attempt_id, question_id): (attempt_id, question_id)
+            for attempt_id, question_ids in attempts.items() for question_id in question_ids
+        }
+        for key, answer in cache.get_many(list(keys)).items():
+            attempt_id, question_id = keys[key]
+            answers[attempt_id][question_id] = answer
+    return answers
+
+
+def saved_state(rows, buffered):
+    """Overlay buffered answers on normalized stored ones, dropping cleared questions"""
+    state = {**rows, **buffered}
+    return {question_id: answer for question_id, answer in state.items() if answer != CLEARED}
+
+
+def _drain_generation(generation, batch_size):
+    """Yield batches of {(attempt_id, question_id): answer} and drop the keys"""
+    count = cache.get(_seq_key(generation)) or 0
+    for start in range(1, count + 1, batch_size):
+        slot_keys = [_slot_key(generation, n) for n in range(start, min(start + batch_size, count + 1))]
+        pairs = list(cache.get_many(slot_keys).values())
+        answer_keys = {pair: _answer_key(generation, *pair) for pair in pairs}
+        values = cache.get_many(list(answer_keys.values()))
+        yield {pair: values[key] for pair, key in answer_keys.items() if key in values}
+        cache.delete_many(slot_keys + list(answer_keys.values()))
+    cache.delete(_seq_key(generation))
+
+
+def apply_answers(batch):
+    """
+    Grade and write one batch of buffered answers.
+
+    batch maps (attempt_id, question_id) to an answer or CLEARED. The
+    attempts still in progress are locked so a submission waits for the
+    write instead of being overwritten by it; answers for other attempts,
+    and for questions no longer in the quiz or not drawn for the attempt,
+    are dropped. Returns the answers written.
+    """
+    by_attempt = {}
+    for (attempt_id, question_id), answer in batch.items():
+        by_attempt.setdefault(attempt_id, {})[question_id] = answer
+    attempts = QuizAttempt.objects.select_for_update(of=('self',)).filter(
+        pk__in=by_attempt, status='in_progress'
+    ).order_by('pk').values_list('pk', 'quiz_id', 'quiz__questions_per_attempt')
+
+    changes = {}
+    for attempt_id, quiz_id, questions_per_attempt in attempts:
+        answer_key = get_answer_key(quiz_id).for_attempt(attempt_id, questions_per_attempt)
+        answers = {
+            question_id: answer for question_id, answer in by_attempt[attempt_id].items()
+            if question_id in answer_key.types
+        }
+        graded = grade(answer_key, saved_state({}, answers)).answers
+        # Cleared answers, and choices not of their question, are removed
+        changes[attempt_id] = {question_id: graded.get(question_id) for question_id in answers}
+    write_answers(changes)
+    return sum(len(answers) for answers in changes.values())
+
+
+def flush_autosaves(batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Write every buffered generation older than the one this flush retires.
+
+    The retired generation is left to the next flush, giving writers still
+    using it one interval to finish. Returns the number of answers written.
+    """
+    generation = current_generation()
+    cache.incr(GENERATION_KEY)
+    cache.add(DRAINED_KEY, 0, None)
+    drained = cache.get(DRAINED_KEY)
+
+    written = 0
+    for old in range(drained + 1, generation):
+        for batch in _drain_generation(old, batch_size):
+            with transaction.atomic():
+                written += apply_answers(batch)
+        cache.set(DRAINED_KEY, old, None)
+    return written
+
+
+def current_answers(attempt, answer_key):
+    """The saved state of an attempt in progress, for showing it again (one query)"""
+    rows = stored_rows([attempt.pk])[attempt.pk]
+    buffered = buffered_answers({attempt.pk: answer_key.question_ids})[attempt.pk]
+    return saved_state(answers_from_rows(rows, answer_key), buffered)
+
+
+def submit_saved(attempt, answers=None, status='completed'):
+    """
+    Submit an attempt graded on its saved state.
+
+    The stored answers are overlaid with those still buffered and then with
+    answers (a final delta, where CLEARED removes an answer). Only rows that
+    change are written. Raises AttemptClosed like submit_attempt().
+    """
+    answer_key = get_answer_key(attempt.quiz_id).for_attempt(attempt.pk, attempt.quiz.questions_per_attempt)
+    rows = stored_rows([attempt.pk])[attempt.pk]
+    buffered = buffered_answers({attempt.pk: answer_key.question_ids})[attempt.pk]
+    state = saved_state(answers_from_rows(rows, answer_key), {**buffered, **(answers or {})})
+    return submit_attempt(attempt, state, status, stored=rows)
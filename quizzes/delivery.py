@@ -0,0 +1,255 @@
+"""
+Exam delivery that holds up when everyone starts at once.
+
+When a graded exam opens, its whole cohort starts it within the same
+minute. Everything starting and taking an attempt needs is therefore kept
+in the cache:
+
+- the delivery payload: the quiz settings and its questions with their
+  choices (never the correct answers), cached under a per-quiz version
+  token that Quiz, Question and AnswerChoice signals replace. Each
+  attempt's draw and order are derived from it by attempt_questions();
+- one allowance counter per (quiz, student): the attempt numbers used so
+  far, which start_attempt() increments atomically to number the new
+  attempt. Deleting an attempt or an enrollment drops the student's
+  counters (see the receivers in quizzes.models).
+
+With both warm, starting an attempt is a single INSERT. The prewarm_exams
+command fills them, together with the grading answer key, shortly before
+available_from. On a cold cache they are rebuilt on first use, so warming
+only ever saves work.
+"""
+from collections import namedtuple
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from enrollments.models import Enrollment
+from lms_project.cache_versions import bump_version, get_version
+
+from .grading import get_answer_key
+from .models import AnswerChoice, Question, Quiz, QuizAttempt, attempt_deadline
+from .randomization import attempt_choices, attempt_question_ids
+
+DELIVERY_TIMEOUT = 60 * 60 * 24
+
+# Part of the cache key; bump when the payload's fields change
+DELIVERY_FORMAT = 2
+
+# Allowances outlive an exam window; a cold key is rebuilt from the table
+ALLOWANCE_TIMEOUT = 60 * 60 * 6
+
+# Quiz types that open to a whole cohort at a fixed time
+EXAM_TYPES = ('graded', 'final')
+
+# How long before (and after) available_from an exam is warmed
+DEFAULT_LEAD = timedelta(minutes=15)
+
+
+class NotEnrolled(Exception):
+    """The student is not enrolled in the quiz's course"""
+
+
+class NoAttemptsLeft(Exception):
+    """The student has used all attempts at the quiz"""
+
+
+DeliveryChoice = namedtuple('DeliveryChoice', 'pk text')
+
+DeliveryQuestion = namedtuple('DeliveryQuestion', 'pk text question_type points choices')
+
+_QuizDeliveryRow = namedtuple(
+    '_QuizDeliveryRow',
+    'id course_id title quiz_type time_limit_minutes max_attempts '
+    'randomize_questions randomize_answers questions_per_attempt '
+    'is_published available_from available_until questions'
+)
+
+
+class QuizDelivery(_QuizDeliveryRow):
+    """Stand-in for a Quiz and its questions when starting or taking it"""
+    __slots__ = ()
+
+    @property
+    def pk(self):
+        return self.id
+
+    def is_available(self):
+        """Same rules as Quiz.is_available"""
+        now = timezone.now()
+        if self.available_from and now < self.available_from:
+            return False
+        if self.available_until and now > self.available_until:
+            return False
+        return self.is_published
+
+
+def _namespace(quiz_id):
+    return f'quiz_delivery:{quiz_id}'
+
+
+def _delivery_key(quiz_id, version):
+    return f'quiz_delivery:{quiz_id}:{DELIVERY_FORMAT}:{version}'
+
+
+def _allowance_key(quiz_id, student_id):
+    return f'quiz_allowance:{quiz_id}:{student_id}'
+
+
+def build_quiz_delivery(quiz_id):
+    """Build the delivery payload from the database (three queries); None if the quiz is gone"""
+    quiz = Quiz.objects.filter(pk=quiz_id).values_list(*_QuizDeliveryRow._fields[:-1]).first()
+    if quiz is None:
+        return None
+    choices = {}
+    for question_id, pk, text in AnswerChoice.objects.filter(question__quiz_id=quiz_id).order_by(
+        'order', 'created_at', 'id'
+    ).values_list('question_id', 'id', 'text'):
+        choices.setdefault(question_id, []).append(DeliveryChoice(pk, text))
+    questions = tuple(
+        DeliveryQuestion(pk, text, question_type, points, tuple(choices.get(pk, ())))
+        for pk, text, question_type, points in Question.objects.filter(quiz_id=quiz_id).order_by(
+            'order', 'created_at', 'id'
+        ).values_list('id', 'text', 'question_type', 'points')
+    )
+    return QuizDelivery(*quiz, questions)
+
+
+def get_quiz_delivery(quiz_id):
+    """Return the cached delivery payload for a quiz, building it on a miss"""
+    key = _delivery_key(quiz_id, get_version(_namespace(quiz_id)))
+    delivery = cache.get(key)
+    if delivery is None:
+        delivery = build_quiz_delivery(quiz_id)
+        if delivery is not None:
+            cache.set(key, delivery, DELIVERY_TIMEOUT)
+    return delivery
+
+
+def invalidate_quiz_delivery(quiz_id):
+    """Retire the cached delivery payload for a quiz"""
+    bump_version(_namespace(quiz_id))
+
+
+def attempt_questions(quiz, attempt_id):
+    """
+    An attempt's questions (of a QuizDelivery) in the order it shows them,
+    drawn and shuffled as the quiz asks, with its choice order
+    """
+    questions = {question.pk: question for question in quiz.questions}
+    order = attempt_question_ids(attempt_id, questions, quiz.questions_per_attempt, quiz.randomize_questions)
+    if not quiz.randomize_answers:
+        return tuple(questions[pk] for pk in order)
+    return tuple(
+        questions[pk]._replace(choices=tuple(attempt_choices(attempt_id, pk, questions[pk].choices)))
+        for pk in order
+    )
+
+
+def _attempts_used(quiz, student_id):
+    """Highest attempt number so far, or None if the student is not enrolled (two queries)"""
+    if not Enrollment.objects.filter(student_id=student_id, course_id=quiz.course_id).exists():
+        return None
+    used = QuizAttempt.objects.filter(quiz_id=quiz.id, student_id=student_id).aggregate(
+        n=Max('attempt_number')
+    )['n']
+    return used or 0
+
+
+def prime_allowances(quiz):
+    """
+    Cache the attempts used by every student enrolled in the quiz's course.
+
+    Two queries whatever the cohort size. Counters already in the cache are
+    left alone, as they may be ahead of the table. Returns how many were
+    primed.
+    """
+    student_ids = Enrollment.objects.filter(course_id=quiz.course_id).values_list('student_id', flat=True)
+    used = dict(
+        QuizAttempt.objects.filter(quiz_id=quiz.id).order_by().values('student_id').annotate(
+            n=Max('attempt_number')
+        ).values_list('student_id', 'n')
+    )
+    allowances = {
+        _allowance_key(quiz.id, student_id): used.get(student_id, 0) for student_id in student_ids
+    }
+    present = cache.get_many(list(allowances))
+    missing = {key: value for key, value in allowances.items() if key not in present}
+    cache.set_many(missing, ALLOWANCE_TIMEOUT)
+    return len(missing)
+
+
+def start_attempt(quiz, student, **fields):
+    """
+    Create the student's next attempt at a quiz (a QuizDelivery).
+
+    The attempt number comes from the allowance counter, so with a warm
+    cache this is one INSERT and no reads. Raises NotEnrolled or
+    NoAttemptsLeft.
+    """
+    key = _allowance_key(quiz.id, student.pk)
+    for retry in (False, True):
+        try:
+            number = cache.incr(key)
+        except ValueError:
+            # Cold or evicted counter: rebuild it from the table
+            used = _attempts_used(quiz, student.pk)
+            if used is None:
+                raise NotEnrolled
+            cache.add(key, used, ALLOWANCE_TIMEOUT)
+            number = cache.incr(key)
+        if number > quiz.max_attempts:
+            cache.decr(key)
+            raise NoAttemptsLeft
+
+        attempt = QuizAttempt(
+            student=student, quiz_id=quiz.id, attempt_number=number,
+            deadline_at=attempt_deadline(quiz.time_limit_minutes), **fields
+        )
+        try:
+            with transaction.atomic():
+                attempt.save(force_insert=True)
+            return attempt
+        except IntegrityError:
+            # The counter was behind the table (e.g. attempts created elsewhere)
+            cache.delete(key)
+            if retry:
+                raise
+
+
+def upcoming_exams(lead):
+    """Published exams opening within `lead` (a timedelta) of now, either side"""
+    now = timezone.now()
+    return Quiz.objects.filter(
+        is_published=True, quiz_type__in=EXAM_TYPES,
+        available_from__gt=now - lead, available_from__lte=now + lead,
+    )
+
+
+def prewarm_quiz(quiz_id):
+    """Cache a quiz's answer key, delivery payload and allowances; returns the allowances primed"""
+    get_answer_key(quiz_id)
+    delivery = get_quiz_delivery(quiz_id)
+    if delivery is None:
+        return 0
+    return prime_allowances(delivery)
+
+
+def forget_allowances(student_id, quiz_ids):
+    """
+    Drop a student's allowance counters, so the next start rebuilds them
+    from the table (and checks the enrollment again)
+    """
+    keys = [_allowance_key(quiz_id, student_id) for quiz_id in quiz_ids]
+    cache.delete_many(keys)
+    # A start racing the deletion may have rebuilt a counter from the old rows
+    transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def forget_quiz(quiz_id, student_ids):
+    """Drop a quiz's cached payload and the given students' allowances"""
+    invalidate_quiz_delivery(quiz_id)
+    cache.delete_many([_allowance_key(quiz_id, student_id) for student_id in student_ids])
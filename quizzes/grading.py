@@ -0,0 +1,303 @@
+"""
+Quiz grading from a precompiled answer key.
+
+An answer key holds everything needed to score a quiz: its questions in
+order with their points and type, and the (question, choice) pairs that
+are valid and correct. It is built with two queries and cached under a
+per-quiz version token that Question and AnswerChoice signals (see
+quizzes.models) replace. A submission is then scored in memory with set
+operations and written with one conditional UPDATE of the attempt and one
+bulk_create of its answers, however many questions the quiz has.
+
+The HTML form and the API both submit through submit_attempt(), so the
+two paths always agree on the score. Answers autosaved while the attempt
+was in progress (see quizzes.autosave) are already stored; passing the
+stored rows to submit_attempt() limits the writes to what changed.
+"""
+from collections import namedtuple
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from lms_project.cache_versions import bump_version, get_version
+
+from .models import AnswerChoice, Question, QuizAttempt, StudentAnswer
+from .randomization import attempt_question_ids
+
+ANSWER_KEY_TIMEOUT = 60 * 60 * 24
+
+# Question types scored from the selected choice; the others wait for an instructor
+AUTO_GRADED_TYPES = frozenset(['multiple_choice', 'true_false'])
+
+# StudentAnswer fields set by grading
+ANSWER_FIELDS = ('selected_choice_id', 'text_answer', 'is_auto_graded', 'points_earned')
+
+
+class AttemptClosed(Exception):
+    """The attempt was already submitted"""
+
+
+_AnswerKeyRow = namedtuple('_AnswerKeyRow', 'quiz_id question_ids points types choices correct')
+
+
+class AnswerKey(_AnswerKeyRow):
+    """
+    Everything needed to grade one quiz.
+
+    points and types map question ids to their points and question type;
+    choices and correct are frozensets of (question_id, choice_id) pairs.
+    """
+    __slots__ = ()
+
+    @property
+    def max_score(self):
+        return sum(self.points.values())
+
+    def is_auto_graded(self, question_id):
+        return self.types.get(question_id) in AUTO_GRADED_TYPES
+
+    def for_attempt(self, attempt_id, questions_per_attempt):
+        """The key restricted to the questions drawn for an attempt"""
+        if not questions_per_attempt or questions_per_attempt >= len(self.question_ids):
+            return self
+        drawn = attempt_question_ids(attempt_id, self.question_ids, questions_per_attempt)
+        kept = frozenset(drawn)
+        return AnswerKey(
+            self.quiz_id,
+            tuple(drawn),
+            {question_id: points for question_id, points in self.points.items() if question_id in kept},
+            {question_id: type_ for question_id, type_ in self.types.items() if question_id in kept},
+            frozenset(pair for pair in self.choices if pair[0] in kept),
+            frozenset(pair for pair in self.correct if pair[0] in kept),
+        )
+
+
+Grade = namedtuple('Grade', 'score max_score percentage correct answers')
+
+
+def _namespace(quiz_id):
+    return f'answer_key:{quiz_id}'
+
+
+def _answer_key_key(quiz_id, version):
+    return f'answer_key:{quiz_id}:{version}'
+
+
+def build_answer_key(quiz_id):
+    """Build an answer key straight from the database (two queries)"""
+    questions = list(Question.objects.filter(quiz_id=quiz_id).order_by(
+        'order', 'created_at', 'id'
+    ).values_list('id', 'points', 'question_type'))
+    choices = AnswerChoice.objects.filter(question__quiz_id=quiz_id).values_list(
+        'question_id', 'id', 'is_correct'
+    )
+    pairs = {(question_id, choice_id): is_correct for question_id, choice_id, is_correct in choices}
+    return AnswerKey(
+        quiz_id,
+        tuple(question_id for question_id, _, _ in questions),
+        {question_id: points for question_id, points, _ in questions},
+        {question_id: question_type for question_id, _, question_type in questions},
+        frozenset(pairs),
+        frozenset(pair for pair, is_correct in pairs.items() if is_correct),
+    )
+
+
+def get_answer_key(quiz_id):
+    """Return the cached answer key for a quiz, building it on a miss"""
+    key = _answer_key_key(quiz_id, get_version(_namespace(quiz_id)))
+    answer_key = cache.get(key)
+    if answer_key is None:
+        answer_key = build_answer_key(quiz_id)
+        cache.set(key, answer_key, ANSWER_KEY_TIMEOUT)
+    return answer_key
+
+
+def invalidate_answer_key(quiz_id):
+    """Retire the cached answer key for a quiz"""
+    bump_version(_namespace(quiz_id))
+
+
+def parse_answers(pairs, answer_key):
+    """
+    Normalize (question_id, value) pairs into {question_id: answer}.
+
+    Choice questions keep an int choice id and the others stripped text.
+    Unknown questions and blank or malformed values are left out, so they
+    score as unanswered.
+    """
+    answers = {}
+    for question_id, value in pairs:
+        try:
+            question_id = int(question_id)
+        except (TypeError, ValueError):
+            continue
+        if question_id not in answer_key.types or value is None:
+            continue
+        if answer_key.is_auto_graded(question_id):
+            try:
+                answers[question_id] = int(value)
+            except (TypeError, ValueError):
+                continue
+        elif str(value).strip():
+            answers[question_id] = str(value).strip()
+    return answers
+
+
+def answers_from_form(data, answer_key):
+    """Answers from POST fields named question_<id>"""
+    return parse_answers(
+        ((question_id, data.get(f'question_{question_id}')) for question_id in answer_key.question_ids),
+        answer_key,
+    )
+
+
+def answers_from_list(items, answer_key):
+    """
+    Answers from API items {"question", "selected_choice" or "text_answer"}.
+
+    Raises ValueError if items is not a list of objects.
+    """
+    if not isinstance(items, list) or not all(isinstance(item, dict) for item in items):
+        raise ValueError('answers must be a list of objects')
+    return parse_answers(
+        (
+            (item.get('question'), item.get('selected_choice', item.get('text_answer')))
+            for item in items
+        ),
+        answer_key,
+    )
+
+
+def grade(answer_key, answers):
+    """
+    Score normalized answers against a key in memory.
+
+    Choices that do not belong to their question, and answers to questions
+    not in the key, are dropped. Text answers earn nothing until an
+    instructor grades them. Returns a Grade whose answers are StudentAnswer
+    field dicts keyed by question id.
+    """
+    selected = {
+        (question_id, answer) for question_id, answer in answers.items()
+        if answer_key.is_auto_graded(question_id)
+    } & answer_key.choices
+    correct = frozenset(question_id for question_id, _ in selected & answer_key.correct)
+    texts = {
+        question_id: answer for question_id, answer in answers.items()
+        if question_id in answer_key.types and not answer_key.is_auto_graded(question_id)
+    }
+
+    rows = {}
+    for question_id, choice_id in selected:
+        rows[question_id] = {
+            'selected_choice_id': choice_id, 'text_answer': '', 'is_auto_graded': True,
+            'points_earned': answer_key.points[question_id] if question_id in correct else 0,
+        }
+    for question_id, text in texts.items():
+        rows[question_id] = {
+            'selected_choice_id': None, 'text_answer': text, 'is_auto_graded': False, 'points_earned': 0,
+        }
+
+    score = sum(answer_key.points[question_id] for question_id in correct)
+    max_score = answer_key.max_score
+    percentage = (Decimal(score * 100) / max_score).quantize(Decimal('0.01')) if max_score else Decimal(0)
+    return Grade(score, max_score, percentage, correct, rows)
+
+
+def changed_answers(wanted, stored):
+    """
+    The answer rows to write to turn stored into wanted.
+
+    Both map question ids to StudentAnswer field dicts; questions stored but
+    no longer wanted map to None.
+    """
+    changes = {question_id: fields for question_id, fields in wanted.items() if stored.get(question_id) != fields}
+    changes.update({question_id: None for question_id in stored if question_id not in wanted})
+    return changes
+
+
+def write_answers(changes):
+    """
+    Write answer rows for any number of attempts.
+
+    changes maps attempt ids to {question_id: StudentAnswer fields, or None
+    to delete the answer}. Costs one DELETE and one upsert on the
+    (attempt, question) unique key at most.
+    """
+    rows, removed = [], Q()
+    for attempt_id, answers in changes.items():
+        for question_id, fields in answers.items():
+            if fields is None:
+                removed |= Q(attempt_id=attempt_id, question_id=question_id)
+            else:
+                rows.append(StudentAnswer(attempt_id=attempt_id, question_id=question_id, **fields))
+    if removed:
+        StudentAnswer.objects.filter(removed).delete()
+    if rows:
+        StudentAnswer.objects.bulk_create(
+            rows,
+            update_conflicts=True,
+            unique_fields=['attempt', 'question'],
+            update_fields=['selected_choice', 'text_answer', 'is_auto_graded', 'points_earned', 'updated_at'],
+        )
+
+
+def submit_attempt(attempt, answers, status='completed', stored=None):
+    """
+    Grade answers, store them and close an in-progress attempt.
+
+    answers is {question_id: answer} as built by parse_answers(). With the
+    attempt's rows as read by stored_rows(), only answers that changed are
+    written and stored answers left out are deleted; without them every
+    answer is upserted. Raises AttemptClosed if the attempt is no longer in
+    progress; nothing is written then. Updates attempt in place and returns
+    the Grade.
+    """
+    answer_key = get_answer_key(attempt.quiz_id).for_attempt(attempt.pk, attempt.quiz.questions_per_attempt)
+    result = grade(answer_key, answers)
+    now = timezone.now()
+    changes = {
+        'status': status,
+        'submitted_at': now,
+        'time_taken_minutes': int((now - attempt.started_at).total_seconds() // 60),
+        'score': result.score,
+        'max_score': result.max_score,
+        'percentage': result.percentage,
+        'passed': result.percentage >= attempt.quiz.pass_percentage,
+        'updated_at': now,
+    }
+    with transaction.atomic():
+        # Only one submission of an attempt can win
+        if not QuizAttempt.objects.filter(pk=attempt.pk, status='in_progress').update(**changes):
+            raise AttemptClosed
+        write_answers({
+            attempt.pk: result.answers if stored is None else changed_answers(result.answers, stored)
+        })
+    for field, value in changes.items():
+        setattr(attempt, field, value)
+    return result
+
+
+def stored_rows(attempt_ids):
+    """{attempt_id: {question_id: StudentAnswer fields}} for the given attempts (one query)"""
+    rows = {attempt_id: {} for attempt_id in attempt_ids}
+    for attempt_id, question_id, *fields in StudentAnswer.objects.filter(
+        attempt_id__in=attempt_ids
+    ).values_list('attempt_id', 'question_id', *ANSWER_FIELDS):
+        rows[attempt_id][question_id] = dict(zip(ANSWER_FIELDS, fields))
+    return rows
+
+
+def answers_from_rows(rows, answer_key):
+    """Normalized answers from one attempt's stored_rows()"""
+    return parse_answers(
+        (
+            (question_id, fields['selected_choice_id'] if fields['selected_choice_id'] is not None
+             else fields['text_answer'])
+            for question_id, fields in rows.items()
+        ),
+        answer_key,
+    )
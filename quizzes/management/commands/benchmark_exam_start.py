@@ -0,0 +1,116 @@
+"""
+Management command to measure the cost of starting an exam under load.
+Builds a throwaway course, exam and cohort inside a transaction that is
+rolled back, then starts and opens an attempt for every student three
+ways: the per-request lookups used before exam warming, a cold cache and
+a cache warmed by prewarm_exams. Reports queries and time per student;
+inside the benchmark's transaction every start also shows the SAVEPOINT
+pair around its INSERT.
+"""
+import time
+import uuid
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from courses.models import Course
+from enrollments.models import Enrollment
+from quizzes.delivery import forget_quiz, get_quiz_delivery, prewarm_quiz, start_attempt
+from quizzes.models import AnswerChoice, Question, Quiz, QuizAttempt
+
+
+def _start_uncached(quiz, student):
+    """What starting and opening an attempt cost before the delivery cache"""
+    Enrollment.objects.filter(student=student, course_id=quiz.course_id).exists()
+    QuizAttempt.objects.filter(student=student, quiz=quiz).count()
+    QuizAttempt.objects.create(student=student, quiz=quiz)
+    list(quiz.questions.prefetch_related('answer_choices').order_by('order'))
+
+
+def _start_cached(quiz, student):
+    start_attempt(get_quiz_delivery(quiz.pk), student)
+    get_quiz_delivery(quiz.pk)
+
+
+class Command(BaseCommand):
+    help = 'Compare the cost of starting an exam with and without cache warming (nothing is kept)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--students',
+            type=int,
+            default=50,
+            help=(
+                'Students per scenario; keep the three cohorts within the cache\'s '
+                'MAX_ENTRIES (default: 50)'
+            )
+        )
+        parser.add_argument(
+            '--questions',
+            type=int,
+            default=50,
+            help='Questions in the exam (default: 50)'
+        )
+
+    def handle(self, *args, **options):
+        if options['students'] < 1 or options['questions'] < 1:
+            raise CommandError('--students and --questions must be at least 1')
+
+        quiz, cohorts = None, []
+        try:
+            with transaction.atomic():
+                quiz, cohorts = self._build(options['students'], options['questions'])
+                results = [
+                    ('uncached', self._measure(_start_uncached, quiz, cohorts[0])),
+                    ('cold cache', self._measure(_start_cached, quiz, cohorts[1])),
+                ]
+                prewarm_quiz(quiz.pk)
+                results.append(('warm cache', self._measure(_start_cached, quiz, cohorts[2])))
+                transaction.set_rollback(True)
+        finally:
+            if quiz is not None:
+                forget_quiz(quiz.pk, [student.pk for cohort in cohorts for student in cohort])
+
+        for label, (queries, seconds) in results:
+            self.stdout.write(
+                f'{label:>12}: {queries:5.2f} queries, {seconds * 1000:7.3f} ms per student'
+            )
+        self.stdout.write(self.style.SUCCESS('✓ Benchmark finished; all data was rolled back'))
+
+    def _build(self, students, questions):
+        User = get_user_model()
+        tag = uuid.uuid4().hex[:8]
+        instructor = User.objects.create(username=f'bench-{tag}-instructor', user_type='instructor')
+        course = Course.objects.create(
+            title=f'Benchmark {tag}', description='Benchmark', short_description='Benchmark',
+            instructor=instructor, duration_weeks=1, estimated_hours=1, status='published',
+        )
+        quiz = Quiz.objects.create(
+            title='Benchmark exam', course=course, quiz_type='final', is_published=True,
+            available_from=timezone.now(), max_attempts=1,
+        )
+        Question.objects.bulk_create([
+            Question(quiz=quiz, text=f'Question {n}', order=n) for n in range(questions)
+        ])
+        AnswerChoice.objects.bulk_create([
+            AnswerChoice(question=question, text=f'Choice {n}', order=n, is_correct=n == 0)
+            for question in quiz.questions.all() for n in range(4)
+        ])
+
+        User.objects.bulk_create([
+            User(username=f'bench-{tag}-{n}', user_type='student') for n in range(students * 3)
+        ])
+        cohort = list(User.objects.filter(username__startswith=f'bench-{tag}-').exclude(pk=instructor.pk))
+        Enrollment.objects.bulk_create([Enrollment(student=student, course=course) for student in cohort])
+        return quiz, [cohort[n::3] for n in range(3)]
+
+    def _measure(self, start, quiz, students):
+        with CaptureQueriesContext(connection) as queries:
+            began = time.perf_counter()
+            for student in students:
+                start(quiz, student)
+            elapsed = time.perf_counter() - began
+        return len(queries) / len(students), elapsed / len(students)
@@ -0,0 +1,43 @@
+"""
+Management command to write autosaved quiz answers to the database.
+Run it every minute from cron, or keep it running with --loop.
+"""
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from quizzes.autosave import DEFAULT_BATCH_SIZE, flush_autosaves
+
+
+class Command(BaseCommand):
+    help = 'Flush buffered answers of quiz attempts in progress to StudentAnswer'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=DEFAULT_BATCH_SIZE,
+            help=f'Buffered answers per upsert (default: {DEFAULT_BATCH_SIZE})'
+        )
+        parser.add_argument(
+            '--loop',
+            action='store_true',
+            help='Keep flushing every --interval seconds'
+        )
+        parser.add_argument(
+            '--interval',
+            type=int,
+            default=30,
+            help='Seconds between flushes with --loop (default: 30)'
+        )
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1 or options['interval'] < 1:
+            raise CommandError('--batch-size and --interval must be at least 1')
+
+        while True:
+            written = flush_autosaves(options['batch_size'])
+            self.stdout.write(self.style.SUCCESS(f'✓ Flushed {written} autosaved answer(s)'))
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
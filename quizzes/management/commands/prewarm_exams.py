@@ -0,0 +1,56 @@
+"""
+Management command to warm the cache for exams about to open.
+Run it every few minutes from cron, or keep it running with --loop.
+"""
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+
+from quizzes.delivery import DEFAULT_LEAD, prewarm_quiz, upcoming_exams
+
+DEFAULT_LEAD_MINUTES = int(DEFAULT_LEAD.total_seconds() // 60)
+
+
+class Command(BaseCommand):
+    help = 'Cache the delivery payload, answer key and attempt allowances of exams about to open'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--lead-minutes',
+            type=int,
+            default=DEFAULT_LEAD_MINUTES,
+            help=f'Warm exams opening within this many minutes (default: {DEFAULT_LEAD_MINUTES})'
+        )
+        parser.add_argument(
+            '--quiz',
+            type=int,
+            action='append',
+            help='Warm this quiz id whatever its schedule (repeatable)'
+        )
+        parser.add_argument(
+            '--loop',
+            action='store_true',
+            help='Keep warming every --interval seconds'
+        )
+        parser.add_argument(
+            '--interval',
+            type=int,
+            default=60,
+            help='Seconds between passes with --loop (default: 60)'
+        )
+
+    def handle(self, *args, **options):
+        if options['lead_minutes'] < 1 or options['interval'] < 1:
+            raise CommandError('--lead-minutes and --interval must be at least 1')
+        lead = timedelta(minutes=options['lead_minutes'])
+
+        while True:
+            quiz_ids = options['quiz'] or list(upcoming_exams(lead).values_list('pk', flat=True))
+            primed = sum(prewarm_quiz(quiz_id) for quiz_id in quiz_ids)
+            self.stdout.write(self.style.SUCCESS(
+                f'✓ Warmed {len(quiz_ids)} exam(s), primed {primed} attempt allowance(s)'
+            ))
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,56 @@
+"""
+Management command to time out quiz attempts past their deadline.
+Run it every minute from cron on any number of nodes, or keep it running
+with --loop.
+"""
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+
+from quizzes.sweeper import DEFAULT_BATCH_SIZE, GRACE_PERIOD, sweep_expired_attempts
+
+DEFAULT_GRACE_SECONDS = int(GRACE_PERIOD.total_seconds())
+
+
+class Command(BaseCommand):
+    help = 'Grade and time out in-progress quiz attempts whose deadline has passed'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=DEFAULT_BATCH_SIZE,
+            help=f'Attempts claimed and graded per transaction (default: {DEFAULT_BATCH_SIZE})'
+        )
+        parser.add_argument(
+            '--grace-seconds',
+            type=int,
+            default=DEFAULT_GRACE_SECONDS,
+            help=f'Leave attempts alone this long after their deadline (default: {DEFAULT_GRACE_SECONDS})'
+        )
+        parser.add_argument(
+            '--loop',
+            action='store_true',
+            help='Keep sweeping every --interval seconds'
+        )
+        parser.add_argument(
+            '--interval',
+            type=int,
+            default=60,
+            help='Seconds between sweeps with --loop (default: 60)'
+        )
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1 or options['interval'] < 1 or options['grace_seconds'] < 0:
+            raise CommandError('--batch-size and --interval must be at least 1, --grace-seconds at least 0')
+
+        while True:
+            swept = sweep_expired_attempts(
+                batch_size=options['batch_size'],
+                grace=timedelta(seconds=options['grace_seconds']),
+            )
+            self.stdout.write(self.style.SUCCESS(f'✓ Timed out {swept} quiz attempt(s)'))
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,34 @@
+# Generated by Django 4.2.7 on 2026-10-18 06:42
+
+from datetime import timedelta
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def fill_deadlines(apps, schema_editor):
+    Quiz = apps.get_model('quizzes', 'Quiz')
+    QuizAttempt = apps.get_model('quizzes', 'QuizAttempt')
+    # One UPDATE per timed quiz
+    for quiz_id, minutes in Quiz.objects.filter(time_limit_minutes__gt=0).values_list('id', 'time_limit_minutes'):
+        QuizAttempt.objects.filter(quiz_id=quiz_id).update(deadline_at=F('started_at') + timedelta(minutes=minutes))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quizzes', '0003_keyset_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='quizattempt',
+            name='deadline_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(fill_deadlines, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='quizattempt',
+            index=models.Index(fields=['status', 'deadline_at'], name='quizzes_qui_status_353739_idx'),
+        ),
+    ]
@@ -1,6 +1,9 @@
 from django.db import models
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
 from django.conf import settings
 from django.utils import timezone
+from datetime import timedelta
 from courses.models import Course, Module, Lesson
 import uuid
 
@@ -32,6 +35,11 @@ class Quiz(models.Model):
     show_explanations = models.BooleanField(default=True, help_text="Show explanations for answers")
     randomize_questions = models.BooleanField(default=False, help_text="Randomize question order")
     randomize_answers = models.BooleanField(default=False, help_text="Randomize answer choices")
+    questions_per_attempt = models.PositiveIntegerField(
+        null=True,
+        blank=True,
+        help_text="Draw this many questions from the quiz for each attempt (leave blank for all)"
+    )
     
     # Availability
     is_published = models.BooleanField(default=False)
@@ -130,6 +138,13 @@ class AnswerChoice(models.Model):
         return f"{self.question} - {self.text[:50]}"
 
 
+def attempt_deadline(time_limit_minutes, started_at=None):
+    """When an attempt started at started_at (default: now) runs out, or None if untimed"""
+    if not time_limit_minutes:
+        return None
+    return (started_at or timezone.now()) + timedelta(minutes=time_limit_minutes)
+
+
 class QuizAttempt(models.Model):
     """Student quiz attempts"""
     STATUS_CHOICES = [
@@ -152,6 +167,8 @@ class QuizAttempt(models.Model):
     
     # Timing
     started_at = models.DateTimeField(auto_now_add=True)
+    # Set at creation for timed quizzes; the sweeper times out attempts past it
+    deadline_at = models.DateTimeField(null=True, blank=True)
     submitted_at = models.DateTimeField(null=True, blank=True)
     time_taken_minutes = models.PositiveIntegerField(null=True, blank=True)
     
@@ -171,6 +188,12 @@ class QuizAttempt(models.Model):
     class Meta:
         ordering = ['-started_at']
         unique_together = ['student', 'quiz', 'attempt_number']
+        indexes = [
+            # Keyset pagination key for per-student listings
+            models.Index(fields=['student', '-started_at', '-id']),
+            # Expired attempts for the sweeper
+            models.Index(fields=['status', 'deadline_at']),
+        ]
     
     def __str__(self):
         return f"{self.student.username} - {self.quiz.title} (Attempt {self.attempt_number})"
@@ -184,53 +207,37 @@ class QuizAttempt(models.Model):
             ).order_by('-attempt_number').first()
             
             self.attempt_number = 1 if not last_attempt else last_attempt.attempt_number + 1
+            
+            # quizzes.delivery.start_attempt numbers its attempts and sets
+            # their deadline without these lookups
+            if self.deadline_at is None:
+                self.deadline_at = attempt_deadline(self.quiz.time_limit_minutes)
         
         super().save(*args, **kwargs)
     
     def submit(self):
-        """Submit the quiz attempt and calculate score"""
+        """Submit the quiz attempt and grade the answers saved so far"""
+        from .autosave import submit_saved
+        from .grading import AttemptClosed
+        
         if self.status != 'in_progress':
             return
-        
-        self.status = 'completed'
-        self.submitted_at = timezone.now()
-        
-        # Calculate time taken
-        time_diff = self.submitted_at - self.started_at
-        self.time_taken_minutes = int(time_diff.total_seconds() / 60)
-        
-        # Calculate score
-        total_score = 0
-        max_possible = 0
-        
-        for answer in self.student_answers.all():
-            max_possible += answer.question.points
-            if answer.is_correct():
-                total_score += answer.question.points
-        
-        self.score = total_score
-        self.max_score = max_possible
-        self.percentage = (total_score / max_possible * 100) if max_possible > 0 else 0
-        self.passed = self.percentage >= self.quiz.pass_percentage
-        
-        self.save()
+        try:
+            submit_saved(self)
+        except AttemptClosed:
+            pass
     
     def is_timed_out(self):
         """Check if attempt has timed out"""
-        if not self.quiz.time_limit_minutes or self.status != 'in_progress':
+        if not self.deadline_at or self.status != 'in_progress':
             return False
-        
-        time_elapsed = timezone.now() - self.started_at
-        return time_elapsed.total_seconds() > (self.quiz.time_limit_minutes * 60)
+        return timezone.now() > self.deadline_at
     
     def get_remaining_time_seconds(self):
         """Get remaining time in seconds"""
-        if not self.quiz.time_limit_minutes or self.status != 'in_progress':
+        if not self.deadline_at or self.status != 'in_progress':
             return None
-        
-        time_elapsed = timezone.now() - self.started_at
-        total_allowed = self.quiz.time_limit_minutes * 60
-        return max(0, total_allowed - int(time_elapsed.total_seconds()))
+        return max(0, int((self.deadline_at - timezone.now()).total_seconds()))
 
 
 class StudentAnswer(models.Model):
@@ -315,3 +322,54 @@ class QuizFeedback(models.Model):
     
     def __str__(self):
         return f"Feedback for {self.attempt.student.username} - {self.attempt.quiz.title}"
+
+
+# Quiz, question and choice changes retire the cached answer key and delivery
+# payload (see quizzes.grading and quizzes.delivery)
+
+def _invalidate_quiz_caches(quiz_id, answer_key=True):
+    from .delivery import invalidate_quiz_delivery
+    from .grading import invalidate_answer_key
+    invalidate_quiz_delivery(quiz_id)
+    if answer_key:
+        invalidate_answer_key(quiz_id)
+
+
+@receiver(post_save, sender=Quiz)
+def invalidate_delivery_on_quiz_save(sender, instance, raw=False, **kwargs):
+    if not raw:
+        _invalidate_quiz_caches(instance.pk, answer_key=False)
+
+
+@receiver(post_save, sender=Question)
+@receiver(post_delete, sender=Question)
+def invalidate_caches_on_question_change(sender, instance, raw=False, **kwargs):
+    if not raw:
+        _invalidate_quiz_caches(instance.quiz_id)
+
+
+@receiver(post_save, sender=AnswerChoice)
+@receiver(post_delete, sender=AnswerChoice)
+def invalidate_caches_on_choice_change(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    quiz_id = Question.objects.filter(pk=instance.question_id).values_list('quiz_id', flat=True).first()
+    if quiz_id is not None:
+        _invalidate_quiz_caches(quiz_id)
+
+
+# Deleting an attempt (to grant a retake) or an enrollment changes what a
+# student may start; drop their cached allowance counters (see quizzes.delivery)
+
+@receiver(post_delete, sender=QuizAttempt)
+def forget_allowance_on_attempt_delete(sender, instance, **kwargs):
+    from .delivery import forget_allowances
+    forget_allowances(instance.student_id, [instance.quiz_id])
+
+
+@receiver(post_delete, sender='enrollments.Enrollment')
+def forget_allowances_on_unenroll(sender, instance, **kwargs):
+    from .delivery import forget_allowances
+    forget_allowances(
+        instance.student_id, list(Quiz.objects.filter(course_id=instance.course_id).values_list('pk', flat=True))
+    )
@@ -0,0 +1,55 @@
+"""
+Per-attempt question draws, question order and choice order.
+
+Nothing is stored. Each attempt's order is derived from its id and the
+server's SECRET_KEY, so the take page, the results and the API rebuild
+the same order from the cached question list (quizzes.delivery) or answer
+key (quizzes.grading) without a query, and one attempt's order says
+nothing about another's. Both caches list a quiz's questions in the same
+pool order, which unshuffled attempts keep.
+
+Draws and question order rank every question by its own keyed digest, so
+they do not depend on the rest of the pool: adding or removing a question
+only changes the draw if that question is among the drawn ones (or joins
+them), and leaves every other attempt's questions - completed ones
+included - where they were.
+"""
+import heapq
+import random
+
+from django.utils.crypto import salted_hmac
+
+KEY_SALT = 'quizzes.randomization'
+
+
+def _random(attempt_id, purpose):
+    digest = salted_hmac(KEY_SALT, f'{attempt_id}:{purpose}').digest()
+    return random.Random(int.from_bytes(digest, 'big'))
+
+
+def _rank(attempt_id, purpose):
+    return salted_hmac(KEY_SALT, f'{attempt_id}:{purpose}').digest()
+
+
+def attempt_question_ids(attempt_id, question_ids, count=None, shuffle=False):
+    """
+    The ids of an attempt's questions, in the order it shows them.
+
+    question_ids is the quiz's pool in pool order. With count, the count
+    questions with the smallest per-question keys are drawn; drawn
+    questions keep pool order unless shuffle.
+    """
+    question_ids = list(question_ids)
+    if count and count < len(question_ids):
+        drawn = set(heapq.nsmallest(count, question_ids, key=lambda pk: _rank(attempt_id, pk)))
+        question_ids = [question_id for question_id in question_ids if question_id in drawn]
+    if shuffle:
+        question_ids.sort(key=lambda pk: _rank(attempt_id, f'order:{pk}'))
+    return question_ids
+
+
+def attempt_choices(attempt_id, question_id, choices):
+    """An attempt's order of one question's choices"""
+    choices = list(choices)
+    _random(attempt_id, f'choices:{question_id}').shuffle(choices)
+    return choices
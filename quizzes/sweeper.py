@@ -0,0 +1,98 @@
+"""
+Time out quiz attempts left in progress past their deadline.
+
+Timed attempts store deadline_at when they start. sweep_expired_attempts()
+claims expired attempts a chunk at a time with SELECT ... FOR UPDATE SKIP
+LOCKED, so several nodes can sweep at once without taking the same rows,
+and a student submitting at the same moment waits for the chunk and then
+finds the attempt closed. Each chunk costs a fixed number of statements:
+the claim, one read of the stored answers, one UPDATE scoring every attempt
+(CASE per row, guarded by status='in_progress') and at most one DELETE and
+one upsert of the answers that changed. Answers still buffered by autosave
+count (see quizzes.autosave), and scores come from the same answer keys as
+live submissions (see quizzes.grading).
+"""
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import BooleanField, Case, DecimalField, F, IntegerField, Value, When
+from django.utils import timezone
+
+from .autosave import buffered_answers, saved_state
+from .grading import answers_from_rows, changed_answers, get_answer_key, grade, stored_rows, write_answers
+from .models import QuizAttempt
+
+DEFAULT_BATCH_SIZE = 200
+
+# Submissions still in flight at the deadline get this long to land
+GRACE_PERIOD = timedelta(seconds=30)
+
+
+def _per_row(values, output_field):
+    """CASE pk WHEN ... expression giving each attempt its own value"""
+    return Case(
+        *[When(pk=pk, then=Value(value)) for pk, value in values.items()],
+        output_field=output_field,
+    )
+
+
+def _time_out(attempts, now):
+    """
+    Grade and close one claimed chunk.
+
+    attempts are (pk, quiz_id, started_at, deadline_at, pass_percentage,
+    questions_per_attempt) rows. Returns the attempts closed.
+    """
+    rows = stored_rows([attempt[0] for attempt in attempts])
+    pools = {quiz_id: get_answer_key(quiz_id) for quiz_id in {attempt[1] for attempt in attempts}}
+    answer_keys = {
+        attempt[0]: pools[attempt[1]].for_attempt(attempt[0], attempt[5]) for attempt in attempts
+    }
+    buffered = buffered_answers({pk: answer_key.question_ids for pk, answer_key in answer_keys.items()})
+
+    results, changes = {}, {}
+    for pk, quiz_id, started_at, deadline_at, pass_percentage, _ in attempts:
+        answer_key = answer_keys[pk]
+        result = grade(answer_key, saved_state(answers_from_rows(rows[pk], answer_key), buffered[pk]))
+        results[pk] = (result, int((deadline_at - started_at).total_seconds() // 60), pass_percentage)
+        changes[pk] = changed_answers(result.answers, rows[pk])
+
+    closed = QuizAttempt.objects.filter(pk__in=results, status='in_progress').update(
+        status='timed_out',
+        submitted_at=F('deadline_at'),
+        time_taken_minutes=_per_row({pk: r[1] for pk, r in results.items()}, IntegerField()),
+        score=_per_row(
+            {pk: r[0].score for pk, r in results.items()}, DecimalField(max_digits=5, decimal_places=2)
+        ),
+        max_score=_per_row({pk: r[0].max_score for pk, r in results.items()}, IntegerField()),
+        percentage=_per_row(
+            {pk: r[0].percentage for pk, r in results.items()}, DecimalField(max_digits=5, decimal_places=2)
+        ),
+        passed=_per_row({pk: r[0].percentage >= r[2] for pk, r in results.items()}, BooleanField()),
+        updated_at=now,
+    )
+    write_answers(changes)
+    return closed
+
+
+def sweep_expired_attempts(batch_size=DEFAULT_BATCH_SIZE, grace=GRACE_PERIOD):
+    """
+    Time out every in-progress attempt whose deadline passed more than
+    `grace` ago, grading the answers saved so far. Returns the number closed.
+    """
+    cutoff = timezone.now() - grace
+    expired = QuizAttempt.objects.filter(status='in_progress', deadline_at__lt=cutoff).order_by('deadline_at')
+    swept = 0
+    while True:
+        with transaction.atomic():
+            attempts = list(
+                expired.select_for_update(skip_locked=True, of=('self',)).values_list(
+                    'pk', 'quiz_id', 'started_at', 'deadline_at', 'quiz__pass_percentage',
+                    'quiz__questions_per_attempt',
+                )[:batch_size]
+            )
+            if attempts:
+                swept += _time_out(attempts, timezone.now())
+        # A short chunk means the rest is done or claimed by another node
+        if len(attempts) < batch_size:
+            return swept
@@ -1,3 +1,648 @@
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.urls import reverse
+from django.utils import timezone
+
+from courses.models import Course
+from enrollments.models import Enrollment
+from .autosave import current_answers, current_generation, flush_autosaves, record_answers, submit_saved
+from .delivery import (
+    NoAttemptsLeft, NotEnrolled, attempt_questions, get_quiz_delivery, prewarm_quiz, start_attempt,
+)
+from .grading import AttemptClosed, get_answer_key, grade, parse_answers, submit_attempt
+from .sweeper import sweep_expired_attempts
+from .models import AnswerChoice, Question, Quiz, QuizAttempt, StudentAnswer
+
+User = get_user_model()
+
+
+class QuizGradingTestCase(TestCase):
+    """Test cases for the answer-key grading engine"""
+
+    def setUp(self):
+        """Set up test data"""
+        cache.clear()
+        self.instructor = User.objects.create_user(
+            username='instructor', email='instructor@test.com',
+            password='testpass123', user_type='instructor'
+        )
+        self.student = User.objects.create_user(
+            username='student', email='student@test.com', password='testpass123'
+        )
+        self.course = Course.objects.create(
+            title='Python Basics', description='Learn Python', short_description='Python',
+            instructor=self.instructor, duration_weeks=4, estimated_hours=20, status='published',
+        )
+        Enrollment.objects.create(student=self.student, course=self.course)
+        self.quiz = Quiz.objects.create(
+            title='Final', course=self.course, quiz_type='final', is_published=True, pass_percentage=50,
+        )
+        self.questions, self.right, self.wrong = [], {}, {}
+        for n, points in enumerate((1, 2, 3), start=1):
+            question = Question.objects.create(quiz=self.quiz, text=f'Question {n}', points=points, order=n)
+            self.right[question.pk] = AnswerChoice.objects.create(question=question, text='Yes', is_correct=True)
+            self.wrong[question.pk] = AnswerChoice.objects.create(question=question, text='No')
+            self.questions.append(question)
+        self.essay = Question.objects.create(
+            quiz=self.quiz, text='Explain', points=4, order=4, question_type='short_answer'
+        )
+
+    def start(self):
+        return QuizAttempt.objects.create(student=self.student, quiz=self.quiz)
+
+    def test_grade_in_memory(self):
+        """Test that only valid correct choices score and text waits for grading"""
+        first, second, third = self.questions
+        key = get_answer_key(self.quiz.pk)
+        answers = parse_answers([
+            (first.pk, self.right[first.pk].pk),
+            # A choice from another question does not count
+            (second.pk, self.right[third.pk].pk),
+            (third.pk, str(self.right[third.pk].pk)),
+            (self.essay.pk, '  Because  '),
+            (999999, 1),
+        ], key)
+        with self.assertNumQueries(0):
+            result = grade(key, answers)
+        self.assertEqual((result.score, result.max_score, str(result.percentage)), (4, 10, '40.00'))
+        self.assertEqual(result.correct, {first.pk, third.pk})
+        self.assertEqual(set(result.answers), {first.pk, third.pk, self.essay.pk})
+        self.assertEqual(result.answers[self.essay.pk]['text_answer'], 'Because')
+
+    def test_answer_key_is_cached_and_invalidated(self):
+        """Test that the key is built once and rebuilt after a choice changes"""
+        get_answer_key(self.quiz.pk)
+        with self.assertNumQueries(0):
+            key = get_answer_key(self.quiz.pk)
+        first = self.questions[0]
+        self.assertIn((first.pk, self.right[first.pk].pk), key.correct)
+
+        self.wrong[first.pk].is_correct = True
+        self.wrong[first.pk].save()
+        self.assertIn((first.pk, self.wrong[first.pk].pk), get_answer_key(self.quiz.pk).correct)
+
+    def test_html_and_api_scores_match(self):
+        """Test that the form and the API grade the same answers identically"""
+        self.client.login(username='student', password='testpass123')
+        first, second, _ = self.questions
+
+        attempt = self.start()
+        response = self.client.post(reverse('quizzes:submit_quiz', kwargs={'pk': attempt.pk}), {
+            f'question_{first.pk}': self.right[first.pk].pk,
+            f'question_{second.pk}': self.right[second.pk].pk,
+            f'question_{self.essay.pk}': 'Because',
+        })
+        self.assertRedirects(response, reverse('quizzes:quiz_result', kwargs={'pk': attempt.pk}))
+        html = QuizAttempt.objects.get(pk=attempt.pk)
+
+        attempt = self.start()
+        response = self.client.post(
+            reverse('quiz-submit-attempt', kwargs={'pk': self.quiz.pk}),
+            {'attempt_id': attempt.pk, 'answers': [
+                {'question': first.pk, 'selected_choice': self.right[first.pk].pk},
+                {'question': second.pk, 'selected_choice': self.right[second.pk].pk},
+                {'question': self.essay.pk, 'text_answer': 'Because'},
+            ]},
+            content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 200)
+        api = QuizAttempt.objects.get(pk=attempt.pk)
+
+        self.assertEqual((html.score, html.max_score, html.percentage), (api.score, api.max_score, api.percentage))
+        self.assertEqual((api.status, api.percentage, api.passed), ('completed', 30, False))
+        self.assertEqual(response.json()['percentage'], '30.00')
+        self.assertEqual(StudentAnswer.objects.filter(attempt=api).count(), 3)
+
+    def test_submission_writes_answers_in_one_insert(self):
+        """Test that a submission stores every answer with a single INSERT"""
+        attempt = self.start()
+        get_answer_key(self.quiz.pk)
+        answers = {question.pk: self.right[question.pk].pk for question in self.questions}
+        with CaptureQueriesContext(connection) as queries:
+            submit_attempt(attempt, answers)
+        inserts = [q for q in queries if q['sql'].startswith('INSERT')]
+        self.assertEqual(len(inserts), 1)
+        self.assertEqual(attempt.percentage, 60)
+        self.assertEqual(StudentAnswer.objects.filter(attempt=attempt, points_earned__gt=0).count(), 3)
+
+    def test_submit_only_once(self):
+        """Test that a second submission of an attempt is refused"""
+        attempt = self.start()
+        submit_attempt(attempt, {})
+        with self.assertRaises(AttemptClosed):
+            submit_attempt(QuizAttempt.objects.get(pk=attempt.pk), {})
+        self.assertEqual(attempt.percentage, 0)
+
+    def test_model_submit_grades_stored_answers(self):
+        """Test that QuizAttempt.submit scores saved answers like a submission"""
+        attempt = self.start()
+        third = self.questions[2]
+        StudentAnswer.objects.create(attempt=attempt, question=third, selected_choice=self.right[third.pk])
+        attempt.submit()
+        attempt.refresh_from_db()
+        self.assertEqual((attempt.status, attempt.score, attempt.max_score, attempt.passed), ('completed', 3, 10, False))
+
+
+class ExamDeliveryTestCase(TestCase):
+    """Test cases for exam pre-warming and cached attempt starts"""
+
+    def setUp(self):
+        """Set up test data"""
+        cache.clear()
+        self.instructor = User.objects.create_user(
+            username='instructor', email='instructor@test.com',
+            password='testpass123', user_type='instructor'
+        )
+        self.student = User.objects.create_user(
+            username='student', email='student@test.com', password='testpass123'
+        )
+        self.course = Course.objects.create(
+            title='Python Basics', description='Learn Python', short_description='Python',
+            instructor=self.instructor, duration_weeks=4, estimated_hours=20, status='published',
+        )
+        Enrollment.objects.create(student=self.student, course=self.course)
+        self.quiz = Quiz.objects.create(
+            title='Final', course=self.course, quiz_type='final', is_published=True, max_attempts=2,
+            available_from=timezone.now() + timedelta(minutes=5), time_limit_minutes=60,
+        )
+        for n in (1, 2):
+            question = Question.objects.create(quiz=self.quiz, text=f'Question {n}', order=n)
+            AnswerChoice.objects.create(question=question, text='Yes', is_correct=True)
+            AnswerChoice.objects.create(question=question, text='No')
+
+    def open_exam(self):
+        Quiz.objects.filter(pk=self.quiz.pk).update(available_from=timezone.now() - timedelta(minutes=1))
+        cache.clear()
+
+    def test_prewarm_command(self):
+        """Test that the command warms exams opening soon and nothing else"""
+        Quiz.objects.create(
+            title='Later', course=self.course, quiz_type='final', is_published=True,
+            available_from=timezone.now() + timedelta(hours=3),
+        )
+        out = StringIO()
+        call_command('prewarm_exams', stdout=out)
+        self.assertIn('Warmed 1 exam(s), primed 1 attempt allowance(s)', out.getvalue())
+        with self.assertNumQueries(0):
+            delivery = get_quiz_delivery(self.quiz.pk)
+        self.assertEqual([len(question.choices) for question in delivery.questions], [2, 2])
+        # The payload never carries the answers
+        self.assertNotIn('is_correct', delivery.questions[0].choices[0]._fields)
+
+    def test_warm_start_is_one_insert(self):
+        """Test that a warmed attempt start needs one INSERT and no reads"""
+        self.open_exam()
+        prewarm_quiz(self.quiz.pk)
+        delivery = get_quiz_delivery(self.quiz.pk)
+        with CaptureQueriesContext(connection) as queries:
+            attempt = start_attempt(delivery, self.student)
+        statements = [q['sql'].split()[0] for q in queries if 'SAVEPOINT' not in q['sql']]
+        self.assertEqual(statements, ['INSERT'])
+        self.assertEqual(attempt.attempt_number, 1)
+
+    def test_allowance_limits_attempts(self):
+        """Test that attempts are numbered from the counter and capped"""
+        self.open_exam()
+        delivery = get_quiz_delivery(self.quiz.pk)
+        # An attempt made before the counter existed is picked up on a cold start
+        QuizAttempt.objects.create(student=self.student, quiz=self.quiz)
+        self.assertEqual(start_attempt(delivery, self.student).attempt_number, 2)
+        with self.assertRaises(NoAttemptsLeft):
+            start_attempt(delivery, self.student)
+        other = User.objects.create_user(username='other', password='testpass123')
+        with self.assertRaises(NotEnrolled):
+            start_attempt(delivery, other)
+
+    def test_stale_counter_recovers(self):
+        """Test that a counter behind the table resyncs instead of failing"""
+        self.open_exam()
+        prewarm_quiz(self.quiz.pk)
+        QuizAttempt.objects.create(student=self.student, quiz=self.quiz)
+        attempt = start_attempt(get_quiz_delivery(self.quiz.pk), self.student)
+        self.assertEqual(attempt.attempt_number, 2)
+
+    def test_deletions_reset_warm_allowances(self):
+        """Test that deleting an attempt grants a retake and unenrolling stops starts"""
+        self.open_exam()
+        prewarm_quiz(self.quiz.pk)
+        delivery = get_quiz_delivery(self.quiz.pk)
+        start_attempt(delivery, self.student)
+        latest = start_attempt(delivery, self.student)
+        with self.assertRaises(NoAttemptsLeft):
+            start_attempt(delivery, self.student)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            latest.delete()
+        self.assertEqual(start_attempt(delivery, self.student).attempt_number, 2)
+
+        prewarm_quiz(self.quiz.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            Enrollment.objects.filter(student=self.student).delete()
+        with self.assertRaises(NotEnrolled):
+            start_attempt(delivery, self.student)
+
+    def test_start_and_take_views(self):
+        """Test that the views refuse closed exams and render from the cache"""
+        self.client.login(username='student', password='testpass123')
+        start_url = reverse('quizzes:start_quiz', kwargs={'pk': self.quiz.pk})
+        response = self.client.get(start_url)
+        self.assertRedirects(response, reverse('quizzes:quiz_detail', kwargs={'pk': self.quiz.pk}),
+                             fetch_redirect_response=False)
+        self.assertFalse(QuizAttempt.objects.exists())
+
+        self.open_exam()
+        response = self.client.get(start_url)
+        attempt = QuizAttempt.objects.get()
+        take_url = reverse('quizzes:take_quiz', kwargs={'pk': attempt.pk})
+        self.assertRedirects(response, take_url, fetch_redirect_response=False)
+        response = self.client.get(take_url)
+        self.assertContains(response, 'Question 2')
+        self.assertContains(response, 'name="question_', count=4)
+
+
+class AttemptSweeperTestCase(TestCase):
+    """Test cases for timing out expired attempts"""
+
+    def setUp(self):
+        """Set up test data"""
+        cache.clear()
+        self.instructor = User.objects.create_user(
+            username='instructor', email='instructor@test.com',
+            password='testpass123', user_type='instructor'
+        )
+        self.course = Course.objects.create(
+            title='Python Basics', description='Learn Python', short_description='Python',
+            instructor=self.instructor, duration_weeks=4, estimated_hours=20, status='published',
+        )
+        self.quiz = Quiz.objects.create(
+            title='Final', course=self.course, quiz_type='final', is_published=True,
+            time_limit_minutes=30, pass_percentage=50,
+        )
+        self.right, self.wrong = {}, {}
+        for n in (1, 2):
+            question = Question.objects.create(quiz=self.quiz, text=f'Question {n}', order=n)
+            self.right[question.pk] = AnswerChoice.objects.create(question=question, text='Yes', is_correct=True)
+            self.wrong[question.pk] = AnswerChoice.objects.create(question=question, text='No')
+        self.students = [
+            User.objects.create_user(username=f'student{n}', password='testpass123') for n in range(4)
+        ]
+
+    def attempt(self, student, minutes_left):
+        attempt = QuizAttempt.objects.create(student=student, quiz=self.quiz)
+        deadline = timezone.now() + timedelta(minutes=minutes_left)
+        QuizAttempt.objects.filter(pk=attempt.pk).update(
+            started_at=deadline - timedelta(minutes=30), deadline_at=deadline
+        )
+        return attempt
+
+    def test_deadline_is_stored(self):
+        """Test that timed attempts get a deadline however they are created"""
+        attempt = QuizAttempt.objects.create(student=self.students[0], quiz=self.quiz)
+        self.assertAlmostEqual(
+            (attempt.deadline_at - attempt.started_at).total_seconds(), 30 * 60, delta=5
+        )
+        Enrollment.objects.create(student=self.students[1], course=self.course)
+        attempt = start_attempt(get_quiz_delivery(self.quiz.pk), self.students[1])
+        self.assertIsNotNone(attempt.deadline_at)
+        self.assertEqual(attempt.get_remaining_time_seconds() // 60, 29)
+
+    def test_sweep_grades_saved_answers(self):
+        """Test that expired attempts are scored from their saved answers and closed"""
+        first, second = self.right
+        graded = self.attempt(self.students[0], -5)
+        StudentAnswer.objects.create(attempt=graded, question_id=first, selected_choice=self.right[first])
+        StudentAnswer.objects.create(attempt=graded, question_id=second, selected_choice=self.wrong[second])
+        empty = self.attempt(self.students[1], -5)
+        running = self.attempt(self.students[2], 5)
+        # Inside the grace period
+        recent = self.attempt(self.students[3], 0)
+
+        self.assertEqual(sweep_expired_attempts(), 2)
+        graded.refresh_from_db()
+        self.assertEqual(
+            (graded.status, graded.score, graded.percentage, graded.passed), ('timed_out', 1, 50, True)
+        )
+        self.assertEqual(graded.submitted_at, graded.deadline_at)
+        self.assertEqual(
+            dict(graded.student_answers.values_list('question_id', 'points_earned')), {first: 1, second: 0}
+        )
+        empty.refresh_from_db()
+        self.assertEqual((empty.status, empty.percentage, empty.passed), ('timed_out', 0, False))
+        for attempt in (running, recent):
+            attempt.refresh_from_db()
+            self.assertEqual(attempt.status, 'in_progress')
+        # Nothing left to do, and a late submission is refused
+        self.assertEqual(sweep_expired_attempts(), 0)
+        with self.assertRaises(AttemptClosed):
+            submit_attempt(empty, {})
+
+    def test_chunks_cost_the_same(self):
+        """Test that each chunk runs a fixed number of statements"""
+        self.attempt(self.students[0], -5)
+        get_answer_key(self.quiz.pk)
+        with CaptureQueriesContext(connection) as one:
+            sweep_expired_attempts(batch_size=10)
+        for student in self.students[1:]:
+            self.attempt(student, -5)
+        with CaptureQueriesContext(connection) as three:
+            self.assertEqual(sweep_expired_attempts(batch_size=10), 3)
+        self.assertEqual(len(one), len(three))
+
+        for student in self.students[:3]:
+            QuizAttempt.objects.filter(student=student).update(status='in_progress')
+        self.assertEqual(sweep_expired_attempts(batch_size=2), 3)
+
+    def test_management_command(self):
+        """Test the sweep_quiz_attempts command"""
+        self.attempt(self.students[0], -5)
+        out = StringIO()
+        call_command('sweep_quiz_attempts', stdout=out)
+        self.assertIn('Timed out 1 quiz attempt(s)', out.getvalue())
+
+
+class QuizAutosaveTestCase(TestCase):
+    """Test cases for autosaving answers of attempts in progress"""
+
+    def setUp(self):
+        """Set up test data"""
+        cache.clear()
+        self.instructor = User.objects.create_user(
+            username='instructor', email='instructor@test.com',
+            password='testpass123', user_type='instructor'
+        )
+        self.student = User.objects.create_user(
+            username='student', email='student@test.com', password='testpass123'
+        )
+        self.course = Course.objects.create(
+            title='Python Basics', description='Learn Python', short_description='Python',
+            instructor=self.instructor, duration_weeks=4, estimated_hours=20, status='published',
+        )
+        Enrollment.objects.create(student=self.student, course=self.course)
+        self.quiz = Quiz.objects.create(
+            title='Final', course=self.course, quiz_type='final', is_published=True, pass_percentage=50,
+        )
+        self.questions, self.right, self.wrong = [], {}, {}
+        for n in (1, 2):
+            question = Question.objects.create(quiz=self.quiz, text=f'Question {n}', order=n)
+            self.right[question.pk] = AnswerChoice.objects.create(question=question, text='Yes', is_correct=True)
+            self.wrong[question.pk] = AnswerChoice.objects.create(question=question, text='No')
+            self.questions.append(question)
+        self.essay = Question.objects.create(
+            quiz=self.quiz, text='Explain', order=3, question_type='short_answer'
+        )
+        self.attempt = QuizAttempt.objects.create(student=self.student, quiz=self.quiz)
+        self.url = reverse('quizattempt-autosave', kwargs={'pk': self.attempt.pk})
+        self.client.login(username='student', password='testpass123')
+
+    def autosave(self, *answers):
+        return self.client.post(self.url, {'answers': list(answers)}, content_type='application/json')
+
+    def flush(self):
+        # Buffered answers are written by the second flush after them
+        return flush_autosaves() + flush_autosaves()
+
+    def test_answers_are_coalesced_and_flushed(self):
+        """Test that autosaves touch no rows until a flush writes the latest answers at once"""
+        first, second = self.questions
+        get_answer_key(self.quiz.pk)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.autosave(
+                {'question': first.pk, 'selected_choice': self.wrong[first.pk].pk},
+                {'question': self.essay.pk, 'text_answer': 'Because'},
+            )
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.json(), {'accepted': 2})
+        self.assertFalse([q for q in queries if not q['sql'].startswith('SELECT')])
+        self.autosave({'question': first.pk, 'selected_choice': self.right[first.pk].pk})
+        self.assertFalse(StudentAnswer.objects.exists())
+
+        self.assertEqual(flush_autosaves(), 0)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(flush_autosaves(), 2)
+        self.assertEqual(len([q for q in queries if q['sql'].startswith('INSERT')]), 1)
+        self.assertEqual(
+            dict(StudentAnswer.objects.values_list('question_id', 'points_earned')),
+            {first.pk: 1, self.essay.pk: 0},
+        )
+
+        # A blank answer removes the saved one
+        self.autosave({'question': self.essay.pk, 'text_answer': ''})
+        self.assertEqual(self.flush(), 1)
+        self.assertEqual(list(StudentAnswer.objects.values_list('question_id', flat=True)), [first.pk])
+        self.assertEqual(self.flush(), 0)
+
+    def test_submit_grades_saved_state(self):
+        """Test that submitting grades stored, buffered and submitted answers together"""
+        first, second = self.questions
+        record_answers(self.attempt.pk, {first.pk: self.right[first.pk].pk, self.essay.pk: 'Because'})
+        self.flush()
+        # Buffered but not flushed yet
+        record_answers(self.attempt.pk, {second.pk: self.wrong[second.pk].pk})
+        self.assertEqual(
+            current_answers(self.attempt, get_answer_key(self.quiz.pk)),
+            {first.pk: self.right[first.pk].pk, second.pk: self.wrong[second.pk].pk, self.essay.pk: 'Because'},
+        )
+
+        response = self.client.post(reverse('quizzes:submit_quiz', kwargs={'pk': self.attempt.pk}), {
+            f'question_{second.pk}': self.right[second.pk].pk,
+            f'question_{self.essay.pk}': 'Because',
+        })
+        self.assertRedirects(response, reverse('quizzes:quiz_result', kwargs={'pk': self.attempt.pk}))
+        self.attempt.refresh_from_db()
+        self.assertEqual((self.attempt.status, self.attempt.score, self.attempt.max_score), ('completed', 2, 3))
+        self.assertEqual(StudentAnswer.objects.filter(attempt=self.attempt).count(), 3)
+
+        # Answers buffered for a closed attempt are dropped
+        record_answers(self.attempt.pk, {first.pk: self.wrong[first.pk].pk})
+        self.assertEqual(self.flush(), 0)
+        self.assertEqual(self.autosave({'question': first.pk, 'text_answer': 'x'}).status_code, 409)
+
+    def test_submit_writes_only_changes(self):
+        """Test that a submission after a flush leaves the stored answers alone"""
+        first, second = self.questions
+        record_answers(self.attempt.pk, {question.pk: self.right[question.pk].pk for question in self.questions})
+        self.flush()
+        get_answer_key(self.quiz.pk)
+        with CaptureQueriesContext(connection) as queries:
+            submit_saved(self.attempt)
+        statements = [q['sql'].split()[0] for q in queries if 'SAVEPOINT' not in q['sql']]
+        self.assertEqual(statements, ['SELECT', 'UPDATE'])
+        self.assertEqual(self.attempt.score, 2)
+
+    def test_answer_racing_a_flush_is_kept(self):
+        """Test that an answer written into a generation just retired still counts"""
+        first, second = self.questions
+        with mock.patch('quizzes.autosave.current_generation', return_value=current_generation()):
+            flush_autosaves()
+            # A request that read the generation before the flush switched it
+            record_answers(self.attempt.pk, {first.pk: self.right[first.pk].pk})
+        self.assertEqual(
+            current_answers(self.attempt, get_answer_key(self.quiz.pk)), {first.pk: self.right[first.pk].pk}
+        )
+        self.assertEqual(flush_autosaves(), 1)
+        self.assertEqual(submit_saved(self.attempt).score, 1)
+
+    def test_take_page_restores_answers(self):
+        """Test that the take page shows autosaved answers and other students cannot autosave"""
+        first = self.questions[0]
+        record_answers(self.attempt.pk, {first.pk: self.right[first.pk].pk, self.essay.pk: 'Because'})
+        response = self.client.get(reverse('quizzes:take_quiz', kwargs={'pk': self.attempt.pk}))
+        self.assertContains(response, 'checked>', count=1)
+        self.assertContains(response, '>Because</textarea>')
+        self.assertContains(response, self.url)
+
+        User.objects.create_user(username='other', password='testpass123')
+        self.client.login(username='other', password='testpass123')
+        self.assertEqual(self.autosave({'question': first.pk, 'text_answer': 'x'}).status_code, 404)
+        self.assertEqual(self.autosave().status_code, 404)
+
+    def test_management_command(self):
+        """Test the flush_quiz_autosaves command"""
+        record_answers(self.attempt.pk, {self.essay.pk: 'Because'})
+        flush_autosaves()
+        out = StringIO()
+        call_command('flush_quiz_autosaves', stdout=out)
+        self.assertIn('Flushed 1 autosaved answer(s)', out.getvalue())
+
+
+class QuizRandomizationTestCase(TestCase):
+    """Test cases for per-attempt question draws and ordering"""
+
+    def setUp(self):
+        """Set up test data"""
+        cache.clear()
+        self.instructor = User.objects.create_user(
+            username='instructor', email='instructor@test.com',
+            password='testpass123', user_type='instructor'
+        )
+        self.student = User.objects.create_user(
+            username='student', email='student@test.com', password='testpass123'
+        )
+        self.course = Course.objects.create(
+            title='Python Basics', description='Learn Python', short_description='Python',
+            instructor=self.instructor, duration_weeks=4, estimated_hours=20, status='published',
+        )
+        Enrollment.objects.create(student=self.student, course=self.course)
+        self.quiz = Quiz.objects.create(
+            title='Final', course=self.course, quiz_type='final', is_published=True, max_attempts=10,
+            randomize_questions=True, randomize_answers=True,
+        )
+        self.right = {}
+        for n in range(8):
+            question = Question.objects.create(quiz=self.quiz, text=f'Question {n}', order=n)
+            self.right[question.pk] = AnswerChoice.objects.create(question=question, text='Yes', is_correct=True)
+            for m in range(3):
+                AnswerChoice.objects.create(question=question, text=f'No {m}', order=m + 1)
+        self.client.login(username='student', password='testpass123')
+
+    def start(self):
+        return QuizAttempt.objects.create(student=self.student, quiz=self.quiz)
+
+    def order(self, attempt):
+        return [question.pk for question in attempt_questions(get_quiz_delivery(self.quiz.pk), attempt.pk)]
+
+    def test_order_is_stable_per_attempt(self):
+        """Test that an attempt always gets the same order, derived without queries"""
+        attempt = self.start()
+        get_quiz_delivery(self.quiz.pk)
+        with self.assertNumQueries(0):
+            first = attempt_questions(get_quiz_delivery(self.quiz.pk), attempt.pk)
+            again = attempt_questions(get_quiz_delivery(self.quiz.pk), attempt.pk)
+        self.assertEqual(first, again)
+        self.assertEqual(sorted(question.pk for question in first), sorted(self.right))
+        pool = [question.choices for question in get_quiz_delivery(self.quiz.pk).questions]
+        self.assertEqual(
+            sorted(sorted(question.choices) for question in first), sorted(sorted(choices) for choices in pool)
+        )
+
+        orders = {tuple(self.order(self.start())) for _ in range(5)}
+        self.assertGreater(len(orders), 1)
+
+        # Without randomization the pool order is kept
+        Quiz.objects.filter(pk=self.quiz.pk).update(randomize_questions=False, randomize_answers=False)
+        cache.clear()
+        self.assertEqual(attempt_questions(get_quiz_delivery(self.quiz.pk), attempt.pk),
+                         get_quiz_delivery(self.quiz.pk).questions)
+
+    def test_views_and_api_agree(self):
+        """Test that the take page, the results and the API show the attempt's order"""
+        attempt = self.start()
+        order = self.order(attempt)
+        texts = [f'Question {Question.objects.get(pk=pk).order}' for pk in order]
+
+        response = self.client.get(reverse('quizzes:take_quiz', kwargs={'pk': attempt.pk}))
+        self.assertEqual([question.pk for question, _ in response.context['questions_with_answers']], order)
+        content = response.content.decode()
+        self.assertEqual(sorted(texts, key=content.index), texts)
+
+        response = self.client.get(reverse('quizattempt-detail', kwargs={'pk': attempt.pk}))
+        questions = response.json()['questions']
+        self.assertEqual([question['id'] for question in questions], order)
+        self.assertEqual(
+            [choice['id'] for choice in questions[0]['choices']],
+            [choice.pk for choice in attempt_questions(get_quiz_delivery(self.quiz.pk), attempt.pk)[0].choices],
+        )
+
+        submit_attempt(attempt, {})
+        response = self.client.get(reverse('quizzes:quiz_result', kwargs={'pk': attempt.pk}))
+        self.assertEqual([qa['question'].pk for qa in response.context['questions_with_answers']], order)
+
+    def test_draw_from_pool(self):
+        """Test that attempts draw questions_per_attempt questions and are graded on them"""
+        Quiz.objects.filter(pk=self.quiz.pk).update(questions_per_attempt=3)
+        self.quiz.refresh_from_db()
+        attempt = self.start()
+        drawn = self.order(attempt)
+        self.assertEqual(len(drawn), 3)
+        self.assertEqual(
+            set(get_answer_key(self.quiz.pk).for_attempt(attempt.pk, 3).question_ids), set(drawn)
+        )
+        draws = {frozenset(self.order(self.start())) for _ in range(5)}
+        self.assertGreater(len(draws), 1)
+
+        response = self.client.get(reverse('quizzes:take_quiz', kwargs={'pk': attempt.pk}))
+        self.assertContains(response, 'name="question_', count=3 * 4)
+
+        # Answers to questions not drawn are ignored
+        answers = {pk: choice.pk for pk, choice in self.right.items()}
+        result = submit_attempt(attempt, answers)
+        self.assertEqual((result.score, result.max_score), (3, 3))
+        self.assertEqual(set(attempt.student_answers.values_list('question_id', flat=True)), set(drawn))
+        response = self.client.get(reverse('quizzes:quiz_result', kwargs={'pk': attempt.pk}))
+        self.assertEqual(response.context['total_questions'], 3)
+
+    def test_pool_edits_keep_other_draws(self):
+        """Test that adding or removing a question leaves the other drawn questions alone"""
+        Quiz.objects.filter(pk=self.quiz.pk).update(questions_per_attempt=3)
+        attempts = [self.start() for _ in range(6)]
+        before = {attempt.pk: self.order(attempt) for attempt in attempts}
+
+        removed = min(set(self.right) - set(before[attempts[0].pk]))
+        Question.objects.filter(pk=removed).delete()
+        for attempt in attempts:
+            after = self.order(attempt)
+            if removed in before[attempt.pk]:
+                # Only the removed question is replaced
+                self.assertEqual(len(set(after) - set(before[attempt.pk])), 1)
+            else:
+                self.assertEqual(after, before[attempt.pk])
+            before[attempt.pk] = after
 
-# Create your tests here.
+        added = Question.objects.create(quiz=self.quiz, text='Question 8', order=8)
+        for attempt in attempts:
+            after = self.order(attempt)
+            kept = [pk for pk in after if pk != added.pk]
+            # The new question can only take the place of one earlier draw
+            self.assertEqual(kept, [pk for pk in before[attempt.pk] if pk in kept])
+            self.assertEqual(len(kept), 3 if added.pk not in after else 2)
+            self.assertEqual(
+                set(get_answer_key(self.quiz.pk).for_attempt(attempt.pk, 3).question_ids), set(after)
+            )
@@ -9,5 +9,5 @@ urlpatterns = [
     path('<int:pk>/start/', views.start_quiz, name='start_quiz'),
     path('<int:pk>/take/', views.TakeQuizView.as_view(), name='take_quiz'),
     path('<int:pk>/submit/', views.submit_quiz, name='submit_quiz'),
-    path('<int:pk>/results/', views.QuizResultView.as_view(), name='quiz_results'),
+    path('<int:pk>/results/', views.QuizResultView.as_view(), name='quiz_result'),
 ]
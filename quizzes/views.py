@@ -6,11 +6,13 @@ from django.contrib.auth.decorators import login_required
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.contrib import messages
 from django.views.generic import ListView, DetailView
-from django.http import JsonResponse
-from django.utils import timezone
-from django.db import transaction
+from django.http import Http404, JsonResponse
 
-from .models import Quiz, QuizAttempt, Question, StudentAnswer
+from .autosave import current_answers, delta_from_form, submit_saved
+from .delivery import NoAttemptsLeft, NotEnrolled, attempt_questions, get_quiz_delivery, start_attempt
+from .grading import AttemptClosed, get_answer_key
+from .models import Quiz, QuizAttempt
+from .randomization import attempt_question_ids
 from enrollments.models import Enrollment
 
 
@@ -72,25 +74,24 @@ class QuizDetailView(LoginRequiredMixin, DetailView):
 @login_required
 def start_quiz(request, pk):
     """Start a new quiz attempt"""
-    quiz = get_object_or_404(Quiz, pk=pk)
+    # Served from the cache, warmed before exams open (see quizzes.delivery)
+    quiz = get_quiz_delivery(pk)
+    if quiz is None:
+        raise Http404('No quiz found')
     
-    # Check enrollment
-    if not Enrollment.objects.filter(student=request.user, course=quiz.course).exists():
-        messages.error(request, 'You must be enrolled in this course to take quizzes.')
-        return redirect('courses:course_detail', pk=quiz.course.pk)
+    if not quiz.is_available():
+        messages.error(request, 'This quiz is not open right now.')
+        return redirect('quizzes:quiz_detail', pk=quiz.pk)
     
-    # Check attempt limit
-    attempts_count = QuizAttempt.objects.filter(student=request.user, quiz=quiz).count()
-    if attempts_count >= quiz.max_attempts:
+    try:
+        attempt = start_attempt(quiz, request.user)
+    except NotEnrolled:
+        messages.error(request, 'You must be enrolled in this course to take quizzes.')
+        return redirect('courses:course_detail', pk=quiz.course_id)
+    except NoAttemptsLeft:
         messages.error(request, 'You have reached the maximum number of attempts for this quiz.')
         return redirect('quizzes:quiz_detail', pk=quiz.pk)
     
-    # Create new attempt
-    attempt = QuizAttempt.objects.create(
-        student=request.user,
-        quiz=quiz
-    )
-    
     return redirect('quizzes:take_quiz', pk=attempt.pk)
 
 
@@ -105,23 +106,31 @@ class TakeQuizView(LoginRequiredMixin, DetailView):
             QuizAttempt,
             pk=self.kwargs['pk'],
             student=self.request.user,
-            completed_at__isnull=True
+            status='in_progress'
         )
+        # The attempt row is the only read; the quiz comes from the cache
+        delivery = get_quiz_delivery(attempt.quiz_id)
+        if delivery is None:
+            raise Http404('No quiz found')
+        attempt.delivery = delivery
         return attempt
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         attempt = self.object
+        context['quiz'] = attempt.delivery
+        # Drawn and ordered for this attempt, the same way on every visit
+        context['questions'] = attempt_questions(attempt.delivery, attempt.pk)
         
-        # Get questions with choices
-        questions = attempt.quiz.questions.prefetch_related('choices').order_by('order')
-        context['questions'] = questions
+        # Answers autosaved so far, so a reload or a crash loses nothing
+        answers = current_answers(attempt, get_answer_key(attempt.quiz_id))
+        context['questions_with_answers'] = [
+            (question, answers.get(question.pk)) for question in context['questions']
+        ]
         
         # Calculate time remaining
-        if attempt.quiz.time_limit:
-            elapsed_time = timezone.now() - attempt.started_at
-            time_remaining = attempt.quiz.time_limit * 60 - elapsed_time.total_seconds()
-            context['time_remaining'] = max(0, int(time_remaining))
+        if attempt.deadline_at:
+            context['time_remaining'] = attempt.get_remaining_time_seconds()
         
         return context
 
@@ -133,54 +142,21 @@ def submit_quiz(request, pk):
         return redirect('quizzes:quiz_list')
     
     attempt = get_object_or_404(
-        QuizAttempt,
+        QuizAttempt.objects.select_related('quiz'),
         pk=pk,
         student=request.user,
-        completed_at__isnull=True
+        status='in_progress'
     )
     
-    with transaction.atomic():
-        total_score = 0
-        max_score = 0
-        
-        # Process answers
-        for question in attempt.quiz.questions.all():
-            answer_key = f'question_{question.pk}'
-            max_score += question.points
-            
-            if question.question_type in ['multiple_choice', 'true_false']:
-                choice_id = request.POST.get(answer_key)
-                if choice_id:
-                    try:
-                        choice = question.choices.get(pk=choice_id)
-                        StudentAnswer.objects.create(
-                            attempt=attempt,
-                            question=question,
-                            selected_choice=choice
-                        )
-                        if choice.is_correct:
-                            total_score += question.points
-                    except:
-                        pass
-            elif question.question_type == 'short_answer':
-                text_answer = request.POST.get(answer_key, '').strip()
-                if text_answer:
-                    StudentAnswer.objects.create(
-                        attempt=attempt,
-                        question=question,
-                        text_answer=text_answer
-                    )
-                    # For short answer, instructor needs to grade manually
-                    # For now, give partial credit
-                    total_score += question.points * 0.5
-        
-        # Calculate final score
-        attempt.score = (total_score / max_score * 100) if max_score > 0 else 0
-        attempt.passed = attempt.score >= attempt.quiz.passing_score
-        attempt.completed_at = timezone.now()
-        attempt.save()
+    # Graded on the autosaved answers, updated by the form
+    answer_key = get_answer_key(attempt.quiz_id)
+    try:
+        submit_saved(attempt, delta_from_form(request.POST, answer_key))
+    except AttemptClosed:
+        messages.info(request, 'This attempt has already been submitted.')
+        return redirect('quizzes:quiz_result', pk=attempt.pk)
     
-    messages.success(request, f'Quiz submitted! You scored {attempt.score:.1f}%')
+    messages.success(request, f'Quiz submitted! You scored {attempt.percentage:.1f}%')
     return redirect('quizzes:quiz_result', pk=attempt.pk)
 
 
@@ -192,32 +168,44 @@ class QuizResultView(LoginRequiredMixin, DetailView):
     
     def get_object(self):
         return get_object_or_404(
-            QuizAttempt,
+            QuizAttempt.objects.select_related('quiz'),
             pk=self.kwargs['pk'],
             student=self.request.user,
-            completed_at__isnull=False
+            submitted_at__isnull=False
         )
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         attempt = self.object
+        quiz = attempt.quiz
+        pool = get_answer_key(attempt.quiz_id)
+        answer_key = pool.for_attempt(attempt.pk, quiz.questions_per_attempt)
         
-        # Get questions with user answers
+        # Get the attempt's questions, in the order it showed them, with user answers
+        answers = {
+            answer.question_id: answer
+            for answer in attempt.student_answers.select_related('selected_choice')
+        }
+        questions = {question.pk: question for question in quiz.questions.prefetch_related('answer_choices')}
         questions_with_answers = []
-        for question in attempt.quiz.questions.order_by('order'):
-            try:
-                user_answer = StudentAnswer.objects.get(attempt=attempt, question=question)
-            except StudentAnswer.DoesNotExist:
-                user_answer = None
-            
+        for pk in attempt_question_ids(
+            attempt.pk, pool.question_ids, quiz.questions_per_attempt, quiz.randomize_questions
+        ):
+            question = questions.get(pk)
+            if question is None:
+                continue
+            user_answer = answers.get(question.pk)
             questions_with_answers.append({
                 'question': question,
                 'user_answer': user_answer,
-                'correct_answer': question.choices.filter(is_correct=True).first() if question.question_type in ['multiple_choice', 'true_false'] else None
+                'is_correct': bool(user_answer) and (question.pk, user_answer.selected_choice_id) in answer_key.correct,
+                'correct_answer': next(
+                    (choice for choice in question.answer_choices.all() if choice.is_correct), None
+                ) if answer_key.is_auto_graded(question.pk) else None,
             })
         
         context['questions_with_answers'] = questions_with_answers
-        context['total_questions'] = attempt.quiz.questions.count()
-        context['correct_answers'] = sum(1 for qa in questions_with_answers if qa['user_answer'] and qa['correct_answer'] and qa['user_answer'].selected_choice == qa['correct_answer'])
+        context['total_questions'] = len(answer_key.question_ids)
+        context['correct_answers'] = sum(1 for qa in questions_with_answers if qa['is_correct'])
         
         return context
@@ -1,9 +1,12 @@
 from django.contrib.auth.models import AbstractUser
 from django.db import models
-from PIL import Image
-from django.db.models.signals import post_save
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
 
+from lms_project.images import (
+    AVATAR_VARIANTS, schedule_image_variants, schedule_variant_cleanup,
+)
+
 
 class User(AbstractUser):
     STUDENT = 'student'
@@ -27,6 +30,7 @@ class User(AbstractUser):
         blank=True,
         help_text="Profile picture"
     )
+    avatar_variants = models.JSONField(default=dict, blank=True, editable=False)
     bio = models.TextField(
         max_length=500,
         blank=True,
@@ -49,13 +53,8 @@ class User(AbstractUser):
     def save(self, *args, **kwargs):
         super().save(*args, **kwargs)
         
-        # Resize avatar if it exists
-        if self.avatar:
-            img = Image.open(self.avatar.path)
-            if img.height > 300 or img.width > 300:
-                output_size = (300, 300)
-                img.thumbnail(output_size)
-                img.save(self.avatar.path)
+        # Resized avatars are generated in the background, only on change
+        schedule_image_variants(self, 'avatar', 'avatar_variants', AVATAR_VARIANTS)
     
     def is_student(self):
         return self.user_type == self.STUDENT
@@ -115,3 +114,8 @@ def save_user_profile(sender, instance, **kwargs):
         instance.profile.save()
     else:
         UserProfile.objects.create(user=instance)
+
+@receiver(post_delete, sender=User)
+def delete_avatar_variants(sender, instance, **kwargs):
+    """Remove generated avatar sizes once the user is gone"""
+    schedule_variant_cleanup(instance, 'avatar', 'avatar_variants')